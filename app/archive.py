@@ -0,0 +1,96 @@
+# app/archive.py
+"""
+Partition maintenance for messages (migration 010): creates upcoming monthly
+partitions and folds months past the retention age into message_archive
+(compressed cold storage). Safe to run from cron on any host that can reach
+the database, or as a long-running process:
+
+    python -m app.archive                  # one pass
+    python -m app.archive --every 3600     # one pass per hour until SIGTERM
+"""
+import argparse
+import asyncio
+import os
+import signal
+from datetime import date, datetime, timezone
+
+import asyncpg
+
+from . import crud, log
+from .db import create_db_pool
+
+# months kept in live partitions, counting the current one
+ARCHIVE_RETENTION_MONTHS = int(os.getenv("ARCHIVE_RETENTION_MONTHS", "12"))
+# partitions are created this many months ahead so inserts never hit the default partition
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+
+
+def retention_cutoff(today: date, retention_months: int) -> date:
+    """
+    First day of the oldest month that stays live.
+    """
+    months = today.year * 12 + today.month - 1 - (retention_months - 1)
+    return date(months // 12, months % 12 + 1, 1)
+
+async def ensure_partitions(pool) -> int:
+    async with pool.acquire() as conn:
+        created = await crud.ensure_message_partitions(conn, PARTITION_MONTHS_AHEAD)
+    if created:
+        log.emit("partitions_created", count=created)
+    return created
+
+async def archive_old_partitions(pool, retention_months: int = ARCHIVE_RETENTION_MONTHS) -> int:
+    """
+    Archives every monthly partition older than the retention window, one
+    transaction per partition. Returns the number of archived messages.
+    """
+    cutoff = retention_cutoff(datetime.now(timezone.utc).date(), retention_months)
+    async with pool.acquire() as conn:
+        partitions = [p for p in await crud.list_message_partitions(conn) if p["period"] < cutoff]
+    total = 0
+    for p in partitions:
+        async with pool.acquire() as conn:
+            try:
+                moved = await crud.archive_message_partition(conn, p["name"], p["period"])
+            except asyncpg.LockNotAvailableError:
+                # messages stayed busy past the DETACH lock timeout; retried on the next pass
+                log.emit("partition_archive_deferred", partition=p["name"])
+                continue
+            except crud.PartitionNotArchivable as e:
+                # kept until those rows are dealt with (deleted or given a chat)
+                log.emit("partition_archive_skipped", partition=p["name"], error=str(e))
+                continue
+        total += moved
+        log.emit("partition_archived", partition=p["name"], messages=moved)
+    return total
+
+async def run_once(pool):
+    await ensure_partitions(pool)
+    await archive_old_partitions(pool)
+
+async def run(every: float):
+    pool = await create_db_pool()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        while True:
+            await run_once(pool)
+            if not every:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=every)
+                break
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await pool.close()
+        log.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--every", type=float, default=0.0, help="seconds between passes (0 = run once)")
+    args = parser.parse_args()
+    asyncio.run(run(args.every))
@@ -0,0 +1,266 @@
+# app/bulk.py
+"""
+Bulk import of chats and messages (POST /chats/import, POST /chats/messages/import).
+
+The request body is parsed as it arrives, NDJSON objects or CSV with a
+header row, and streamed into a single COPY (crud.copy_chats /
+crud.copy_messages) inside one transaction: either every row is imported or
+none. Memory stays bounded by one batch of IMPORT_BATCH_ROWS rows whatever
+the upload size. Message export lines (GET /chats/{chat_id}/messages/export)
+are valid import lines.
+"""
+import asyncio
+import codecs
+import csv
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Tuple
+
+import asyncpg
+from fastapi import HTTPException
+
+from . import crud, serialization, tokens
+
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "5000"))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000000"))
+MESSAGE_ROLES = frozenset(("user", "assistant", "system"))
+FORMATS = ("ndjson", "csv")
+
+
+class BulkImportError(ValueError):
+    def __init__(self, line: int, detail: str):
+        super().__init__(f"line {line}: {detail}")
+        self.line = line
+
+
+# ---- Parsing: (line number, dict) per row ----
+def _object(lineno: int, line: bytes) -> dict:
+    try:
+        row = serialization.loads(line)
+    except ValueError as e:
+        raise BulkImportError(lineno, f"invalid JSON ({e})")
+    if not isinstance(row, dict):
+        raise BulkImportError(lineno, "expected a JSON object")
+    return row
+
+async def ndjson_rows(chunks: AsyncIterator[bytes]):
+    lineno = 0
+    rest = b""
+    async for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            lineno += 1
+            if line.strip():
+                yield lineno, _object(lineno, line)
+    if rest.strip():
+        yield lineno + 1, _object(lineno + 1, rest)
+
+async def _text(chunks: AsyncIterator[bytes]):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+async def csv_rows(chunks: AsyncIterator[bytes]):
+    """
+    Lines are grouped into records (a quoted field may span lines) and each
+    group is parsed with one csv.reader call. The first record is the header.
+    """
+    header = None
+    rest = ""
+    record: List[str] = []
+    quotes = 0
+    lineno = 0
+    async for text in _text(chunks):
+        lines = (rest + text).split("\n")
+        rest = lines.pop()
+        complete: List[Tuple[int, str]] = []
+        for line in lines:
+            lineno += 1
+            record.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                complete.append((lineno, "\n".join(record)))
+                record, quotes = [], 0
+        for (n, _), fields in zip(complete, csv.reader(r for _, r in complete)):
+            if not fields:
+                continue
+            if header is None:
+                header = [f.strip() for f in fields]
+                continue
+            if len(fields) != len(header):
+                raise BulkImportError(n, f"expected {len(header)} fields, got {len(fields)}")
+            yield n, dict(zip(header, fields))
+    if record or rest.strip():
+        # last line without a trailing newline
+        lineno += 1
+        record.append(rest)
+        if (quotes + rest.count('"')) % 2:
+            raise BulkImportError(lineno, "unterminated quoted field")
+        fields = next(csv.reader(["\n".join(record)]), [])
+        if header is not None and fields:
+            if len(fields) != len(header):
+                raise BulkImportError(lineno, f"expected {len(header)} fields, got {len(fields)}")
+            yield lineno, dict(zip(header, fields))
+
+def parse(chunks: AsyncIterator[bytes], fmt: str):
+    if fmt == "csv":
+        return csv_rows(chunks)
+    return ndjson_rows(chunks)
+
+
+# ---- Field conversion ----
+def _uuid(lineno: int, row: dict, field: str, required: bool = False):
+    value = row.get(field)
+    if value is None or value == "":
+        if required:
+            raise BulkImportError(lineno, f"{field} is required")
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise BulkImportError(lineno, f"{field} is not a UUID")
+
+def _timestamp(lineno: int, row: dict, field: str):
+    value = row.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        ts = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except (AttributeError, TypeError, ValueError):
+        raise BulkImportError(lineno, f"{field} is not an ISO 8601 timestamp")
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+def _check_limit(count: int, lineno: int):
+    if count > IMPORT_MAX_ROWS:
+        raise BulkImportError(lineno, f"more than IMPORT_MAX_ROWS ({IMPORT_MAX_ROWS}) rows")
+
+
+# ---- Records in COPY column order ----
+async def chat_records(rows, stats: dict):
+    now = datetime.now(timezone.utc)
+    async for lineno, row in rows:
+        stats["rows"] += 1
+        _check_limit(stats["rows"], lineno)
+        created = _timestamp(lineno, row, "created_at") or now
+        yield (
+            _uuid(lineno, row, "id") or uuid.uuid4(),
+            row.get("title") or None,
+            _uuid(lineno, row, "model_profile_id"),
+            created,
+            _timestamp(lineno, row, "updated_at") or created,
+        )
+
+async def _finish(batch: List[list], stats: dict):
+    """
+    Fills in missing token counts (one batched tokenizer call, off the event
+    loop) and adds the batch to the per-chat totals.
+    """
+    missing = [r for r in batch if r[4] is None]
+    if missing:
+        counts = await asyncio.to_thread(tokens.count_tokens_batch, [r[3] for r in missing])
+        for r, n in zip(missing, counts):
+            r[4] = n
+    chats = stats["chats"]
+    for r in batch:
+        totals = chats.get(r[1])
+        if totals is None:
+            chats[r[1]] = [1, r[4], r[5]]
+        else:
+            totals[0] += 1
+            totals[1] += r[4]
+            if r[5] > totals[2]:
+                totals[2] = r[5]
+        if stats["first_at"] is None or r[5] < stats["first_at"]:
+            stats["first_at"] = r[5]
+        if stats["last_at"] is None or r[5] > stats["last_at"]:
+            stats["last_at"] = r[5]
+    return batch
+
+async def message_records(rows, stats: dict):
+    # rows without created_at keep their file order, one microsecond apart
+    base = datetime.now(timezone.utc)
+    chat_ids: Dict[str, uuid.UUID] = {}
+    batch: List[list] = []
+    async for lineno, row in rows:
+        stats["rows"] += 1
+        _check_limit(stats["rows"], lineno)
+        raw_chat_id = row.get("chat_id")
+        chat_id = chat_ids.get(raw_chat_id) if isinstance(raw_chat_id, str) else None
+        if chat_id is None:
+            chat_id = _uuid(lineno, row, "chat_id", required=True)
+            chat_ids[str(raw_chat_id)] = chat_id
+        role = row.get("role")
+        if role not in MESSAGE_ROLES:
+            raise BulkImportError(lineno, "role must be user, assistant or system")
+        content = row.get("content")
+        if not isinstance(content, str):
+            raise BulkImportError(lineno, "content is required")
+        token_count = row.get("token_count")
+        if token_count is not None and token_count != "":
+            try:
+                token_count = int(token_count)
+            except (TypeError, ValueError):
+                raise BulkImportError(lineno, "token_count is not an integer")
+        else:
+            token_count = None
+        batch.append([
+            _uuid(lineno, row, "id") or uuid.uuid4(), chat_id, role, content, token_count,
+            _timestamp(lineno, row, "created_at") or base + timedelta(microseconds=stats["rows"]),
+        ])
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            for r in await _finish(batch, stats):
+                yield tuple(r)
+            batch = []
+    for r in await _finish(batch, stats):
+        yield tuple(r)
+
+
+# ---- Imports ----
+def _db_error(e: asyncpg.PostgresError) -> HTTPException:
+    if isinstance(e, asyncpg.ForeignKeyViolationError):
+        return HTTPException(status_code=422, detail=f"Unknown reference: {e.detail or e}")
+    if isinstance(e, asyncpg.UniqueViolationError):
+        return HTTPException(status_code=409, detail=f"Duplicate id: {e.detail or e}")
+    return HTTPException(status_code=400, detail=str(e))
+
+async def import_chats(conn: asyncpg.Connection, rows) -> dict:
+    stats = {"rows": 0}
+    start = time.perf_counter()
+    try:
+        async with conn.transaction():
+            copied = await crud.copy_chats(conn, chat_records(rows, stats))
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+        raise _db_error(e)
+    return {"chats": copied, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+async def import_messages(conn: asyncpg.Connection, rows) -> dict:
+    """
+    One transaction: COPY the messages, then update the counters of every
+    chat they belong to and move rows for months without a partition out
+    of messages_default.
+    """
+    stats = {"rows": 0, "chats": {}, "first_at": None, "last_at": None}
+    start = time.perf_counter()
+    try:
+        async with conn.transaction():
+            copied = await crud.copy_messages(conn, message_records(rows, stats))
+            partitions = await crud.apply_imported_messages(conn, stats["chats"], stats["first_at"], stats["last_at"])
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+        raise _db_error(e)
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": copied,
+        "chats": len(stats["chats"]),
+        "partitions_created": partitions,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "messages_per_s": round(copied / elapsed) if elapsed else None,
+        "chat_ids": list(stats["chats"]),
+    }
@@ -0,0 +1,269 @@
+# app/cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+from uuid import UUID
+
+import asyncpg
+from fastapi import FastAPI
+
+from . import crud
+
+# returned by TTLCache.get for absent or expired keys (None can be a cached value)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Small LRU cache with a per-entry TTL. Not thread-safe; meant to be used
+    from the event loop only.
+    generation is bumped on every invalidation so a read-through that raced
+    with an update does not store the stale row it fetched.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, generation: Optional[int] = None) -> int:
+        """
+        Returns how many least recently used entries were evicted to make room.
+        """
+        if self.maxsize <= 0 or (generation is not None and generation != self.generation):
+            return 0
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        evicted = 0
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def invalidate(self, key: str):
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        self.generation += 1
+        for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+            del self._data[key]
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "60"))
+CACHE_NOTIFY = os.getenv("CACHE_NOTIFY", "false").lower() == "true"
+NOTIFY_CHANNEL = "model_studio_cache"
+
+# profile_id -> model_profiles row
+profiles = TTLCache(CACHE_SIZE, CACHE_TTL)
+# chat_id -> chats.model_profile_id (None when the chat has no linked profile)
+chat_profiles = TTLCache(CACHE_SIZE, CACHE_TTL)
+# chat_id -> rolling summary text (None when the chat has none); written through by app/summaries.py
+summaries = TTLCache(CACHE_SIZE, CACHE_TTL)
+
+# callbacks(chat_id, origin) for "messages:" notifications (app/sessions.py)
+message_listeners = []
+
+
+# ---- Read-through helpers ----
+async def get_model_profile(conn: asyncpg.Connection, profile_id: UUID):
+    key = str(profile_id)
+    value = profiles.get(key)
+    if value is not MISSING:
+        return value
+    generation = profiles.generation
+    row = await crud.get_model_profile(conn, profile_id)
+    if row:
+        profiles.set(key, row, generation)
+    return row
+
+async def warm(conn: asyncpg.Connection) -> int:
+    """
+    Startup: preloads the most recently updated model profiles so the first
+    message of each profile skips the lookup. Returns how many were cached.
+    """
+    generation = profiles.generation
+    rows = (await crud.list_model_profiles(conn))[:CACHE_SIZE]
+    for row in reversed(rows):
+        profiles.set(str(row["id"]), row, generation)
+    return len(rows)
+
+def cached_context(chat_id: str, override_profile_id: Optional[UUID] = None):
+    """
+    (profile, summary) when the chat link, profile and summary are all
+    cached, else None. No DB access.
+    """
+    link = chat_profiles.get(chat_id)
+    if link is MISSING:
+        return None
+    profile_id = override_profile_id or link
+    profile = profiles.get(str(profile_id)) if profile_id else MISSING
+    summary = summaries.get(chat_id) if profile is not MISSING else MISSING
+    if summary is MISSING:
+        return None
+    return profile, summary
+
+async def load_message_context(conn: asyncpg.Connection, chat_id: str, override_profile_id: Optional[UUID], n: int,
+                               budget: Optional[int] = None, budgets: Optional[dict] = None):
+    """
+    Message hot path. One round trip either way: when the chat link and
+    profile are cached only the history is fetched, otherwise
+    crud.load_message_context loads all three together and warms the cache.
+    budget/budgets select token-budget windowing (see crud.load_message_context).
+    Returns (chat_exists, profile, history, summary); history items carry
+    token_count in token-budget mode.
+    """
+    key = str(chat_id)
+    cached = cached_context(key, override_profile_id)
+    if cached is not None:
+        profile, summary = cached
+        if budget is not None:
+            model_budget = (budgets or {}).get(profile["base_model"], budget)
+            return True, profile, await crud.get_messages_within_budget(conn, chat_id, model_budget, n), summary
+        rows = await crud.get_last_n_messages(conn, chat_id, n)
+        return True, profile, [{"role": r["role"], "content": r["content"]} for r in rows], summary
+
+    generations = (chat_profiles.generation, profiles.generation, summaries.generation)
+    chat, profile, history, summary = await crud.load_message_context(conn, chat_id, override_profile_id, n, budget, budgets)
+    if chat:
+        chat_profiles.set(key, chat["model_profile_id"], generations[0])
+        summaries.set(key, summary, generations[2])
+    if profile:
+        profiles.set(str(profile["id"]), profile, generations[1])
+    return chat is not None, profile, history, summary
+
+
+async def load_batch_context(conn: asyncpg.Connection, chat_ids: List[UUID], profile_ids: List[Optional[UUID]], n: int,
+                             budget: Optional[int] = None, budgets: Optional[dict] = None,
+                             used: Optional[List[int]] = None):
+    """
+    Batch form of load_message_context. Every item needs its history from
+    the DB anyway, so this is always the one crud.load_batch_context
+    statement; the chat links, profiles and summaries it returns warm the
+    cache for the following single-message requests.
+    """
+    generations = (chat_profiles.generation, profiles.generation, summaries.generation)
+    contexts = await crud.load_batch_context(conn, chat_ids, profile_ids, n, budget, budgets, used)
+    for chat_id, (chat, profile, _, summary) in zip(chat_ids, contexts):
+        if chat:
+            chat_profiles.set(str(chat_id), chat["model_profile_id"], generations[0])
+            summaries.set(str(chat_id), summary, generations[2])
+        if profile:
+            profiles.set(str(profile["id"]), profile, generations[1])
+    return contexts
+
+
+# ---- Invalidation ----
+def _drop_profile(profile_id: str):
+    profiles.invalidate(profile_id)
+    # chats.model_profile_id is ON DELETE SET NULL, so links to a deleted profile are stale too
+    chat_profiles.invalidate_where(lambda v: v is not None and str(v) == profile_id)
+
+def _drop_chat(chat_id: str):
+    chat_profiles.invalidate(chat_id)
+
+async def _notify(conn: asyncpg.Connection, payload: str):
+    if CACHE_NOTIFY:
+        # delivered on commit, so other workers never refetch the pre-update row
+        await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+
+async def invalidate_profile(conn: asyncpg.Connection, profile_id: UUID):
+    _drop_profile(str(profile_id))
+    await _notify(conn, f"profile:{profile_id}")
+
+async def invalidate_chat(conn: asyncpg.Connection, chat_id: UUID):
+    _drop_chat(str(chat_id))
+    await _notify(conn, f"chat:{chat_id}")
+
+async def invalidate_summary(conn: asyncpg.Connection, chat_id: UUID):
+    summaries.invalidate(str(chat_id))
+    await _notify(conn, f"summary:{chat_id}")
+
+def _on_notify(connection, pid, channel, payload: str):
+    kind, _, key = payload.partition(":")
+    if kind == "profile":
+        _drop_profile(key)
+    elif kind == "chat":
+        _drop_chat(key)
+    elif kind == "summary":
+        summaries.invalidate(key)
+    elif kind == "messages":
+        chat_id, _, origin = key.partition(":")
+        for callback in message_listeners:
+            callback(chat_id, origin)
+
+
+# ---- Cross-process invalidation (LISTEN/NOTIFY) ----
+async def start_invalidation_listener(app: FastAPI):
+    """
+    Opens a dedicated connection (outside the pool) that LISTENs for
+    invalidations from other workers. No-op unless CACHE_NOTIFY=true.
+    """
+    if not CACHE_NOTIFY:
+        return
+    conn = await asyncpg.connect(dsn=os.getenv("DATABASE_URL"))
+    await conn.add_listener(NOTIFY_CHANNEL, _on_notify)
+    # if the listener connection drops we may have missed invalidations
+    conn.add_termination_listener(lambda c: clear())
+    app.state.cache_listener = conn
+
+async def stop_invalidation_listener(app: FastAPI):
+    conn = getattr(app.state, "cache_listener", None)
+    if conn:
+        await conn.close()
+
+def clear():
+    profiles.clear()
+    chat_profiles.clear()
+    summaries.clear()
+
+def stats() -> dict:
+    return {
+        "model_profiles": profiles.stats(),
+        "chat_profiles": chat_profiles.stats(),
+        "summaries": summaries.stats(),
+        "notify": CACHE_NOTIFY,
+    }
+
+
+# Notes
+
+# Profiles and chat->profile links are cached for PROFILE_CACHE_TTL seconds (LRU, PROFILE_CACHE_SIZE entries each).
+
+# Edits invalidate immediately (crud.update/delete_model_profile, patch_chat), so "edits affect subsequent messages" still holds.
+
+# With several workers set CACHE_NOTIFY=true: invalidations are broadcast with pg_notify and applied by every worker's listener.
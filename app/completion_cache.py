@@ -0,0 +1,106 @@
+# app/completion_cache.py
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from . import metrics
+from .cache import MISSING, TTLCache
+from .providers import request_fingerprint
+
+COMPLETION_CACHE_SIZE = int(os.getenv("COMPLETION_CACHE_SIZE", "2048"))
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "3600"))
+# optional second tier shared by all workers (table completion_cache, migration 004)
+COMPLETION_CACHE_DB = os.getenv("COMPLETION_CACHE_DB", "false").lower() == "true"
+
+# key -> (reply, provider latency in seconds)
+memory = TTLCache(COMPLETION_CACHE_SIZE, COMPLETION_CACHE_TTL)
+
+_stats = {"db_hits": 0, "db_misses": 0, "latency_saved_s": 0.0}
+
+
+def completion_key(provider: str, model: str, temperature: float, messages: List[Dict]) -> str:
+    # same identity the single-flight layer uses
+    return request_fingerprint(provider, model, temperature, messages)
+
+async def lookup(pool, key: str) -> Optional[str]:
+    entry = memory.get(key)
+    if entry is not MISSING:
+        metrics.count_completion_cache("memory", "hit")
+        _stats["latency_saved_s"] += entry[1]
+        return entry[0]
+    metrics.count_completion_cache("memory", "miss")
+    if not COMPLETION_CACHE_DB:
+        return None
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT response, latency_ms FROM completion_cache WHERE key = $1 AND expires_at > now()", key
+        )
+    if row is None:
+        metrics.count_completion_cache("db", "miss")
+        _stats["db_misses"] += 1
+        return None
+    metrics.count_completion_cache("db", "hit")
+    _stats["db_hits"] += 1
+    latency = row["latency_ms"] / 1000.0
+    _stats["latency_saved_s"] += latency
+    metrics.count_completion_cache_evictions(memory.set(key, (row["response"], latency)))
+    return row["response"]
+
+async def store(pool, key: str, provider: str, model: str, response: str, latency: float):
+    metrics.count_completion_cache_evictions(memory.set(key, (response, latency)))
+    if not COMPLETION_CACHE_DB:
+        return
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO completion_cache (key, provider, model, response, latency_ms, expires_at)
+            VALUES ($1, $2, $3, $4, $5, now() + make_interval(secs => $6))
+            ON CONFLICT (key) DO UPDATE SET response = EXCLUDED.response, latency_ms = EXCLUDED.latency_ms,
+                                            created_at = now(), expires_at = EXCLUDED.expires_at
+            """,
+            key, provider, model, response, int(latency * 1000), COMPLETION_CACHE_TTL
+        )
+        # opportunistic cleanup instead of a separate job
+        if random.random() < 0.01:
+            await conn.execute("DELETE FROM completion_cache WHERE expires_at <= now()")
+
+async def call_model(pool, model_profile: Dict, messages: List[Dict], call, temperature: float = 0.7) -> str:
+    """
+    Wraps a provider call (call(provider, model, messages, temperature)) with
+    the completion cache when the profile has response_cache enabled.
+    """
+    provider = model_profile["provider"]
+    model = model_profile["base_model"]
+    if not model_profile.get("response_cache"):
+        return await call(provider, model, messages, temperature)
+    key = completion_key(provider, model, temperature, messages)
+    cached = await lookup(pool, key)
+    if cached is not None:
+        return cached
+    start = time.monotonic()
+    reply = await call(provider, model, messages, temperature)
+    await store(pool, key, provider, model, reply, time.monotonic() - start)
+    return reply
+
+def stats() -> dict:
+    mem = memory.stats()
+    hits = mem["hits"] + _stats["db_hits"]
+    total = mem["hits"] + mem["misses"]  # every lookup goes through memory first
+    return {
+        "memory": mem,
+        "db_enabled": COMPLETION_CACHE_DB,
+        "db_hits": _stats["db_hits"],
+        "db_misses": _stats["db_misses"],
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+        "latency_saved_s": round(_stats["latency_saved_s"], 3),
+    }
+
+
+# Notes
+
+# Opt-in per model profile (model_profiles.response_cache). Worth it for low-temperature, repeated prompts.
+
+# Tier 1 is an in-process LRU with TTL; tier 2 (COMPLETION_CACHE_DB=true) is the completion_cache table, shared across workers.
+
+# latency_saved_s adds up the original provider latency of every cache hit.
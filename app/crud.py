@@ -1,28 +1,38 @@
 # app/crud.py
+from datetime import datetime, timezone
 from typing import List, Optional
-from uuid import UUID
+from uuid import UUID, uuid4
 import asyncpg
+import json
+import re
 from fastapi import HTTPException
+from . import cache, db, metrics, tokens
 
 # ModelProfiles
-async def create_model_profile(conn: asyncpg.Connection, name: str, provider: str, base_model: str, system_prompt: str):
+@metrics.timed_db
+async def create_model_profile(conn: asyncpg.Connection, name: str, provider: str, base_model: str, system_prompt: str,
+                               response_cache: bool = False, fallbacks: Optional[List[str]] = None, hedge: bool = False):
     row = await conn.fetchrow(
         """
-        INSERT INTO model_profiles (name, provider, base_model, system_prompt)
-        VALUES ($1, $2, $3, $4) RETURNING *
+        INSERT INTO model_profiles (name, provider, base_model, system_prompt, response_cache, fallbacks, hedge)
+        VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING *
         """,
-        name, provider, base_model, system_prompt
+        name, provider, base_model, system_prompt, response_cache, fallbacks or [], hedge
     )
+    db.mark_written("model_profiles")
     return dict(row)
 
+@metrics.timed_db
 async def get_model_profile(conn: asyncpg.Connection, profile_id: UUID):
     row = await conn.fetchrow("SELECT * FROM model_profiles WHERE id = $1", profile_id)
     return dict(row) if row else None
 
+@metrics.timed_db
 async def list_model_profiles(conn: asyncpg.Connection) -> List[dict]:
     rows = await conn.fetch("SELECT * FROM model_profiles ORDER BY updated_at DESC")
     return [dict(r) for r in rows]
 
+@metrics.timed_db
 async def update_model_profile(conn: asyncpg.Connection, profile_id: UUID, **fields):
     set_clauses = []
     values = []
@@ -37,38 +47,81 @@ async def update_model_profile(conn: asyncpg.Connection, profile_id: UUID, **fie
     query = f"UPDATE model_profiles SET {', '.join(set_clauses)}, updated_at = now() WHERE id = ${i} RETURNING *"
     values.append(profile_id)
     row = await conn.fetchrow(query, *values)
+    await cache.invalidate_profile(conn, profile_id)
+    db.mark_written("model_profiles", f"profile:{profile_id}")
     return dict(row) if row else None
 
+@metrics.timed_db
 async def delete_model_profile(conn: asyncpg.Connection, profile_id: UUID):
     await conn.execute("DELETE FROM model_profiles WHERE id = $1", profile_id)
+    await cache.invalidate_profile(conn, profile_id)
+    db.mark_written("model_profiles", f"profile:{profile_id}")
 
 # Chats
+@metrics.timed_db
 async def create_chat(conn: asyncpg.Connection, title: Optional[str], model_profile_id: Optional[UUID]):
     row = await conn.fetchrow(
         "INSERT INTO chats (title, model_profile_id) VALUES ($1, $2) RETURNING *",
         title, model_profile_id
     )
+    db.mark_written("chats", f"chat:{row['id']}")
     return dict(row)
 
-async def list_chats(conn: asyncpg.Connection):
-    rows = await conn.fetch("SELECT * FROM chats ORDER BY updated_at DESC")
+@metrics.timed_db
+async def list_chats(conn: asyncpg.Connection, limit: Optional[int] = None, after: Optional[tuple] = None):
+    """
+    Newest first, keyset-paginated on (updated_at, id).
+    after is the (updated_at, id) of the last row of the previous page.
+    """
+    if after is None:
+        rows = await conn.fetch("SELECT * FROM chats ORDER BY updated_at DESC, id DESC LIMIT $1", limit)
+    else:
+        rows = await conn.fetch(
+            "SELECT * FROM chats WHERE (updated_at, id) < ($1, $2) ORDER BY updated_at DESC, id DESC LIMIT $3",
+            after[0], after[1], limit
+        )
     return [dict(r) for r in rows]
 
+@metrics.timed_db
 async def get_chat(conn: asyncpg.Connection, chat_id: UUID):
     row = await conn.fetchrow("SELECT * FROM chats WHERE id = $1", chat_id)
     return dict(row) if row else None
 
+@metrics.timed_db
 async def update_chat_title(conn: asyncpg.Connection, chat_id: UUID, title: str):
     row = await conn.fetchrow("UPDATE chats SET title = $1, updated_at = now() WHERE id = $2 RETURNING *", title, chat_id)
+    db.mark_written("chats", f"chat:{chat_id}")
     return dict(row)
 
 # Messages
-async def append_message(conn: asyncpg.Connection, chat_id: UUID, role: str, content: str):
-    row = await conn.fetchrow("INSERT INTO messages (chat_id, role, content) VALUES ($1, $2, $3) RETURNING *", chat_id, role, content)
-    # update chats.updated_at
-    await conn.execute("UPDATE chats SET updated_at = now() WHERE id = $1", chat_id)
+# explicit column list: messages.search_tsv (migration 008) stays out of API rows
+MESSAGE_COLUMNS = "id, chat_id, role, content, token_count, created_at"
+
+# chats.last_message_preview length (migration 009)
+LAST_MESSAGE_PREVIEW_CHARS = 200
+
+APPEND_MESSAGE_SQL = f"""
+WITH m AS (
+    INSERT INTO messages (chat_id, role, content, token_count) VALUES ($1, $2, $3, $4) RETURNING {MESSAGE_COLUMNS}
+), c AS (
+    UPDATE chats SET updated_at = now(), message_count = message_count + 1, total_tokens = total_tokens + $4,
+                     last_role = $2, last_message_preview = left($3, {LAST_MESSAGE_PREVIEW_CHARS})
+    WHERE id = $1
+)
+SELECT * FROM m
+"""
+
+@metrics.timed_db
+async def append_message(conn: asyncpg.Connection, chat_id: UUID, role: str, content: str, token_count: Optional[int] = None):
+    # insert + bump chats.updated_at and the chat's counters/preview in one statement (one round trip)
+    if token_count is None:
+        token_count = tokens.count_tokens(content)
+    row = await conn.fetchrow(APPEND_MESSAGE_SQL, chat_id, role, content, token_count)
+    # "chats" too: the listing carries the counters and preview updated above
+    db.mark_written("chats", f"chat:{chat_id}")
     return dict(row)
 
+@metrics.timed_db
 async def get_last_n_messages(conn: asyncpg.Connection, chat_id: UUID, n: int):
     rows = await conn.fetch(
         "SELECT role, content, created_at FROM messages WHERE chat_id = $1 ORDER BY created_at DESC LIMIT $2",
@@ -77,10 +130,664 @@ async def get_last_n_messages(conn: asyncpg.Connection, chat_id: UUID, n: int):
     # return as chronological (oldest -> newest)
     return [dict(r) for r in reversed(rows)]
 
-async def list_messages(conn: asyncpg.Connection, chat_id: UUID, limit: int = 100):
-    rows = await conn.fetch("SELECT * FROM messages WHERE chat_id = $1 ORDER BY created_at ASC LIMIT $2", chat_id, limit)
+@metrics.timed_db
+async def get_messages_within_budget(conn: asyncpg.Connection, chat_id: UUID, budget: int, limit: int):
+    """
+    Newest messages whose cumulative token_count fits the budget (scan capped
+    at `limit` rows), chronological, with token_count.
+    """
+    rows = await conn.fetch(
+        """
+        SELECT role, content, token_count FROM (
+            SELECT role, content, token_count, created_at, id,
+                   sum(token_count) OVER (ORDER BY created_at DESC, id DESC ROWS UNBOUNDED PRECEDING) AS running
+            FROM messages WHERE chat_id = $1 ORDER BY created_at DESC, id DESC LIMIT $3
+        ) h
+        WHERE running <= $2
+        ORDER BY created_at ASC, id ASC
+        """,
+        chat_id, budget, limit
+    )
+    return [dict(r) for r in rows]
+
+# $4: NULL = plain last-n window; otherwise default token budget, $5: per-model budgets (jsonb)
+LOAD_MESSAGE_CONTEXT_SQL = """
+SELECT c.id AS _chat_id,
+       c.model_profile_id AS _linked_profile_id,
+       p.*,
+       (SELECT json_agg(json_build_object('role', h.role, 'content', h.content, 'token_count', h.token_count)
+                        ORDER BY h.created_at, h.id)
+        FROM (
+            SELECT role, content, token_count, created_at, id,
+                   sum(token_count) OVER (ORDER BY created_at DESC, id DESC ROWS UNBOUNDED PRECEDING) AS running
+            FROM messages WHERE chat_id = $1 ORDER BY created_at DESC, id DESC LIMIT $3
+        ) h
+        WHERE $4::int IS NULL OR h.running <= COALESCE(($5::jsonb ->> p.base_model)::int, $4::int)
+       ) AS _history,
+       (SELECT summary FROM chat_summaries WHERE chat_id = $1) AS _summary
+FROM (SELECT $1::uuid AS id) k
+LEFT JOIN chats c ON c.id = k.id
+LEFT JOIN model_profiles p ON p.id = COALESCE($2::uuid, c.model_profile_id)
+"""
+
+@metrics.timed_db
+async def load_message_context(conn: asyncpg.Connection, chat_id: UUID, profile_id: Optional[UUID], n: int,
+                               budget: Optional[int] = None, budgets: Optional[dict] = None):
+    """
+    Loads chat, model profile (profile_id override or the chat's linked one)
+    and the last n messages in a single statement. With a token budget the
+    history is further cut to the newest messages that fit it (budgets maps
+    base_model -> budget, budget is the fallback).
+    Returns (chat, profile, history, summary); chat/profile are None when
+    missing, history is chronological [{role, content, token_count}],
+    summary is the chat's rolling summary (or None).
+    """
+    row = await conn.fetchrow(
+        LOAD_MESSAGE_CONTEXT_SQL, chat_id, profile_id, n, budget, json.dumps(budgets) if budgets else None
+    )
+    return _context_from_row(row)
+
+def _context_from_row(row):
+    if row["_chat_id"] is None:
+        return None, None, [], None
+    chat = {"id": row["_chat_id"], "model_profile_id": row["_linked_profile_id"]}
+    profile = None
+    if row["id"] is not None:
+        profile = {k: v for k, v in row.items() if not k.startswith("_")}
+    history = json.loads(row["_history"]) if row["_history"] else []
+    return chat, profile, history, row["_summary"]
+
+LOAD_BATCH_CONTEXT_SQL = """
+SELECT k.idx AS _idx,
+       c.id AS _chat_id,
+       c.model_profile_id AS _linked_profile_id,
+       p.*,
+       (SELECT json_agg(json_build_object('role', h.role, 'content', h.content, 'token_count', h.token_count)
+                        ORDER BY h.created_at, h.id)
+        FROM (
+            SELECT role, content, token_count, created_at, id,
+                   sum(token_count) OVER (ORDER BY created_at DESC, id DESC ROWS UNBOUNDED PRECEDING) AS running
+            FROM messages WHERE chat_id = k.chat_id ORDER BY created_at DESC, id DESC LIMIT $3
+        ) h
+        WHERE $4::int IS NULL OR h.running <= COALESCE(($5::jsonb ->> p.base_model)::int, $4::int) - k.used
+       ) AS _history,
+       (SELECT summary FROM chat_summaries WHERE chat_id = k.chat_id) AS _summary
+FROM unnest($1::uuid[], $2::uuid[], $6::int[]) WITH ORDINALITY AS k(chat_id, profile_id, used, idx)
+LEFT JOIN chats c ON c.id = k.chat_id
+LEFT JOIN model_profiles p ON p.id = COALESCE(k.profile_id, c.model_profile_id)
+ORDER BY k.idx
+"""
+
+@metrics.timed_db
+async def load_batch_context(conn: asyncpg.Connection, chat_ids: List[UUID], profile_ids: List[Optional[UUID]], n: int,
+                             budget: Optional[int] = None, budgets: Optional[dict] = None,
+                             used: Optional[List[int]] = None):
+    """
+    Batch form of load_message_context: one statement for all items.
+    With a token budget (budget / budgets as in load_message_context, before
+    the new message) each item's history is cut to what fits once its
+    used[i] tokens are taken. Returns a list of (chat, profile, history,
+    summary) in item order.
+    """
+    rows = await conn.fetch(
+        LOAD_BATCH_CONTEXT_SQL, chat_ids, profile_ids, n, budget, json.dumps(budgets) if budgets else None,
+        used or [0] * len(chat_ids)
+    )
+    return [_context_from_row(r) for r in rows]
+
+APPEND_MESSAGES_SQL = f"""
+WITH m AS (
+    INSERT INTO messages (id, chat_id, role, content, token_count, created_at)
+    -- rows of one statement share now(): offset each by its input position so
+    -- (created_at, id) keeps the input order within a chat
+    SELECT id, chat_id, role, content, token_count,
+           COALESCE(created_at, now() + (idx - 1) * interval '1 microsecond')
+    FROM unnest($1::uuid[], $2::uuid[], $3::text[], $4::text[], $5::int[], $6::timestamptz[]) WITH ORDINALITY
+        AS t(id, chat_id, role, content, token_count, created_at, idx)
+), agg AS (
+    -- per chat: how many rows, their tokens, the newest stamp and the last one in input order
+    SELECT DISTINCT ON (chat_id) chat_id, role, content,
+           count(*) OVER w AS n, sum(token_count) OVER w AS tokens,
+           max(COALESCE(created_at, now() + (idx - 1) * interval '1 microsecond')) OVER w AS last_at
+    FROM unnest($2::uuid[], $3::text[], $4::text[], $5::int[], $6::timestamptz[]) WITH ORDINALITY
+        AS t(chat_id, role, content, token_count, created_at, idx)
+    WINDOW w AS (PARTITION BY chat_id)
+    ORDER BY chat_id, idx DESC
+), c AS (
+    UPDATE chats SET updated_at = GREATEST(now(), agg.last_at), message_count = chats.message_count + agg.n,
+                     total_tokens = chats.total_tokens + agg.tokens, last_role = agg.role,
+                     last_message_preview = left(agg.content, {LAST_MESSAGE_PREVIEW_CHARS})
+    FROM agg WHERE chats.id = agg.chat_id
+)
+SELECT 1
+"""
+
+@metrics.timed_db
+async def append_messages(conn: asyncpg.Connection, messages: List[tuple], ids: Optional[List[UUID]] = None,
+                          created_at: Optional[list] = None, counts: Optional[List[int]] = None):
+    """
+    Bulk append_message: messages is a list of (chat_id, role, content).
+    One statement; returns the new ids in input order.
+    ids / created_at / counts (input order) are for writers that handed ids
+    out before the insert (write-behind sessions); created_at defaults to now(),
+    offset by a microsecond per row so input order survives.
+    """
+    if not messages:
+        return []
+    chat_ids, roles, contents = (list(col) for col in zip(*messages))
+    # ids are generated here so they map to inputs without relying on RETURNING order
+    ids = ids or [uuid4() for _ in messages]
+    counts = counts or [tokens.count_tokens(c) for c in contents]
+    await conn.execute(APPEND_MESSAGES_SQL, ids, chat_ids, roles, contents, counts, created_at or [None] * len(messages))
+    db.mark_written("chats", *{f"chat:{c}" for c in chat_ids})
+    return ids
+
+@metrics.timed_db
+async def existing_chat_ids(conn: asyncpg.Connection, chat_ids: List[UUID]) -> set:
+    rows = await conn.fetch("SELECT id FROM chats WHERE id = ANY($1::uuid[])", chat_ids)
+    return {str(r["id"]) for r in rows}
+
+@metrics.timed_db
+async def list_messages(conn: asyncpg.Connection, chat_id: UUID, limit: int = 100, after: Optional[tuple] = None,
+                        include_archived: bool = False):
+    """
+    Oldest first, keyset-paginated on (created_at, id).
+    include_archived also returns history moved to message_archive (slower).
+    """
+    if include_archived:
+        rows = await conn.fetch(
+            LIST_MESSAGES_WITH_ARCHIVE_SQL, chat_id, after[0] if after else None, after[1] if after else None, limit
+        )
+    elif after is None:
+        rows = await conn.fetch(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE chat_id = $1 ORDER BY created_at ASC, id ASC LIMIT $2",
+            chat_id, limit
+        )
+    else:
+        rows = await conn.fetch(
+            f"""
+            SELECT {MESSAGE_COLUMNS} FROM messages WHERE chat_id = $1 AND (created_at, id) > ($2, $3)
+            ORDER BY created_at ASC, id ASC LIMIT $4
+            """,
+            chat_id, after[0], after[1], limit
+        )
+    return [dict(r) for r in rows]
+
+async def iter_messages(conn: asyncpg.Connection, chat_id: UUID, prefetch: int = 1000, include_archived: bool = False):
+    """
+    Streams every message of a chat through a server-side cursor
+    (constant memory). Must be called inside a transaction.
+    Archived months come first: they are always older than live partitions.
+    """
+    if include_archived:
+        async for row in conn.cursor(
+            ARCHIVED_MESSAGES_SQL + " ORDER BY a.period, r.created_at, r.id", chat_id, prefetch=prefetch
+        ):
+            yield row
+    async for row in conn.cursor(
+        f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE chat_id = $1 ORDER BY created_at ASC, id ASC",
+        chat_id, prefetch=prefetch
+    ):
+        yield row
+
+
+async def iter_chats(conn: asyncpg.Connection, prefetch: int = 1000):
+    """
+    Streams every chat, oldest first, through a server-side cursor.
+    Must be called inside a transaction.
+    """
+    async for row in conn.cursor("SELECT * FROM chats ORDER BY created_at ASC, id ASC", prefetch=prefetch):
+        yield row
+
+
+# Bulk import and cloning
+# COPY column order of the records built by app/bulk.py
+CHAT_COPY_COLUMNS = ("id", "title", "model_profile_id", "created_at", "updated_at")
+MESSAGE_COPY_COLUMNS = ("id", "chat_id", "role", "content", "token_count", "created_at")
+
+@metrics.timed_db
+async def copy_chats(conn: asyncpg.Connection, records) -> int:
+    """
+    COPYs chat records (tuples in CHAT_COPY_COLUMNS order, iterable or async
+    iterable). Returns the number of rows copied.
+    """
+    status = await conn.copy_records_to_table("chats", records=records, columns=CHAT_COPY_COLUMNS)
+    db.mark_written("chats")
+    return int(status.split()[-1])
+
+@metrics.timed_db
+async def copy_messages(conn: asyncpg.Connection, records) -> int:
+    """
+    COPYs message records (tuples in MESSAGE_COPY_COLUMNS order). Chat
+    counters are not touched: follow with apply_imported_messages.
+    """
+    status = await conn.copy_records_to_table("messages", records=records, columns=MESSAGE_COPY_COLUMNS)
+    return int(status.split()[-1])
+
+IMPORTED_COUNTERS_SQL = f"""
+UPDATE chats c SET message_count = c.message_count + a.n, total_tokens = c.total_tokens + a.tokens,
+                   last_role = l.role, last_message_preview = left(l.content, {LAST_MESSAGE_PREVIEW_CHARS}),
+                   updated_at = GREATEST(c.updated_at, a.last_at)
+FROM unnest($1::uuid[], $2::int[], $3::bigint[], $4::timestamptz[]) AS a(chat_id, n, tokens, last_at)
+CROSS JOIN LATERAL (
+    -- imported rows can be older than what the chat had: take the newest overall
+    SELECT role, content FROM messages m WHERE m.chat_id = a.chat_id ORDER BY created_at DESC, id DESC LIMIT 1
+) l
+WHERE c.id = a.chat_id
+"""
+
+@metrics.timed_db
+async def apply_imported_messages(conn: asyncpg.Connection, chats: dict, first_at, last_at) -> int:
+    """
+    After copy_messages: adds the per-chat totals (chats maps chat_id ->
+    [count, tokens, newest created_at]) to the chat counters and moves rows
+    that landed in messages_default into their monthly partitions.
+    Returns how many partitions were created.
+    """
+    if not chats:
+        return 0
+    await conn.execute(
+        IMPORTED_COUNTERS_SQL,
+        list(chats), [a[0] for a in chats.values()], [a[1] for a in chats.values()], [a[2] for a in chats.values()],
+    )
+    db.mark_written("chats", *(f"chat:{c}" for c in chats))
+    return await conn.fetchval("SELECT ensure_message_partitions($1, $2)", first_at, last_at)
+
+CLONE_CHAT_SQL = """
+WITH src AS (
+    SELECT * FROM chats WHERE id = $1
+), new_chat AS (
+    INSERT INTO chats (title, model_profile_id, message_count, total_tokens, last_role, last_message_preview)
+    SELECT COALESCE($2, src.title), COALESCE($3, src.model_profile_id), src.message_count, src.total_tokens,
+           src.last_role, src.last_message_preview
+    FROM src
+    RETURNING *
+), msgs AS (
+    INSERT INTO messages (chat_id, role, content, token_count, created_at)
+    SELECT new_chat.id, m.role, m.content, m.token_count, m.created_at
+    FROM new_chat JOIN messages m ON m.chat_id = $1
+), archived AS (
+    -- archived months too, with fresh message ids
+    INSERT INTO message_archive (chat_id, period, message_count, first_created_at, last_created_at, messages)
+    SELECT new_chat.id, a.period, a.message_count, a.first_created_at, a.last_created_at,
+           (SELECT jsonb_agg(e || jsonb_build_object('id', gen_random_uuid()) ORDER BY i)
+            FROM jsonb_array_elements(a.messages) WITH ORDINALITY AS t(e, i))
+    FROM new_chat JOIN message_archive a ON a.chat_id = $1
+), summary AS (
+    -- the copies have fresh ids, so the cursor falls back to covered_until alone
+    INSERT INTO chat_summaries (chat_id, summary, covered_until, covered_until_id, covered_messages)
+    SELECT new_chat.id, s.summary, s.covered_until, NULL, s.covered_messages
+    FROM new_chat JOIN chat_summaries s ON s.chat_id = $1
+)
+SELECT * FROM new_chat
+"""
+
+@metrics.timed_db
+async def clone_chat(conn: asyncpg.Connection, chat_id: UUID, title: Optional[str] = None,
+                     model_profile_id: Optional[UUID] = None):
+    """
+    Copies a chat with its whole history (live messages, archived months,
+    summary and counters) in one statement; no message passes through Python.
+    title / model_profile_id override the source's. Returns the new chat, or
+    None when the source does not exist.
+    """
+    row = await conn.fetchrow(CLONE_CHAT_SQL, chat_id, title, model_profile_id)
+    if not row:
+        return None
+    db.mark_written("chats", f"chat:{row['id']}")
+    return dict(row)
+
+# Partitions and cold history (migration 010)
+# messages is range-partitioned by UTC month (messages_pYYYYMM); old months are
+# folded into message_archive, one compressed JSONB array per chat and month.
+PARTITION_NAME = re.compile(r"^messages_p[0-9]{6}$")
+
+ARCHIVED_MESSAGES_SQL = """
+SELECT r.id, a.chat_id, r.role, r.content, r.token_count, r.created_at
+FROM message_archive a
+CROSS JOIN LATERAL jsonb_to_recordset(a.messages)
+    AS r(id uuid, role text, content text, token_count int, created_at timestamptz)
+WHERE a.chat_id = $1
+"""
+
+LIST_MESSAGES_WITH_ARCHIVE_SQL = f"""
+SELECT * FROM (
+    SELECT {MESSAGE_COLUMNS} FROM messages
+    WHERE chat_id = $1 AND ($2::timestamptz IS NULL OR (created_at, id) > ($2, $3::uuid))
+    UNION ALL
+    {ARCHIVED_MESSAGES_SQL} AND ($2::timestamptz IS NULL OR a.last_created_at >= $2)
+) t
+WHERE $2::timestamptz IS NULL OR (created_at, id) > ($2, $3::uuid)
+ORDER BY created_at ASC, id ASC
+LIMIT $4
+"""
+
+@metrics.timed_db
+async def ensure_message_partitions(conn: asyncpg.Connection, months_ahead: int) -> int:
+    """
+    Creates missing monthly partitions from the current month to months_ahead
+    months out. Returns how many were created.
+    """
+    return await conn.fetchval(
+        "SELECT ensure_message_partitions(now(), now() + make_interval(months => $1))", months_ahead
+    )
+
+@metrics.timed_db
+async def list_message_partitions(conn: asyncpg.Connection) -> List[dict]:
+    """
+    Monthly partitions of messages, oldest first: [{name, period}].
+    """
+    rows = await conn.fetch(
+        """
+        SELECT c.relname AS name, to_date(substr(c.relname, 11), 'YYYYMM') AS period
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::regclass AND c.relname ~ '^messages_p[0-9]{6}$'
+        ORDER BY period
+        """
+    )
     return [dict(r) for r in rows]
 
+# a month archived earlier can come back (e.g. a bulk import of old messages recreates its
+# partition); its rows are merged into the existing archive row, in (created_at, id) order
+ARCHIVE_PARTITION_SQL = """
+WITH a AS (
+    SELECT chat_id, $1::date AS period, count(*) AS message_count, min(created_at) AS first_created_at,
+           max(created_at) AS last_created_at,
+           jsonb_agg(jsonb_build_object('id', id, 'role', role, 'content', content,
+                                        'token_count', token_count, 'created_at', created_at)
+                     ORDER BY created_at, id) AS messages
+    FROM {table} GROUP BY chat_id
+), ins AS (
+    INSERT INTO message_archive (chat_id, period, message_count, first_created_at, last_created_at, messages)
+    SELECT * FROM a
+    ON CONFLICT (chat_id, period) DO UPDATE SET
+        message_count = message_archive.message_count + EXCLUDED.message_count,
+        first_created_at = LEAST(message_archive.first_created_at, EXCLUDED.first_created_at),
+        last_created_at = GREATEST(message_archive.last_created_at, EXCLUDED.last_created_at),
+        messages = (SELECT jsonb_agg(e ORDER BY (e ->> 'created_at')::timestamptz, (e ->> 'id')::uuid)
+                    FROM jsonb_array_elements(message_archive.messages || EXCLUDED.messages) e),
+        archived_at = now()
+)
+SELECT COALESCE(sum(message_count), 0)::int FROM a
+"""
+
+class PartitionNotArchivable(ValueError):
+    """
+    The partition holds messages without a chat_id, which message_archive
+    cannot take; it is left attached so they are not dropped unarchived.
+    """
+
+# longest the final DETACH waits for the ACCESS EXCLUSIVE lock on messages; a pass that
+# times out rolls back and the partition is retried on the next one
+ARCHIVE_DETACH_LOCK_TIMEOUT = "5s"
+
+@metrics.timed_db
+async def archive_message_partition(conn: asyncpg.Connection, name: str, period) -> int:
+    """
+    Folds one monthly partition into message_archive, then detaches and drops
+    it, in one transaction. The slow part (aggregating the month) runs on the
+    still-attached partition under a SHARE lock on that partition only, so
+    reads of messages and writes to other months carry on. Only the final
+    DETACH + DROP holds ACCESS EXCLUSIVE on messages, and only briefly.
+    (DETACH ... CONCURRENTLY is not an option: messages has a default
+    partition.) Returns the number of archived messages.
+    Raises PartitionNotArchivable (nothing changed) if some rows have no chat_id.
+    """
+    if not PARTITION_NAME.match(name):
+        raise ValueError(f"Not a monthly messages partition: {name}")
+    table = f'"{name}"'
+    async with conn.transaction():
+        await conn.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        orphans = await conn.fetchval(f"SELECT count(*) FROM {table} WHERE chat_id IS NULL")
+        if orphans:
+            raise PartitionNotArchivable(f"{name}: {orphans} messages without a chat_id")
+        archived = await conn.fetchval(ARCHIVE_PARTITION_SQL.format(table=table), period)
+        await conn.execute(f"SET LOCAL lock_timeout = '{ARCHIVE_DETACH_LOCK_TIMEOUT}'")
+        await conn.execute(f"ALTER TABLE messages DETACH PARTITION {table}")
+        await conn.execute(f"DROP TABLE {table}")
+    return archived
+
+
+# Message search (migration 008)
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+# headlines are built over HTML-escaped content, so the <mark> tags are the only markup in a snippet
+# (the default parser reads entities as single tokens, so matching is unchanged)
+_ESCAPED_CONTENT = ("replace(replace(replace(replace(replace(h.content, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'), "
+                    "'\"', '&quot;'), '''', '&#39;')")
+
+# full text: tsvector @@ websearch query, ranked with ts_rank_cd (GIN on search_tsv)
+# fuzzy: trigram word similarity, so typos and partial words still match (GIN on content);
+# the headline then only marks exact words
+_SEARCH_MATCH = {
+    False: ("m.search_tsv @@ websearch_to_tsquery('english', $1)",
+            "ts_rank_cd(m.search_tsv, websearch_to_tsquery('english', $1))",
+            "ts_headline('english', {content}, websearch_to_tsquery('english', $1), '{options}')"),
+    True: ("$1 <% m.content",
+           "word_similarity($1, m.content)",
+           "ts_headline('simple', {content}, plainto_tsquery('simple', $1), '{options}')"),
+}
+
+def _search_sql(fuzzy: bool, scoped: bool) -> str:
+    """
+    $1 query text, $2 chat id (scoped only), then cursor rank / id and limit.
+    Keyset pagination on (rank DESC, id DESC); headlines are only built for
+    the rows of the page.
+    """
+    match, rank, headline = _SEARCH_MATCH[fuzzy]
+    scope = "AND m.chat_id = $2" if scoped else ""
+    n = 3 if scoped else 2
+    return f"""
+SELECT h.id, h.chat_id, c.title AS chat_title, h.role, h.created_at, h.rank,
+       {headline.format(content=_ESCAPED_CONTENT, options=SEARCH_HEADLINE_OPTIONS)} AS highlight
+FROM (
+    SELECT m.id, m.chat_id, m.role, m.content, m.created_at, {rank}::real AS rank
+    FROM messages m
+    WHERE {match} {scope}
+      AND (${n}::real IS NULL OR ({rank}::real, m.id) < (${n}::real, ${n + 1}::uuid))
+    ORDER BY rank DESC, m.id DESC
+    LIMIT ${n + 2}
+) h
+JOIN chats c ON c.id = h.chat_id
+ORDER BY h.rank DESC, h.id DESC
+"""
+
+SEARCH_SQL = {(fuzzy, scoped): _search_sql(fuzzy, scoped) for fuzzy in (False, True) for scoped in (False, True)}
+
+@metrics.timed_db
+async def search_messages(conn: asyncpg.Connection, query: str, chat_id: Optional[UUID] = None, limit: int = 20,
+                          after: Optional[tuple] = None, fuzzy: bool = False):
+    """
+    Ranked message search, across all chats or within chat_id.
+    after is the (rank, id) of the last row of the previous page.
+    Rows carry a highlighted snippet (<mark>...</mark>) and the chat title.
+    Apart from the <mark> tags the snippet is HTML-escaped, so clients can
+    render it as HTML.
+    """
+    rank, last_id = after if after else (None, None)
+    args = (query, chat_id) if chat_id is not None else (query,)
+    rows = await conn.fetch(SEARCH_SQL[(fuzzy, chat_id is not None)], *args, rank, last_id, limit)
+    return [dict(r) for r in rows]
+
+
+# Chat summaries
+@metrics.timed_db
+async def get_summary(conn: asyncpg.Connection, chat_id: UUID):
+    row = await conn.fetchrow("SELECT * FROM chat_summaries WHERE chat_id = $1", chat_id)
+    return dict(row) if row else None
+
+# $4 rows / $5 token budget (NULL = none): the history the next prompt carries, as in LOAD_MESSAGE_CONTEXT_SQL
+UNSUMMARIZED_TURNS_SQL = """
+WITH w AS (
+    SELECT created_at, id,
+           sum(token_count) OVER (ORDER BY created_at DESC, id DESC ROWS UNBOUNDED PRECEDING) AS running
+    FROM messages WHERE chat_id = $1 ORDER BY created_at DESC, id DESC LIMIT $4
+), b AS (
+    -- oldest message still in the window
+    SELECT created_at, id FROM w WHERE $5::int IS NULL OR running <= $5
+    ORDER BY created_at ASC, id ASC LIMIT 1
+)
+SELECT m.id, m.role, m.content, m.created_at FROM messages m
+WHERE m.chat_id = $1
+  AND ($2::timestamptz IS NULL OR (m.created_at, m.id) > ($2, $3::uuid))
+  AND NOT EXISTS (SELECT 1 FROM b WHERE (m.created_at, m.id) >= (b.created_at, b.id))
+ORDER BY m.created_at ASC, m.id ASC LIMIT $6
+"""
+
+@metrics.timed_db
+async def get_unsummarized_turns(conn: asyncpg.Connection, chat_id: UUID, after, after_id: Optional[UUID],
+                                 window: int, budget: Optional[int], limit: int):
+    """
+    Messages past the summary's cursor (after, after_id = covered_until,
+    covered_until_id; None = from the start) that are older than the prompt
+    window: the newest `window` messages, or with a token budget the newest
+    of those whose cumulative token_count fits it. Oldest first. A NULL
+    after_id (summaries written before the id was kept) skips every message
+    at `after` itself, as the timestamp-only cursor did.
+    """
+    rows = await conn.fetch(UNSUMMARIZED_TURNS_SQL, chat_id, after, after_id, window, budget, limit)
+    return [dict(r) for r in rows]
+
+@metrics.timed_db
+async def upsert_summary(conn: asyncpg.Connection, chat_id: UUID, summary: str, covered_until,
+                         covered_until_id: UUID, added: int):
+    await conn.execute(
+        """
+        INSERT INTO chat_summaries (chat_id, summary, covered_until, covered_until_id, covered_messages)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (chat_id) DO UPDATE SET summary = EXCLUDED.summary, covered_until = EXCLUDED.covered_until,
+            covered_until_id = EXCLUDED.covered_until_id,
+            covered_messages = chat_summaries.covered_messages + EXCLUDED.covered_messages, updated_at = now()
+        """,
+        chat_id, summary, covered_until, covered_until_id, added
+    )
+
+
+# Message jobs
+JOBS_CHANNEL = "message_jobs"
+JOBS_DONE_CHANNEL = "message_jobs_done"
+
+@metrics.timed_db
+async def create_job(conn: asyncpg.Connection, chat_id: UUID, model_profile: dict, messages: List[dict]):
+    row = await conn.fetchrow(
+        """
+        INSERT INTO message_jobs (chat_id, provider, model, response_cache, fallbacks, hedge, messages)
+        VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id, status, created_at
+        """,
+        chat_id, model_profile["provider"], model_profile["base_model"],
+        bool(model_profile.get("response_cache")), model_profile.get("fallbacks") or [],
+        bool(model_profile.get("hedge")), json.dumps(messages, default=str)
+    )
+    # wake an idle worker (delivered on commit)
+    await conn.execute("SELECT pg_notify($1, $2)", JOBS_CHANNEL, str(row["id"]))
+    return dict(row)
+
+@metrics.timed_db
+async def get_job(conn: asyncpg.Connection, job_id: UUID):
+    row = await conn.fetchrow(
+        """
+        SELECT id, chat_id, status, attempts, result, error, assistant_message_id, created_at, updated_at
+        FROM message_jobs WHERE id = $1
+        """,
+        job_id
+    )
+    return dict(row) if row else None
+
+# running jobs whose lock expired after their last allowed attempt: failed instead of reclaimed
+EXPIRE_JOBS_SQL = """
+WITH expired AS (
+    UPDATE message_jobs
+    SET status = 'failed', locked_at = NULL, updated_at = now(),
+        error = 'worker lost the job on each of ' || attempts || ' attempts'
+    WHERE status = 'running' AND locked_at < now() - make_interval(secs => $1) AND attempts >= $2
+    RETURNING id
+)
+SELECT count(pg_notify($3, id::text)) FROM expired
+"""
+
+@metrics.timed_db
+async def claim_job(conn: asyncpg.Connection, lock_timeout_s: float, max_attempts: int):
+    """
+    Claims the oldest queued job whose run_after has passed (or a running
+    one locked longer than lock_timeout_s, i.e. its worker died, with
+    attempts left) with FOR UPDATE SKIP LOCKED so concurrent workers never
+    block each other. Orphaned jobs without attempts left are failed first.
+    """
+    await conn.execute(EXPIRE_JOBS_SQL, lock_timeout_s, max_attempts, JOBS_DONE_CHANNEL)
+    row = await conn.fetchrow(
+        """
+        UPDATE message_jobs SET status = 'running', attempts = attempts + 1, locked_at = now(), updated_at = now()
+        WHERE id = (
+            SELECT id FROM message_jobs
+            WHERE (status = 'queued' AND run_after <= now())
+               OR (status = 'running' AND locked_at < now() - make_interval(secs => $1) AND attempts < $2)
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+        """,
+        lock_timeout_s, max_attempts
+    )
+    if not row:
+        return None
+    job = dict(row)
+    job["messages"] = json.loads(job["messages"])
+    return job
+
+@metrics.timed_db
+async def complete_job(conn: asyncpg.Connection, job: dict, reply: str):
+    """
+    Persists the assistant reply and marks the job done, in one transaction.
+    """
+    async with conn.transaction():
+        # unwrapped: this call's own timing already covers the insert
+        msg = await append_message.__wrapped__(conn, job["chat_id"], "assistant", reply)
+        await conn.execute(
+            """
+            UPDATE message_jobs SET status = 'done', result = $2, assistant_message_id = $3, updated_at = now()
+            WHERE id = $1
+            """,
+            job["id"], reply, msg["id"]
+        )
+        await conn.execute("SELECT pg_notify($1, $2)", JOBS_DONE_CHANNEL, str(job["id"]))
+    return msg
+
+@metrics.timed_db
+async def fail_job(conn: asyncpg.Connection, job: dict, error: str, retry: bool, delay_s: float = 0.0):
+    """
+    Fails the job, or with retry requeues it to be claimed no sooner than
+    delay_s from now.
+    """
+    await conn.execute(
+        """
+        UPDATE message_jobs SET status = $2, error = $3, locked_at = NULL, updated_at = now(),
+            run_after = now() + make_interval(secs => $4)
+        WHERE id = $1
+        """,
+        job["id"], "queued" if retry else "failed", error[:2000], delay_s
+    )
+    if not retry:
+        await conn.execute("SELECT pg_notify($1, $2)", JOBS_DONE_CHANNEL, str(job["id"]))
+
+
+# Startup warm-up (db.warm_up_db_pools): each hot statement runs once per connection
+# against the nil id, which matches nothing, so it is prepared before the first request.
+_NIL = UUID(int=0)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+async def warm_write_statements(conn: asyncpg.Connection):
+    await load_message_context(conn, _NIL, None, 1)
+    await get_last_n_messages(conn, _NIL, 1)
+    await get_model_profile(conn, _NIL)
+    await get_job(conn, _NIL)
+
+async def warm_read_statements(conn: asyncpg.Connection):
+    await list_chats(conn, 1)
+    await list_chats(conn, 1, (_EPOCH, _NIL))
+    await list_messages(conn, _NIL, 1)
+    await list_messages(conn, _NIL, 1, (_EPOCH, _NIL))
+    await list_model_profiles(conn)
+
 
 
 # Explanation & important points
@@ -89,6 +796,24 @@ async def list_messages(conn: asyncpg.Connection, chat_id: UUID, limit: int = 10
 
 #  update_model_profile builds an update statement for passed fields only.
 
-#  append_message also updates chats.updated_at.
+#  update_model_profile / delete_model_profile invalidate the profile cache (app/cache.py).
+
+#  Every crud coroutine is timed into db_query_duration_seconds{function=...} (app/metrics.py).
+
+#  append_message also updates chats.updated_at and the denormalized message_count / total_tokens / last_role / last_message_preview (same statement, via a CTE), so list_chats needs no joins.
+
+#  load_message_context is the message hot path: chat + profile + context window in one round trip.
+#  In CONTEXT_MODE=tokens the window is a cumulative sum over messages.token_count (stored at write time by append_message).
+#  asyncpg prepares and caches each statement per connection, so the constant SQL above is parsed once.
+
+#  list_chats / list_messages use keyset pagination ((updated_at, id) / (created_at, id)), backed by migration 003.
+
+#  Message jobs are claimed with FOR UPDATE SKIP LOCKED (claim_job); completion notifies message_jobs_done for long-pollers.
+
+#  Retried jobs wait out run_after (fail_job delay_s); orphaned running jobs are reclaimed only while attempts remain.
+
+#  get_last_n_messages returns messages in chronological order (oldest -> newest), which the model expects.
+
+#  Bulk imports COPY rows (copy_chats / copy_messages, fed by app/bulk.py) and fix up chat counters once per chat; clone_chat copies a chat server-side with INSERT ... SELECT.
 
-#  get_last_n_messages returns messages in chronological order (oldest -> newest), which the model expects.
\ No newline at end of file
+#  Writes call db.mark_written so reads routed to replicas (db.get_read_pool) stay on the primary while the replica catches up.
\ No newline at end of file
@@ -1,32 +1,323 @@
 # app/db.py
+import asyncio
 import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import asyncpg
 from fastapi import FastAPI
+from . import log, metrics
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# comma-separated read-replica DSNs; without them reads get their own pool on DATABASE_URL
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# after a write, reads of the same chat go to the primary for this long (should exceed replica lag)
+READ_STICKY_S = float(os.getenv("DB_READ_STICKY_S", "5"))
+# a replica that failed to hand out a connection is skipped for this long
+REPLICA_RETRY_S = float(os.getenv("DB_REPLICA_RETRY_S", "10"))
+# connections opened and warmed per pool at startup
+POOL_WARM = int(os.getenv("DB_POOL_WARM", "4"))
 
-async def init_db_pool(app: FastAPI):
-    database_url = os.getenv("DATABASE_URL")
+_CONNECT_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.CannotConnectNowError)
+
+
+class TimedPool:
+    """
+    Thin wrapper over asyncpg.Pool that records how long acquire() waits and
+    how often the pool was saturated (every connection checked out).
+    Everything else is delegated to the underlying pool.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, name: str = "primary"):
+        self._pool = pool
+        self.name = name
+        self.acquires = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        self.saturated = 0
+        self.in_use = 0
+        self.in_use_max = 0
+        self.errors = 0
+        self.down_until = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        start = time.perf_counter()
+        if self._pool.get_idle_size() == 0 and self._pool.get_size() >= self._pool.get_max_size():
+            self.saturated += 1
+        try:
+            conn = await self._pool.acquire()
+        except _CONNECT_ERRORS:
+            self.errors += 1
+            self.down_until = time.monotonic() + REPLICA_RETRY_S
+            raise
+        wait = time.perf_counter() - start
+        self.acquires += 1
+        self.acquire_wait_total += wait
+        if wait > self.acquire_wait_max:
+            self.acquire_wait_max = wait
+        self.in_use += 1
+        if self.in_use > self.in_use_max:
+            self.in_use_max = self.in_use
+        metrics.observe_pool_wait(wait, self.name)
+        metrics.observe_pool_in_use(self.in_use, self.name)
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            metrics.observe_pool_in_use(self.in_use, self.name)
+            await self._pool.release(conn)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def available(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    async def warm_up(self, prepare, n: int) -> int:
+        """
+        Checks out n connections at once, so the missing ones are opened in
+        parallel, and runs prepare(conn) on each to fill asyncpg's statement
+        cache. Returns how many connections were warmed.
+        """
+        n = min(n, self._pool.get_max_size())
+        results = await asyncio.gather(*(self._pool.acquire() for _ in range(n)), return_exceptions=True)
+        conns = [c for c in results if not isinstance(c, BaseException)]
+        try:
+            await asyncio.gather(*(prepare(c) for c in conns))
+        finally:
+            for c in conns:
+                await self._pool.release(c)
+        return len(conns)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": self.in_use,
+            "in_use_max": self.in_use_max,
+            "utilization": round(self.in_use / self._pool.get_max_size(), 4),
+            "acquires": self.acquires,
+            "saturated_acquires": self.saturated,
+            "saturation_ratio": round(self.saturated / self.acquires, 4) if self.acquires else 0.0,
+            "acquire_wait_total_s": round(self.acquire_wait_total, 6),
+            "acquire_wait_mean_s": round(self.acquire_wait_total / self.acquires, 6) if self.acquires else 0.0,
+            "acquire_wait_max_s": round(self.acquire_wait_max, 6),
+            "errors": self.errors,
+            "available": self.available(),
+        }
+
+async def create_db_pool(dsn: Optional[str] = None, name: str = "primary",
+                         min_env: str = "DB_POOL_MIN", max_env: str = "DB_POOL_MAX") -> TimedPool:
+    database_url = dsn or os.getenv("DATABASE_URL")
     if not database_url:
         raise RuntimeError("DATABASE_URL env var is required")
-    app.state.db_pool = await asyncpg.create_pool(dsn=database_url, min_size=1, max_size=10)
+    pool = await asyncpg.create_pool(
+        dsn=database_url,
+        min_size=int(os.getenv(min_env, "1")),
+        max_size=int(os.getenv(max_env, "10")),
+    )
+    return TimedPool(pool, name)
+
+async def create_read_pools() -> List[TimedPool]:
+    """
+    One pool per replica, sized with DB_READ_POOL_MIN / DB_READ_POOL_MAX
+    independently of the write pool. None without replicas.
+    """
+    return list(await asyncio.gather(*(
+        create_db_pool(dsn, f"replica{i}", "DB_READ_POOL_MIN", "DB_READ_POOL_MAX") for i, dsn in enumerate(REPLICA_URLS)
+    )))
+
+async def init_db_pool(app: FastAPI):
+    app.state.db_pool, replicas = await asyncio.gather(create_db_pool(), create_read_pools())
+    # without replicas reads share the primary pool: a second pool on the same server only adds connections
+    app.state.db_read_pools = replicas or [app.state.db_pool]
+    start_write_broadcast(app.state.db_pool)
+    await start_write_listener(app)
+
+async def warm_up_db_pools(app: FastAPI, prepare_write, prepare_read) -> dict:
+    """
+    Startup: opens POOL_WARM connections per pool in parallel and prepares
+    the hot statements on them, so the first requests skip connect + parse.
+    """
+    primary = app.state.db_pool
+    if primary in app.state.db_read_pools:
+        # no replicas: the primary serves both
+        async def prepare_primary(conn):
+            await prepare_write(conn)
+            await prepare_read(conn)
+    else:
+        prepare_primary = prepare_write
+    pools = [(primary, prepare_primary)] + [(p, prepare_read) for p in app.state.db_read_pools if p is not primary]
+    warmed = await asyncio.gather(*(p.warm_up(prepare, POOL_WARM) for p, prepare in pools))
+    return {p.name: n for (p, _), n in zip(pools, warmed)}
 
 async def close_db_pool(app: FastAPI):
+    await stop_write_broadcast()
+    listener = getattr(app.state, "db_write_listener", None)
+    if listener:
+        await listener.close()
     pool = getattr(app.state, "db_pool", None)
     if pool:
         await pool.close()
+    for read_pool in getattr(app.state, "db_read_pools", ()):
+        if read_pool is not pool:
+            await read_pool.close()
 
 # convenience helper
 def get_db_pool(app: FastAPI):
     return app.state.db_pool
 
 
+# ---- Read routing ----
+# stickiness key ("chat:<id>", "chats", "model_profiles", ...) -> monotonic time the window ends
+_written: "OrderedDict[str, float]" = OrderedDict()
+
+# Writes are broadcast to the other processes (API workers, job workers) on this channel,
+# so a write in one process keeps the same keys on the primary in all of them
+WRITTEN_CHANNEL = "model_studio_written"
+# identifies this process in write notifications, so it ignores its own
+_ORIGIN = uuid.uuid4().hex[:12]
+# NOTIFY payloads are limited to 8000 bytes
+_NOTIFY_MAX_BYTES = 7900
+_outbox: set = set()
+_broadcast_pool = None
+_broadcast_task: Optional[asyncio.Task] = None
+# while the listener connection is down, writes elsewhere are missed: every keyed read uses the primary
+_listener_down = False
+
+def _remember(keys):
+    now = time.monotonic()
+    for key in keys:
+        _written.pop(key, None)
+        _written[key] = now + READ_STICKY_S
+    # same window for every key, so the oldest entries are at the front
+    while _written and next(iter(_written.values())) < now:
+        _written.popitem(last=False)
+
+def mark_written(*keys: str):
+    """
+    Records a write so reads of the same keys stay on the primary for
+    READ_STICKY_S (read-your-writes while replicas catch up), in this
+    process at once and in the others once the broadcast arrives.
+    """
+    global _broadcast_task
+    if not REPLICA_URLS:
+        return
+    _remember(keys)
+    if _broadcast_pool is not None:
+        _outbox.update(keys)
+        if _broadcast_task is None or _broadcast_task.done():
+            _broadcast_task = asyncio.ensure_future(_broadcast())
+
+def _payloads(keys) -> List[str]:
+    payloads, current = [], []
+    size = len(_ORIGIN) + 1
+    for key in keys:
+        if current and size + len(key) + 1 > _NOTIFY_MAX_BYTES:
+            payloads.append(f"{_ORIGIN}|{','.join(current)}")
+            current, size = [], len(_ORIGIN) + 1
+        current.append(key)
+        size += len(key) + 1
+    if current:
+        payloads.append(f"{_ORIGIN}|{','.join(current)}")
+    return payloads
+
+async def _broadcast():
+    # sent right after the write statement (before the response), keys coalesced while a send is in flight.
+    # Arriving before the commit only starts the window a little early
+    while _outbox:
+        keys = list(_outbox)
+        _outbox.clear()
+        try:
+            await _broadcast_pool.execute(
+                "SELECT pg_notify($1, p) FROM unnest($2::text[]) p", WRITTEN_CHANNEL, _payloads(keys)
+            )
+        except Exception as e:
+            log.emit("db_written_broadcast_failed", keys=len(keys), error=str(e)[:400])
+
+def start_write_broadcast(pool):
+    """
+    Sends this process's mark_written keys to the other processes through
+    pool. Also used by python -m app.worker.
+    """
+    global _broadcast_pool
+    if REPLICA_URLS:
+        _broadcast_pool = pool
+
+async def stop_write_broadcast():
+    global _broadcast_pool
+    if _broadcast_task is not None and not _broadcast_task.done():
+        await _broadcast_task
+    _broadcast_pool = None
+
+def _on_written(connection, pid, channel, payload: str):
+    origin, _, keys = payload.partition("|")
+    if origin != _ORIGIN and keys:
+        _remember(keys.split(","))
+
+def _on_listener_lost(connection):
+    global _listener_down
+    _listener_down = True
+    log.emit("db_written_listener_lost")
+
+async def start_write_listener(app: FastAPI):
+    """
+    Dedicated connection (outside the pools) receiving other processes'
+    writes. Only with replicas: without them every read hits the primary.
+    """
+    if not REPLICA_URLS:
+        return
+    conn = await asyncpg.connect(dsn=os.getenv("DATABASE_URL"))
+    await conn.add_listener(WRITTEN_CHANNEL, _on_written)
+    conn.add_termination_listener(_on_listener_lost)
+    app.state.db_write_listener = conn
+
+def _recently_written(keys) -> bool:
+    now = time.monotonic()
+    return any(_written.get(key, 0.0) > now for key in keys)
+
+def get_read_pool(app: FastAPI, *keys: str) -> TimedPool:
+    """
+    Pool for a read-only query: the least busy available read pool, or the
+    primary while any of `keys` was written within READ_STICKY_S (or when
+    every replica is down).
+    """
+    if REPLICA_URLS and (_listener_down or _recently_written(keys)):
+        return app.state.db_pool
+    candidates = [p for p in app.state.db_read_pools if p.available()]
+    if not candidates:
+        return app.state.db_pool
+    return min(candidates, key=lambda p: p.in_use / p.get_max_size())
+
+def stats(app: FastAPI) -> dict:
+    return {
+        "write": app.state.db_pool.stats(),
+        "read": {p.name: p.stats() for p in app.state.db_read_pools},
+        "replicas": len(REPLICA_URLS),
+        "sticky_keys": len(_written),
+        "sticky_s": READ_STICKY_S,
+        "written_listener_down": _listener_down,
+    }
+
+
 # Explanation
 
-#  init_db_pool runs at app startup. It creates a connection pool used across requests.
+#  create_db_pool is also used outside the app (python -m app.worker).
+
+#  init_db_pool runs at app startup. It creates the write pool (DATABASE_URL) and the read pools.
+
+#  close_db_pool closes every pool on shutdown.
+
+#  Pools are wrapped in TimedPool so acquire wait and saturation are measurable (load tests, metrics, GET /db/stats).
+
+#  Write pool: DB_POOL_MIN / DB_POOL_MAX. Replica pools: DB_READ_POOL_MIN / DB_READ_POOL_MAX; without replicas reads use the write pool.
 
-#  close_db_pool closes pool on shutdown.
+#  Read-only endpoints take their pool from get_read_pool; crud write functions call mark_written for stickiness.
 
-#  We set min_size and max_size to reasonable defaults. You can tune them.
\ No newline at end of file
+#  mark_written keys are broadcast with pg_notify (WRITTEN_CHANNEL), so stickiness holds across API workers and job workers.
@@ -0,0 +1,72 @@
+# app/jobs.py
+import asyncio
+import os
+import time
+from typing import Dict, Set
+from uuid import UUID
+
+import asyncpg
+from fastapi import FastAPI
+
+from . import crud
+
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+FINAL_STATUSES = ("done", "failed")
+
+# job_id -> events of requests long-polling it in this process
+_waiters: Dict[str, Set[asyncio.Event]] = {}
+
+
+def _on_done(connection, pid, channel, payload: str):
+    for event in _waiters.get(payload, ()):
+        event.set()
+
+async def start_job_listener(app: FastAPI):
+    """
+    Dedicated connection LISTENing for finished jobs so long-polls return as
+    soon as a worker (in any process) completes one.
+    """
+    conn = await asyncpg.connect(dsn=os.getenv("DATABASE_URL"))
+    await conn.add_listener(crud.JOBS_DONE_CHANNEL, _on_done)
+    app.state.jobs_listener = conn
+
+async def stop_job_listener(app: FastAPI):
+    conn = getattr(app.state, "jobs_listener", None)
+    if conn:
+        await conn.close()
+
+async def wait_for_job(pool, job_id: UUID, timeout: float):
+    """
+    Returns the job once it is done/failed or when timeout expires.
+    Holds no DB connection while waiting; re-checks every JOB_POLL_INTERVAL_S
+    in case a notification was missed.
+    """
+    key = str(job_id)
+    event = asyncio.Event()
+    _waiters.setdefault(key, set()).add(event)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            async with pool.acquire() as conn:
+                job = await crud.get_job(conn, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINAL_STATUSES or remaining <= 0:
+                return job
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, JOB_POLL_INTERVAL_S))
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+    finally:
+        waiters = _waiters.get(key)
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                del _waiters[key]
+
+
+# Notes
+
+# Jobs are executed by python -m app.worker (separate processes, scaled independently of the API).
+
+# The API only enqueues (crud.create_job) and reads status; long-polls wake on pg_notify from workers.
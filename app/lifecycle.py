@@ -0,0 +1,40 @@
+# app/lifecycle.py
+"""
+Process state behind /health/live and /health/ready. Ready once the
+lifespan startup in app/main.py has warmed everything; draining from the
+first SIGTERM (app/serve.py) or the start of shutdown. Module-level because
+the signal handler runs outside the app.
+"""
+import os
+import time
+from typing import Optional
+
+# seconds open requests (streams, provider calls) get to finish once shutdown starts:
+# uvicorn's graceful shutdown (app/serve.py), then the lifespan's wait for provider calls
+SHUTDOWN_DRAIN_S = float(os.getenv("SHUTDOWN_DRAIN_S", "30"))
+
+_started = time.perf_counter()
+ready = False
+draining = False
+startup_s: Optional[float] = None
+
+
+def mark_ready():
+    global ready, startup_s
+    ready = True
+    startup_s = time.perf_counter() - _started
+
+def begin_drain():
+    global draining
+    draining = True
+
+def is_ready() -> bool:
+    return ready and not draining
+
+def stats() -> dict:
+    return {
+        "ready": is_ready(),
+        "draining": draining,
+        "pid": os.getpid(),
+        "startup_ms": round(startup_s * 1000, 1) if startup_s is not None else None,
+    }
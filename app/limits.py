@@ -0,0 +1,321 @@
+# app/limits.py
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from .routers.providers import PROVIDER_LIMITS, MODEL_CONCURRENCY
+
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "3"))
+BACKOFF_BASE_S = float(os.getenv("PROVIDER_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX_S = float(os.getenv("PROVIDER_BACKOFF_MAX", "20"))
+# longest a request may wait for a slot / rate budget before it is shed with 503
+QUEUE_TIMEOUT_S = float(os.getenv("PROVIDER_QUEUE_TIMEOUT", "10"))
+# estimated completion size counted against tokens/min
+REPLY_TOKENS_ESTIMATE = 512
+
+
+class RateLimited(Exception):
+    """
+    Upstream said slow down (429, or 503/529 overloaded).
+    """
+
+    def __init__(self, provider: str, status: int, retry_after: Optional[float], detail: str):
+        super().__init__(f"{provider} rate limited ({status}): {detail}")
+        self.provider = provider
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _overloaded(provider: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"{provider} is saturated, retry later",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+
+class TokenBucket:
+    """
+    Refills continuously at per_minute/60 per second up to per_minute.
+    Waiters queue FIFO on the lock. block_for() pauses the bucket when the
+    provider reports it is out of budget.
+    """
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def drain(self, remaining: float):
+        # provider-side budget is lower than our estimate: trust the provider
+        self.tokens = min(self.tokens, remaining)
+
+    async def acquire(self, amount: float, deadline: float, provider: str):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = (amount - self.tokens) / self.rate
+                if now + wait > deadline:
+                    raise _overloaded(provider, wait)
+                await asyncio.sleep(wait)
+
+
+class ProviderLimiter:
+    def __init__(self, provider: str, max_concurrency: int, requests_per_min: int, tokens_per_min: int, max_queue: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.model_semaphores: Dict[str, asyncio.Semaphore] = {
+            model: asyncio.Semaphore(n) for model, n in MODEL_CONCURRENCY.items() if n > 0
+        }
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.waiting = 0
+        self.active = 0
+        self.shed = 0
+        self.retries = 0
+
+    async def acquire(self, model: str, est_tokens: int) -> list:
+        """
+        Takes one concurrency slot (provider, then model) after paying the
+        request and token budgets; returns what release() gives back. Sheds
+        load with 503 when the queue is full or the wait would exceed
+        QUEUE_TIMEOUT_S.
+        """
+        if self.max_queue and self.waiting >= self.max_queue:
+            self.shed += 1
+            raise _overloaded(self.provider, 1)
+        deadline = time.monotonic() + QUEUE_TIMEOUT_S
+        acquired = []
+        done = False
+        self.waiting += 1
+        try:
+            for sem in (self.semaphore, self.model_semaphores.get(model)):
+                if sem is None:
+                    continue
+                await asyncio.wait_for(sem.acquire(), max(0.0, deadline - time.monotonic()))
+                acquired.append(sem)
+            await self.requests.acquire(1, deadline, self.provider)
+            await self.tokens.acquire(est_tokens, deadline, self.provider)
+            done = True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise _overloaded(self.provider, 1)
+        except HTTPException:
+            self.shed += 1
+            raise
+        finally:
+            self.waiting -= 1
+            # shed, or cancelled while queued (single-flight waiter gone, hedge loser, client disconnect)
+            if not done:
+                for sem in acquired:
+                    sem.release()
+        self.active += 1
+        return acquired
+
+    def release(self, acquired: list):
+        self.active -= 1
+        for sem in reversed(acquired):
+            sem.release()
+
+    @asynccontextmanager
+    async def slot(self, model: str, est_tokens: int):
+        """
+        Holds one slot (see acquire) for the duration of the block.
+        """
+        acquired = await self.acquire(model, est_tokens)
+        try:
+            yield
+        finally:
+            self.release(acquired)
+
+    def observe(self, headers):
+        """
+        Adapt to the provider's own view of our budget (OpenAI x-ratelimit-*,
+        Anthropic anthropic-ratelimit-* headers).
+        """
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}") or headers.get(f"anthropic-ratelimit-{kind}-remaining")
+            reset = headers.get(f"x-ratelimit-reset-{kind}") or headers.get(f"anthropic-ratelimit-{kind}-reset")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            bucket.drain(remaining)
+            if remaining <= 0 and reset:
+                bucket.block_for(parse_reset(reset))
+
+    def backoff(self, retry_after: Optional[float]):
+        self.retries += 1
+        if retry_after:
+            self.requests.block_for(retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "shed": self.shed,
+            "retries": self.retries,
+        }
+
+
+def parse_reset(value: str) -> float:
+    """
+    Seconds until a rate-limit window resets. Accepts OpenAI durations
+    ("1s", "6m0s", "250ms"), plain seconds and RFC 3339 timestamps (Anthropic).
+    """
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if "T" in value:
+        try:
+            reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+        except ValueError:
+            return 1.0
+    total, num = 0.0, ""
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            num += ch
+            i += 1
+            continue
+        unit = "ms" if value[i:i + 2] == "ms" else ch
+        i += len(unit)
+        if num and unit in units:
+            total += float(num) * units[unit]
+        num = ""
+    return total or 1.0
+
+def parse_retry_after(headers) -> Optional[float]:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float]) -> float:
+    # full jitter exponential backoff, never shorter than what the provider asked for
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    # cheap ~4 chars/token estimate; exact counts are not worth tokenizing for admission control
+    return sum(len(m["content"]) for m in messages) // 4 + REPLY_TOKENS_ESTIMATE
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = ProviderLimiter(provider, **PROVIDER_LIMITS.get(provider, {
+            "max_concurrency": 0, "requests_per_min": 0, "tokens_per_min": 0, "max_queue": 0,
+        }))
+        _limiters[provider] = limiter
+    return limiter
+
+async def call_with_limits(provider: str, model: str, messages: List[Dict], call):
+    """
+    Runs call() under the provider's limits, retrying RateLimited with
+    jittered exponential backoff (outside the concurrency slot).
+    """
+    limiter = get_limiter(provider)
+    est = estimate_tokens(messages)
+    for attempt in range(PROVIDER_MAX_RETRIES + 1):
+        async with limiter.slot(model, est):
+            try:
+                return await call()
+            except RateLimited as e:
+                limiter.backoff(e.retry_after)
+                delay = backoff_delay(attempt, e.retry_after)
+                if attempt == PROVIDER_MAX_RETRIES or delay > BACKOFF_MAX_S:
+                    # out of retries, or the provider wants us gone for longer than we would wait
+                    raise _overloaded(provider, delay)
+        await asyncio.sleep(delay)
+
+class _HeldSlot:
+    """
+    A slot taken before its stream starts. Released once: when the stream
+    ends, or when it is garbage collected if the stream was never iterated
+    (the client left before the response started).
+    """
+
+    def __init__(self, limiter: ProviderLimiter, acquired: list):
+        self.limiter = limiter
+        self.acquired = acquired
+
+    def release(self):
+        if self.acquired is not None:
+            self.limiter.release(self.acquired)
+            self.acquired = None
+
+    __del__ = release
+
+async def stream_with_limits(provider: str, model: str, messages: List[Dict], deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Takes the stream's slot before returning it, so saturation is a 503 +
+    Retry-After before the response starts rather than an error event after
+    a 200. The stream holds the slot for its whole duration; no retries once
+    started.
+    """
+    limiter = get_limiter(provider)
+    held = _HeldSlot(limiter, await limiter.acquire(model, estimate_tokens(messages)))
+    return _hold_slot(held, provider, deltas)
+
+async def _hold_slot(held: _HeldSlot, provider: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        async for delta in deltas:
+            yield delta
+    except RateLimited as e:
+        held.limiter.backoff(e.retry_after)
+        raise _overloaded(provider, e.retry_after or 1)
+    finally:
+        held.release()
+
+def active() -> int:
+    # upstream calls and streams currently holding a slot, all providers
+    return sum(limiter.active for limiter in _limiters.values())
+
+def stats() -> dict:
+    return {provider: limiter.stats() for provider, limiter in _limiters.items()}
+
+
+# Notes
+
+# Limits are configured beside MODEL_CATALOG (PROVIDER_LIMITS / MODEL_CONCURRENCY in app/routers/providers.py).
+
+# Saturation surfaces as 503 + Retry-After instead of piling up requests or passing 429s through.
@@ -0,0 +1,139 @@
+# app/log.py
+import atexit
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import orjson
+
+# set per request by timing_middleware; inherited by tasks spawned while handling it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# records the writer thread pulls before one write+flush
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    """
+    "/health=0,/chats/{chat_id}/messages=0.1" -> {route template: keep probability}
+    """
+    rates = {}
+    for part in raw.split(","):
+        route, _, rate = part.strip().partition("=")
+        if route and rate:
+            rates[route] = float(rate)
+    return rates
+
+# access-log sampling per route template; unlisted routes are always logged
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "/health=0.01,/health/live=0.01,/health/ready=0.01,/metrics=0"))
+
+
+class _Pipeline:
+    """
+    Bounded queue drained by one daemon thread. emit() never blocks: when the
+    queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, maxsize: int, stream):
+        self.queue: "queue.Queue[dict]" = queue.Queue(maxsize)
+        self.stream = stream
+        self.dropped = 0
+        self.written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def put(self, record: dict):
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            batch = [record]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write(batch)
+                    return
+                batch.append(record)
+            self._write(batch)
+
+    def _write(self, batch):
+        out = b"".join(orjson.dumps(r, default=str, option=orjson.OPT_APPEND_NEWLINE) for r in batch)
+        try:
+            self.stream.write(out)
+            self.stream.flush()
+        except Exception:
+            self.dropped += len(batch)
+            return
+        self.written += len(batch)
+
+    def stop(self, timeout: float = 2.0):
+        """
+        Drain what is queued and stop the writer (shutdown / atexit).
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+
+_pipeline = _Pipeline(LOG_QUEUE_SIZE, getattr(sys.stdout, "buffer", sys.stdout))
+atexit.register(_pipeline.stop)
+
+
+def emit(event: str, **fields):
+    """
+    Queue one structured record: {"ts", "event", "request_id", **fields}.
+    Safe to call from the event loop; serialization and I/O happen on the writer thread.
+    """
+    record = {"ts": time.time(), "event": event, "request_id": request_id_var.get()}
+    record.update(fields)
+    _pipeline.put(record)
+
+def sampled(route: str) -> bool:
+    rate = LOG_SAMPLE_RATES.get(route)
+    return rate is None or (rate > 0 and random.random() < rate)
+
+def shutdown():
+    _pipeline.stop()
+
+def stats() -> dict:
+    return {
+        "queued": _pipeline.queue.qsize(),
+        "capacity": LOG_QUEUE_SIZE,
+        "written": _pipeline.written,
+        "dropped": _pipeline.dropped,
+    }
+
+
+# Notes
+
+# Logging never blocks request handling: records go into a bounded queue and an orjson writer thread does the I/O.
+
+# request_id comes from the X-Request-ID header (or is generated) and is attached to every record of that request.
@@ -1,20 +1,36 @@
 # app/logging_middleware.py
 from fastapi import Request
 import time
-import json
+import uuid
+from . import log, metrics
 
 async def timing_middleware(request: Request, call_next):
-    start = time.time()
-    response = await call_next(request)
-    duration = time.time() - start
-    # minimal log: method path status duration
-    print(json.dumps({
-        "method": request.method,
-        "path": request.url.path,
-        "status": response.status_code,
-        "duration_s": round(duration, 3)
-    }))
-    return response
+    # correlate every log record of this request (router, provider calls) via a contextvar
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = log.request_id_var.set(request_id)
+    try:
+        start = time.perf_counter()
+        response = await call_next(request)
+        duration = time.perf_counter() - start
+        # route template (e.g. /chats/{chat_id}/messages) keeps metric labels bounded
+        route = request.scope.get("route")
+        route_path = route.path if route else "unmatched"
+        metrics.observe_request(request.method, route_path, response.status_code, duration)
+        # minimal log: method path status duration (sampled per route, errors always kept)
+        if response.status_code >= 500 or log.sampled(route_path):
+            log.emit(
+                "request",
+                method=request.method,
+                path=request.url.path,
+                route=route_path,
+                status=response.status_code,
+                duration_ms=round(duration * 1000, 2),
+            )
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        log.request_id_var.reset(token)
 
 
-# Why: Minimal observability. Chat-specific logs will be inside routers when provider is used.
\ No newline at end of file
+# Why: Minimal observability. Chat-specific logs will be inside routers when provider is used.
+# Logging goes through app/log.py (queued, written by a background thread), so it never blocks the event loop.
@@ -1,15 +1,80 @@
 # app/main.py
 from fastapi import FastAPI
-from .db import init_db_pool, close_db_pool
+from .db import init_db_pool, close_db_pool, warm_up_db_pools
+from .providers import init_provider_clients, close_provider_clients
+from . import (archive, cache, completion_cache, crud, db, jobs, lifecycle, limits, log, metrics, providers, routing,
+               sessions, summaries, tokens)
 from .routers import providers as providers_router
 from .routers import model_profiles as model_profiles_router
 from .routers import chats as chats_router
+from .routers import jobs as jobs_router
 from .logging_middleware import timing_middleware
+from .serialization import FastJSONResponse
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
+
+async def _warm(event: str, step):
+    # a failed warm-up step only costs the first requests some latency
+    try:
+        return await step
+    except Exception as e:
+        log.emit(event, error=str(e)[:400])
+        return None
+
+async def _warm_cache(app: FastAPI):
+    async with app.state.db_pool.acquire() as conn:
+        return await cache.warm(conn)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup connects and warms everything before /health/ready turns 200:
+    DB pools (connections + prepared statements), provider connections,
+    the profile cache and the tokenizer, independent steps concurrently.
+    Shutdown stops reporting ready, lets running provider calls finish,
+    flushes write-behind state and closes everything.
+    """
+    start = time.perf_counter()
+    await asyncio.gather(init_db_pool(app), init_provider_clients())
+    warmed, _, providers_warm, profiles, *_ = await asyncio.gather(
+        _warm("db_warm_up_failed", warm_up_db_pools(app, crud.warm_write_statements, crud.warm_read_statements)),
+        # normally done by python -m app.archive; cheap when nothing is missing.
+        # Fails e.g. when another worker creates the same partition concurrently
+        _warm("partitions_ensure_failed", archive.ensure_partitions(app.state.db_pool)),
+        _warm("provider_warm_up_failed", providers.warm_provider_clients()),
+        _warm("cache_warm_up_failed", _warm_cache(app)),
+        # loads the tokenizer's BPE ranks off the event loop
+        _warm("tokenizer_warm_up_failed", asyncio.to_thread(tokens.count_tokens, "")),
+        # session turns are stamped on this host, corrected to the database clock
+        _warm("session_clock_sync_failed", sessions.sync_clock(app.state.db_pool)),
+        cache.start_invalidation_listener(app),
+        jobs.start_job_listener(app),
+    )
+    lifecycle.mark_ready()
+    log.emit("app_ready", startup_ms=round((time.perf_counter() - start) * 1000, 1), db_connections=warmed,
+             providers=providers_warm, profiles=profiles)
+    try:
+        yield
+    finally:
+        lifecycle.begin_drain()
+        left = await providers.drain(lifecycle.SHUTDOWN_DRAIN_S)
+        log.emit("app_draining", provider_calls_left=left)
+        await sessions.drain(app.state.db_pool)
+        await summaries.drain()
+        await jobs.stop_job_listener(app)
+        await cache.stop_invalidation_listener(app)
+        await close_provider_clients()
+        await close_db_pool(app)
+        metrics.mark_process_dead()
+        log.shutdown()
+
+
 def create_app():
-    app = FastAPI(title="mini-model-studio-api")
+    app = FastAPI(title="mini-model-studio-api", default_response_class=FastJSONResponse, lifespan=lifespan)
 
     # CORS - allow the Next.js front-end origin in dev
     origins = [os.getenv("NEXT_ORIGIN", "http://localhost:3000")]
@@ -26,22 +91,44 @@ def create_app():
     app.include_router(providers_router.router)
     app.include_router(model_profiles_router.router)
     app.include_router(chats_router.router)
+    app.include_router(jobs_router.router)
+
+    app.add_api_route("/metrics", metrics.metrics_endpoint, methods=["GET"], include_in_schema=False)
 
     @app.get("/health")
+    @app.get("/health/live")
     async def health():
+        # liveness: the process serves requests. No dependency checks, so a DB outage does not restart workers
         return {"ok": True}
 
-    return app
+    @app.get("/health/ready")
+    async def ready():
+        # readiness: 503 until the lifespan warm-up is done and again once draining (SIGTERM)
+        return FastJSONResponse(lifecycle.stats(), status_code=200 if lifecycle.is_ready() else 503)
 
-app = create_app()
+    @app.get("/cache/stats")
+    async def cache_stats():
+        return {**cache.stats(), "completions": completion_cache.stats()}
+
+    @app.get("/limits/stats")
+    async def limits_stats():
+        return limits.stats()
+
+    @app.get("/routing/stats")
+    async def routing_stats():
+        return routing.stats()
+
+    @app.get("/db/stats")
+    async def db_stats():
+        return db.stats(app)
 
-@app.on_event("startup")
-async def startup_event():
-    await init_db_pool(app)
+    @app.get("/sessions/stats")
+    async def sessions_stats():
+        return sessions.stats()
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    await close_db_pool(app)
+    return app
+
+app = create_app()
 
 
 
@@ -51,4 +138,6 @@ async def shutdown_event():
 
 # All routers are included.
 
-# startup_event initializes asyncpg pool. 
+# lifespan initializes the asyncpg pools (warming the hot statements), the shared provider HTTP clients and the caches; readiness follows it (app/lifecycle.py).
+
+# Production: python -m app.serve (several workers on uvloop + httptools, graceful SIGTERM draining).
@@ -0,0 +1,155 @@
+# app/metrics.py
+import functools
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from . import log
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# set by app/serve.py with several workers: each process writes its samples to files
+# there and /metrics adds them up, instead of showing whichever worker got the scrape
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# seconds; fine resolution at the low end for DB/pool, long tail for providers
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=FAST_BUCKETS + SLOW_BUCKETS[6:],
+)
+PROVIDER_LATENCY = Histogram(
+    "provider_call_duration_seconds", "Upstream LLM call latency",
+    ["provider", "model", "outcome"], buckets=SLOW_BUCKETS,
+)
+PROVIDER_FIRST_TOKEN = Histogram(
+    "provider_first_token_seconds", "Time to first streamed token",
+    ["provider", "model"], buckets=SLOW_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency per crud function", ["function"], buckets=FAST_BUCKETS,
+)
+POOL_ACQUIRE_WAIT = Histogram(
+    "db_pool_acquire_wait_seconds", "Time spent waiting for a pool connection", ["pool"], buckets=FAST_BUCKETS,
+)
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections checked out of each pool", ["pool"],
+                    multiprocess_mode="livesum")
+PROVIDER_TOKENS = Counter(
+    "provider_tokens_total", "Token usage reported by providers", ["provider", "model", "kind"],
+)
+COMPLETION_CACHE_LOOKUPS = Counter(
+    "completion_cache_lookups_total", "Completion cache lookups by tier (memory, db) and result", ["tier", "result"],
+)
+COMPLETION_CACHE_EVICTIONS = Counter(
+    "completion_cache_evictions_total", "Completion cache entries evicted from memory to make room",
+)
+SESSIONS_OPEN = Gauge("chat_sessions_open", "Open WebSocket chat sessions", multiprocess_mode="livesum")
+SESSION_BUFFER_BYTES = Gauge("chat_session_buffer_bytes", "Approximate memory held by chat session buffers",
+                             multiprocess_mode="livesum")
+LOG_DROPPED = Gauge("log_records_dropped", "Log records dropped because the log queue was full",
+                    multiprocess_mode="livesum")
+if not MULTIPROCESS:
+    # callbacks are not shared between processes; observe_request sets it there
+    LOG_DROPPED.set_function(lambda: log.stats()["dropped"])
+
+# labels() does a lock + dict lookup each time; hot paths reuse the child
+_children: Dict[tuple, object] = {}
+
+def _child(metric, *labels):
+    key = (metric._name, labels)
+    child = _children.get(key)
+    if child is None:
+        child = metric.labels(*labels)
+        _children[key] = child
+    return child
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    if METRICS_ENABLED:
+        _child(REQUEST_LATENCY, method, route, str(status)).observe(seconds)
+        if MULTIPROCESS:
+            LOG_DROPPED.set(log.stats()["dropped"])
+
+def observe_provider(provider: str, model: str, seconds: float, outcome: str = "ok"):
+    if METRICS_ENABLED:
+        _child(PROVIDER_LATENCY, provider, model, outcome).observe(seconds)
+
+def observe_first_token(provider: str, model: str, seconds: float):
+    if METRICS_ENABLED:
+        _child(PROVIDER_FIRST_TOKEN, provider, model).observe(seconds)
+
+def observe_pool_wait(seconds: float, pool: str = "primary"):
+    if METRICS_ENABLED:
+        _child(POOL_ACQUIRE_WAIT, pool).observe(seconds)
+
+def observe_pool_in_use(in_use: int, pool: str = "primary"):
+    if METRICS_ENABLED:
+        _child(POOL_IN_USE, pool).set(in_use)
+
+def record_usage(provider: str, model: str, usage: Optional[dict]):
+    """
+    usage as returned by the provider (OpenAI: prompt_tokens / completion_tokens).
+    """
+    if not METRICS_ENABLED or not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            _child(PROVIDER_TOKENS, provider, model, kind.split("_")[0]).inc(usage[kind])
+
+def count_completion_cache(tier: str, result: str):
+    if METRICS_ENABLED:
+        _child(COMPLETION_CACHE_LOOKUPS, tier, result).inc()
+
+def count_completion_cache_evictions(n: int):
+    if METRICS_ENABLED and n:
+        COMPLETION_CACHE_EVICTIONS.inc(n)
+
+def timed_db(fn):
+    """
+    Records the latency of a crud coroutine under its function name.
+    """
+    child = DB_QUERY_LATENCY.labels(fn.__name__)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not METRICS_ENABLED:
+            return await fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            child.observe(time.perf_counter() - start)
+    return wrapper
+
+async def metrics_endpoint():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+def mark_process_dead():
+    """
+    Shutdown: drops this worker's live gauges (pool / session counts) from the
+    aggregate. Its counters and histograms stay, like any finished process's.
+    """
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# Notes
+
+# All timings use time.perf_counter (monotonic).
+
+# Route labels use the route template (/chats/{chat_id}/messages), never the raw path, to keep cardinality bounded.
+
+# METRICS_ENABLED=false turns every observation into a flag check (see benchmarks/bench_metrics_overhead.py).
+
+# Several workers (app/serve.py): PROMETHEUS_MULTIPROC_DIR must be set before prometheus_client is imported and be empty at start; serve.py makes a fresh one unless it is given. Gauges are summed over live workers.
@@ -4,14 +4,108 @@ import httpx
 from typing import List, Dict
 from fastapi import HTTPException
 import json
+import asyncio
+import hashlib
+import time
 from datetime import datetime
+from typing import AsyncIterator
+from . import limits, log, metrics, serialization
+from .limits import RateLimited
 
-OPENAI_URL = "https://api.openai.com/v1/chat/completions"
-ANTHROPIC_URL = "https://api.anthropic.com/v1/complete"
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1")
+OPENAI_URL = f"{OPENAI_BASE_URL}/chat/completions"
+ANTHROPIC_URL = f"{ANTHROPIC_BASE_URL}/complete"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 
+# ---- Shared HTTP clients (one per provider) ----
+PROVIDER_TIMEOUTS = {
+    "openai": float(os.getenv("OPENAI_TIMEOUT", "30")),
+    "anthropic": float(os.getenv("ANTHROPIC_TIMEOUT", "60")),
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _build_client(provider: str) -> httpx.AsyncClient:
+    pool_limits = httpx.Limits(
+        max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(
+        PROVIDER_TIMEOUTS[provider],
+        connect=float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "5")),
+    )
+    http2 = os.getenv("PROVIDER_HTTP2", "true").lower() == "true"
+    return httpx.AsyncClient(http2=http2, limits=pool_limits, timeout=timeout)
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the long-lived client for a provider.
+    Created lazily so scripts that never run the app lifecycle still work.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(provider)
+        _clients[provider] = client
+    return client
+
+async def init_provider_clients():
+    for provider in PROVIDER_TIMEOUTS:
+        get_client(provider)
+
+PROVIDER_BASE_URLS = {"openai": OPENAI_BASE_URL, "anthropic": ANTHROPIC_BASE_URL}
+PROVIDER_API_KEY_ENV = {"openai": "OPENAI_API_KEY", "anthropic": "ANTHROPIC_API_KEY"}
+
+async def warm_provider_clients() -> list:
+    """
+    Startup: one cheap request per configured provider so DNS, TCP and TLS
+    (and the HTTP/2 session) are done before the first completion. The
+    status code does not matter; the connection stays in the client's
+    keep-alive pool. Returns the providers that answered.
+    """
+    async def warm(provider: str):
+        try:
+            await get_client(provider).head(PROVIDER_BASE_URLS[provider], timeout=5.0)
+            return provider
+        except httpx.HTTPError:
+            return None
+    configured = [p for p in PROVIDER_TIMEOUTS if os.getenv(PROVIDER_API_KEY_ENV[p])]
+    return [p for p in await asyncio.gather(*(warm(p) for p in configured)) if p]
+
+async def drain(timeout: float = 30.0) -> int:
+    """
+    Shutdown: waits (up to timeout) for upstream calls still running, e.g.
+    coalesced calls whose waiters went away. Returns how many were left.
+    """
+    deadline = time.monotonic() + timeout
+    while (limits.active() or _inflight) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return limits.active() + len(_inflight)
+
+async def close_provider_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+# status codes that mean "slow down" rather than "broken request"
+RATE_LIMIT_STATUSES = (429, 503, 529)
+
+def check_rate_limit(provider: str, response: httpx.Response):
+    """
+    Feed rate-limit headers to the provider limiter and raise RateLimited on 429/overloaded.
+    """
+    limits.get_limiter(provider).observe(response.headers)
+    if response.status_code in RATE_LIMIT_STATUSES:
+        raise RateLimited(provider, response.status_code, limits.parse_retry_after(response.headers), response.text[:400])
+
+
 # ---- Helper to serialize datetimes ----
+# Request bodies are encoded with serialization.dumps (orjson handles datetimes
+# and UUIDs natively); these remain for callers that need plain dicts.
 def serialize_for_json(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
@@ -33,11 +127,8 @@ def serialize_messages(messages):
 async def call_openai(model: str, messages: list, temperature: float = 1.0):
     """
     Calls the OpenAI API with given model and messages.
-    Ensures all datetime objects are serialized.
+    The body is encoded in one orjson pass (datetimes included).
     """
-    # Make messages JSON serializable
-    messages = serialize_messages(messages)
-
     payload = {
         "model": model,
         "messages": messages,
@@ -49,21 +140,55 @@ async def call_openai(model: str, messages: list, temperature: float = 1.0):
         "Content-Type": "application/json"
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
+    client = get_client("openai")
+    start = time.perf_counter()
+    response = await client.post(OPENAI_URL, content=serialization.dumps(payload), headers=headers)
+    duration = time.perf_counter() - start
+    metrics.observe_provider("openai", model, duration, "ok" if response.status_code == 200 else str(response.status_code))
+    log.emit("provider_call", provider="openai", model=model, status=response.status_code, duration_ms=round(duration * 1000, 2))
+    check_rate_limit("openai", response)
 
     if response.status_code != 200:
         raise Exception(f"OpenAI error: {response.text}")
 
-    data = response.json()
+    data = serialization.loads(response.content)
+    metrics.record_usage("openai", model, data.get("usage"))
     # Return text output
     return data["choices"][0]["message"]["content"]
 
+async def stream_openai(model: str, messages: list, temperature: float = 1.0) -> AsyncIterator[str]:
+    """
+    Streams an OpenAI chat completion, yielding content deltas as they arrive.
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True
+    }
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    client = get_client("openai")
+    async with client.stream("POST", OPENAI_URL, content=serialization.dumps(payload), headers=headers) as response:
+        if response.status_code != 200:
+            await response.aread()
+            check_rate_limit("openai", response)
+            raise Exception(f"OpenAI error: {response.text}")
+        limits.get_limiter("openai").observe(response.headers)
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = serialization.loads(data)
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
 
 # ---- Anthropic ----
 def to_anthropic_prompt(messages):
@@ -89,40 +214,182 @@ async def call_anthropic(model: str, messages: List[Dict[str, str]], temperature
     }
     prompt = to_anthropic_prompt(messages)
     payload = {"model": model, "prompt": prompt, "max_tokens_to_sample": 512, "temperature": temperature}
-    json_payload = json.dumps(payload, default=serialize_for_json)
+    json_payload = serialization.dumps(payload)
+
+    client = get_client("anthropic")
+    start = time.perf_counter()
+    r = await client.post(ANTHROPIC_URL, headers=headers, content=json_payload)
+    duration = time.perf_counter() - start
+    metrics.observe_provider("anthropic", model, duration, "ok" if r.status_code < 400 else str(r.status_code))
+    log.emit("provider_call", provider="anthropic", model=model, status=r.status_code, duration_ms=round(duration * 1000, 2))
+    check_rate_limit("anthropic", r)
+    if r.status_code >= 400:
+        raise HTTPException(status_code=502, detail=f"Anthropic error: {r.text}")
+    data = serialization.loads(r.content)
+    try:
+        return data.get("completion") or ""
+    except Exception:
+        raise HTTPException(status_code=502, detail=f"Unexpected Anthropic response: {json.dumps(data)[:400]}")
+
+async def stream_anthropic(model: str, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=400, detail="Anthropic provider not enabled (ANTHROPIC_API_KEY missing).")
+    headers = {
+        "x-api-key": api_key,
+        "Content-Type": "application/json",
+    }
+    prompt = to_anthropic_prompt(messages)
+    payload = {"model": model, "prompt": prompt, "max_tokens_to_sample": 512, "temperature": temperature, "stream": True}
+    json_payload = serialization.dumps(payload)
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        r = await client.post(ANTHROPIC_URL, headers=headers, content=json_payload)
+    client = get_client("anthropic")
+    async with client.stream("POST", ANTHROPIC_URL, headers=headers, content=json_payload) as r:
         if r.status_code >= 400:
+            await r.aread()
+            check_rate_limit("anthropic", r)
             raise HTTPException(status_code=502, detail=f"Anthropic error: {r.text}")
-        data = r.json()
-        try:
-            return data.get("completion") or ""
-        except Exception:
-            raise HTTPException(status_code=502, detail=f"Unexpected Anthropic response: {json.dumps(data)[:400]}")
+        limits.get_limiter("anthropic").observe(r.headers)
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = serialization.loads(line[len("data:"):].strip())
+            if data.get("type") == "error":
+                raise HTTPException(status_code=502, detail=f"Anthropic error: {json.dumps(data)[:400]}")
+            if data.get("completion"):
+                yield data["completion"]
+
+# ---- Mock streaming ----
+async def stream_mock(text: str) -> AsyncIterator[str]:
+    """
+    Yields the canned mock reply word by word. MOCK_TOKEN_DELAY_MS controls the
+    pause between tokens so TTFB can be measured without network access.
+    """
+    delay = float(os.getenv("MOCK_TOKEN_DELAY_MS", "0")) / 1000.0
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        if delay:
+            await asyncio.sleep(delay)
+        yield word if i == 0 else " " + word
 
 # ---- Unified entrypoint ----
-async def call_model(provider: str, model: str, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+async def _dispatch(provider: str, model: str, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
     allow_mock = os.getenv("ALLOW_MOCK", "false").lower() == "true"
     if provider == "openai":
         if os.getenv("OPENAI_API_KEY"):
-            return await call_openai(model, messages, temperature)
+            return await limits.call_with_limits(provider, model, messages, lambda: call_openai(model, messages, temperature))
         if allow_mock:
             return "[MOCK OPENAI reply] This is a mock reply because OPENAI_API_KEY is not set."
         raise HTTPException(status_code=400, detail="OpenAI provider disabled (OPENAI_API_KEY missing).")
     elif provider == "anthropic":
         if os.getenv("ANTHROPIC_API_KEY"):
-            return await call_anthropic(model, messages, temperature)
+            return await limits.call_with_limits(provider, model, messages, lambda: call_anthropic(model, messages, temperature))
         if allow_mock:
             return "[MOCK ANTHROPIC reply] This is a mock reply because ANTHROPIC_API_KEY is not set."
         raise HTTPException(status_code=400, detail="Anthropic provider disabled (ANTHROPIC_API_KEY missing).")
     else:
         raise HTTPException(status_code=400, detail=f"Unknown provider '{provider}'")
 
+# ---- Single-flight (request coalescing) ----
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+
+def request_fingerprint(provider: str, model: str, temperature: float, messages: List[Dict]) -> str:
+    """
+    Identity of one provider call: provider, model, temperature and the exact messages sent.
+    """
+    raw = json.dumps(
+        [provider, model, temperature, [{"role": m["role"], "content": m["content"]} for m in messages]],
+        separators=(",", ":"), sort_keys=True, default=serialize_for_json,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+_inflight: Dict[str, _Flight] = {}
+
+async def _join_flight(key: str, factory):
+    """
+    Runs factory() once per key at a time; concurrent callers share the result
+    (or exception). The upstream call runs in its own task and each waiter
+    awaits it through asyncio.shield, so a waiter that is cancelled (client
+    disconnect) leaves the call running for the others. It is only cancelled
+    once nobody is waiting anymore.
+    """
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(factory()))
+        _inflight[key] = flight
+        flight.task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is flight else None)
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+            _inflight.pop(key, None)
+
+async def call_model(provider: str, model: str, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+    if not SINGLE_FLIGHT:
+        return await _dispatch(provider, model, messages, temperature)
+    key = request_fingerprint(provider, model, temperature, messages)
+    return await _join_flight(key, lambda: _dispatch(provider, model, messages, temperature))
+
+async def _timed_stream(provider: str, model: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    start = time.perf_counter()
+    first = True
+    outcome = "error"
+    try:
+        async for delta in deltas:
+            if first:
+                metrics.observe_first_token(provider, model, time.perf_counter() - start)
+                first = False
+            yield delta
+        outcome = "ok"
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe_provider(provider, model, duration, "stream_" + outcome)
+        log.emit("provider_stream", provider=provider, model=model, outcome=outcome, duration_ms=round(duration * 1000, 2))
+
+async def stream_model(provider: str, model: str, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of call_model: returns an async iterator of text deltas.
+    Provider availability and the limiter slot are checked eagerly so a disabled
+    or saturated provider fails before the response starts.
+    """
+    allow_mock = os.getenv("ALLOW_MOCK", "false").lower() == "true"
+    if provider == "openai":
+        if os.getenv("OPENAI_API_KEY"):
+            return await limits.stream_with_limits(provider, model, messages, _timed_stream(provider, model, stream_openai(model, messages, temperature)))
+        if allow_mock:
+            return stream_mock("[MOCK OPENAI reply] This is a mock reply because OPENAI_API_KEY is not set.")
+        raise HTTPException(status_code=400, detail="OpenAI provider disabled (OPENAI_API_KEY missing).")
+    elif provider == "anthropic":
+        if os.getenv("ANTHROPIC_API_KEY"):
+            return await limits.stream_with_limits(provider, model, messages, _timed_stream(provider, model, stream_anthropic(model, messages, temperature)))
+        if allow_mock:
+            return stream_mock("[MOCK ANTHROPIC reply] This is a mock reply because ANTHROPIC_API_KEY is not set.")
+        raise HTTPException(status_code=400, detail="Anthropic provider disabled (ANTHROPIC_API_KEY missing).")
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown provider '{provider}'")
+
 # Points
 
 # call_openai and call_anthropic implement REST calls directly.
 
+# Both reuse one pooled httpx client per provider (keep-alive, optional HTTP/2), opened and warmed at startup and closed on shutdown (after drain()).
+
 #  If ALLOW_MOCK=true, developer can test flows locally without keys (mock replies returned).
 
-# Errors from provider are turned into 502 responses.
\ No newline at end of file
+# Fallbacks, circuit breakers and hedged requests across providers are layered on top in app/routing.py.
+
+# call_model coalesces concurrent identical calls (same request_fingerprint) into one upstream request; SINGLE_FLIGHT=false turns it off.
+
+# stream_model mirrors call_model but yields text deltas (provider SSE streams, or the mock reply word by word).
+
+# Errors from provider are turned into 502 responses; 429/overloaded responses are retried with backoff and end as 503 + Retry-After (app/limits.py).
\ No newline at end of file
@@ -1,10 +1,18 @@
 # app/routers/chats.py
-from fastapi import APIRouter, Request, HTTPException
-from ..schemas import ChatCreate, ChatOut, MessageIn
-from ..db import get_db_pool
-from .. import crud, providers, utils
+from fastapi import APIRouter, Request, Response, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from ..schemas import ChatCreate, ChatCloneIn, ChatOut, MessageIn, BatchMessagesIn
+from pydantic import ValidationError
+from ..db import get_db_pool, get_read_pool, mark_written
+from ..serialization import FastJSONResponse
+from .. import bulk, cache, completion_cache, crud, log, routing, serialization, sessions, summaries, tokens, utils
 from typing import List
+import anyio
+import asyncio
+import asyncpg
+import json
 import os
+import time
 import uuid
 
 router = APIRouter(prefix="/chats", tags=["chats"])
@@ -58,6 +66,8 @@ async def patch_chat(chat_id: str, payload: ChatPatchPayload, request: Request):
         row = await conn.fetchrow(sql, *params)
         if not row:
             raise HTTPException(status_code=404, detail="Chat not found")
+        await cache.invalidate_chat(conn, chat_id)
+        mark_written("chats", f"chat:{chat_id}")
 
         # Return the canonical chat object using your existing crud getter
         updated_chat = await crud.get_chat(conn, chat_id)
@@ -67,6 +77,129 @@ async def patch_chat(chat_id: str, payload: ChatPatchPayload, request: Request):
         return updated_chat
 
 
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# assistant replies are written in bulk once this many are done (or the batch ends)
+BATCH_FLUSH_SIZE = int(os.getenv("BATCH_FLUSH_SIZE", "50"))
+BATCH_FLUSH_INTERVAL_S = 0.2
+
+@router.post("/batch")
+async def post_messages_batch(payload: BatchMessagesIn, request: Request):
+    """
+    Submit many (chat_id, content, model_profile_id) items at once.
+    Context is loaded (same windowing as /messages, CONTEXT_MODE included)
+    and user messages are written with one bulk statement each; provider calls run concurrently (at most `concurrency` in flight)
+    and results stream back as NDJSON in completion order:
+      {"index", "chat_id", "ok": true, "reply", "assistant_message_id"}
+      {"index", "chat_id", "ok": false, "status", "error"}
+    Items for the same chat are independent: each sees the history as of the
+    start of the batch; their messages are stored in item order. If saving a
+    group of replies fails, those items get an error line and the stream goes on.
+    """
+    items = payload.items
+    if not items:
+        raise HTTPException(status_code=400, detail="No items")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    concurrency = max(1, min(payload.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    user_tokens = [tokens.count_tokens(i.content) for i in items]
+    chat_ids, profile_ids = [i.chat_id for i in items], [i.model_profile_id for i in items]
+
+    pool = get_db_pool(request.app)
+    errors = {}
+    calls = {}
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            for chat_id in {str(i.chat_id) for i in items}:
+                await sessions.flush_chat(conn, chat_id)
+            # same windowing as _prepare_provider_call, for all items in one statement
+            if tokens.use_token_budget():
+                budget, budgets = tokens.history_budgets(0)
+                contexts = await cache.load_batch_context(
+                    conn, chat_ids, profile_ids, tokens.CONTEXT_MAX_MESSAGES - 1, budget, budgets, user_tokens
+                )
+            else:
+                N = int(os.getenv("CONTEXT_WINDOW", "20"))
+                contexts = await cache.load_batch_context(conn, chat_ids, profile_ids, N - 1)
+            valid = []
+            for idx, (item, (chat, profile, history, summary)) in enumerate(zip(items, contexts)):
+                if not chat:
+                    errors[idx] = (404, "Chat not found")
+                elif not profile:
+                    errors[idx] = (404, "Model profile not found") if item.model_profile_id else \
+                        (400, "No model_profile_id provided or linked to chat")
+                else:
+                    prior = _prompt_history(profile, history, summary, user_tokens[idx])
+                    prior.append({"role": "user", "content": item.content})
+                    calls[idx] = (profile, utils.messages_for_openai(profile["system_prompt"], prior, summary))
+                    valid.append(idx)
+            await crud.append_messages(conn, [(items[i].chat_id, "user", items[i].content) for i in valid],
+                                       counts=[user_tokens[i] for i in valid])
+            for i in valid:
+                await sessions.record(conn, items[i].chat_id, "user", items[i].content, user_tokens[i])
+    log.emit("chat_batch", items=len(items), valid=len(calls), concurrency=concurrency)
+
+    sem = asyncio.Semaphore(concurrency)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def run(idx: int):
+        profile, messages = calls[idx]
+        try:
+            async with sem:
+                reply = await completion_cache.call_model(pool, profile, messages, routing.caller(profile))
+            done.put_nowait((idx, reply, None))
+        except Exception as e:
+            done.put_nowait((idx, None, (getattr(e, "status_code", 502), getattr(e, "detail", None) or str(e))))
+
+    def error_line(idx, status, detail):
+        return json.dumps({"index": idx, "chat_id": str(items[idx].chat_id), "ok": False,
+                           "status": status, "error": detail}) + "\n"
+
+    async def flush(replies):
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    ids = await crud.append_messages(conn, [(items[i].chat_id, "assistant", text) for i, text in replies])
+                    for i, text in replies:
+                        await sessions.record(conn, items[i].chat_id, "assistant", text)
+        except Exception as e:
+            # keep the stream going: only the items of this flush failed
+            log.emit("chat_batch_flush_failed", items=len(replies), error=str(e))
+            return "".join(error_line(i, 500, "Failed to save reply") for i, _ in replies)
+        return "".join(
+            json.dumps({"index": i, "chat_id": str(items[i].chat_id), "ok": True, "reply": text,
+                        "assistant_message_id": str(mid)}) + "\n"
+            for (i, text), mid in zip(replies, ids)
+        )
+
+    async def results():
+        for idx, (status, detail) in errors.items():
+            yield error_line(idx, status, detail)
+        tasks = [asyncio.ensure_future(run(idx)) for idx in calls]
+        pending, buffered = len(tasks), []
+        try:
+            while pending:
+                try:
+                    idx, reply, err = await asyncio.wait_for(done.get(), BATCH_FLUSH_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    idx = None
+                if idx is not None:
+                    pending -= 1
+                    if err:
+                        yield error_line(idx, *err)
+                    else:
+                        buffered.append((idx, reply))
+                if buffered and (len(buffered) >= BATCH_FLUSH_SIZE or idx is None or not pending):
+                    yield await flush(buffered)
+                    buffered = []
+        finally:
+            # client went away: stop outstanding provider calls
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.post("/", response_model=ChatOut)
 async def create_chat(payload: ChatCreate, request: Request):
     pool = get_db_pool(request.app)
@@ -74,19 +207,223 @@ async def create_chat(payload: ChatCreate, request: Request):
         row = await crud.create_chat(conn, payload.title, payload.model_profile_id)
         return row
 
-@router.get("/", response_model=List[ChatOut])
-async def list_chats(request: Request):
+def _import_format(request: Request, format: Optional[str]) -> str:
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        return "csv" if content_type == "text/csv" else "ndjson"
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown import format '{format}'")
+    return format
+
+@router.post("/import")
+async def import_chats(request: Request, format: Optional[str] = None):
+    """
+    Bulk-creates chats from an NDJSON or CSV body (text/csv or ?format=csv;
+    header row required). Fields: id, title, model_profile_id, created_at,
+    updated_at, all optional. Ids may be set client-side so a following
+    /chats/messages/import can reference them. All rows or none.
+    """
+    rows = bulk.parse(request.stream(), _import_format(request, format))
     pool = get_db_pool(request.app)
     async with pool.acquire() as conn:
-        rows = await crud.list_chats(conn)
-        return rows
+        result = await bulk.import_chats(conn, rows)
+    log.emit("chats_imported", chats=result["chats"], elapsed_ms=result["elapsed_ms"])
+    return result
 
-@router.get("/{chat_id}/messages")
-async def get_messages(chat_id: str, request: Request):
+@router.post("/messages/import")
+async def import_messages(request: Request, format: Optional[str] = None):
+    """
+    Bulk-appends messages from an NDJSON or CSV body. Fields: chat_id, role,
+    content (required), id, token_count, created_at (optional; rows without
+    created_at keep their order and are stamped now). Lines of
+    /{chat_id}/messages/export are accepted as is. The chats must exist.
+    Streamed into one COPY in one transaction; chat counters are updated
+    once per chat at the end.
+    """
+    rows = bulk.parse(request.stream(), _import_format(request, format))
+    pool = get_db_pool(request.app)
+    async with pool.acquire() as conn:
+        result = await bulk.import_messages(conn, rows)
+        chat_ids = result.pop("chat_ids")
+        await sessions.invalidate(conn, chat_ids)
+    log.emit("messages_imported", messages=result["messages"], chats=result["chats"],
+             elapsed_ms=result["elapsed_ms"])
+    return result
+
+@router.get("/export")
+async def export_chats(request: Request):
+    """
+    Every chat as NDJSON, oldest first (server-side cursor, constant memory).
+    The lines are valid /chats/import input.
+    """
+    pool = get_read_pool(request.app, "chats")
+
+    async def rows():
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in crud.iter_chats(conn):
+                    yield serialization.dumps(row, newline=True)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@router.post("/{chat_id}/clone", response_model=ChatOut)
+async def clone_chat(chat_id: str, request: Request, payload: Optional[ChatCloneIn] = None):
+    """
+    Forks a chat with its full history, e.g. to continue it with another
+    model profile. Runs server-side as one INSERT ... SELECT statement.
+    """
+    payload = payload or ChatCloneIn()
     pool = get_db_pool(request.app)
     async with pool.acquire() as conn:
-        rows = await crud.list_messages(conn, chat_id)
-        return {"messages": rows}
+        async with conn.transaction():
+            await sessions.flush_chat(conn, chat_id)
+            try:
+                row = await crud.clone_chat(conn, chat_id, payload.title, payload.model_profile_id)
+            except asyncpg.ForeignKeyViolationError:
+                raise HTTPException(status_code=404, detail="Model profile not found")
+    if not row:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    log.emit("chat_cloned", chat_id=chat_id, clone_id=row["id"], messages=row["message_count"])
+    return row
+
+@router.get("/", response_model=List[ChatOut])
+async def list_chats(request: Request, response: Response,
+                     limit: Optional[int] = Query(None, ge=1, le=200), cursor: Optional[str] = None):
+    """
+    Newest chats first. Without `limit` every chat is returned (as before);
+    with it, a full page sets the X-Next-Cursor header to pass back as `cursor`.
+    Rows include message_count, total_tokens, last_role and last_message_preview
+    straight from the chats table (no per-chat /messages calls needed).
+    """
+    after = utils.decode_cursor(cursor)
+    pool = get_read_pool(request.app, "chats")
+    async with pool.acquire() as conn:
+        rows = await crud.list_chats(conn, limit, after)
+    headers = {}
+    if limit and len(rows) == limit:
+        headers["X-Next-Cursor"] = utils.encode_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+    if serialization.TRUST_DB_ROWS:
+        return FastJSONResponse(serialization.trusted_rows(rows, ChatOut), headers=headers)
+    response.headers.update(headers)
+    return rows
+
+@router.get("/search")
+async def search_chats(request: Request, q: str = Query(..., min_length=1, max_length=200),
+                       limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None, fuzzy: bool = False):
+    """
+    Searches messages across all chats, best match first. Full-text by default
+    (websearch syntax: "quoted phrase", -excluded, or); fuzzy=true matches
+    by trigram similarity instead. Each hit has a <mark>-highlighted snippet.
+    """
+    after = utils.decode_rank_cursor(cursor)
+    pool = get_read_pool(request.app)
+    async with pool.acquire() as conn:
+        rows = await crud.search_messages(conn, q, None, limit, after, fuzzy)
+    next_cursor = utils.encode_rank_cursor(rows[-1]["rank"], rows[-1]["id"]) if len(rows) == limit else None
+    return FastJSONResponse({"results": rows, "next_cursor": next_cursor})
+
+@router.get("/{chat_id}/messages/search")
+async def search_messages(chat_id: str, request: Request, q: str = Query(..., min_length=1, max_length=200),
+                          limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None, fuzzy: bool = False):
+    """
+    Same as /chats/search, within one chat.
+    """
+    after = utils.decode_rank_cursor(cursor)
+    pool = get_read_pool(request.app, f"chat:{chat_id}")
+    async with pool.acquire() as conn:
+        rows = await crud.search_messages(conn, q, chat_id, limit, after, fuzzy)
+    next_cursor = utils.encode_rank_cursor(rows[-1]["rank"], rows[-1]["id"]) if len(rows) == limit else None
+    return FastJSONResponse({"results": rows, "next_cursor": next_cursor})
+
+@router.get("/{chat_id}/messages")
+async def get_messages(chat_id: str, request: Request,
+                       limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                       include_archived: bool = False):
+    """
+    Oldest messages first; next_cursor is set when there may be more.
+    include_archived=true also returns history moved to cold storage.
+    """
+    after = utils.decode_cursor(cursor)
+    pool = get_read_pool(request.app, f"chat:{chat_id}")
+    async with pool.acquire() as conn:
+        rows = await crud.list_messages(conn, chat_id, limit, after, include_archived)
+    next_cursor = utils.encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == limit else None
+    # no response_model here: rows go out in a single orjson pass
+    return FastJSONResponse({"messages": rows, "next_cursor": next_cursor})
+
+@router.get("/{chat_id}/messages/export")
+async def export_messages(chat_id: str, request: Request, include_archived: bool = False):
+    """
+    Whole chat history as NDJSON, streamed through a server-side cursor so
+    memory stays constant regardless of chat size. include_archived=true
+    starts with the archived months.
+    """
+    pool = get_read_pool(request.app, f"chat:{chat_id}")
+
+    async def rows():
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in crud.iter_messages(conn, chat_id, include_archived=include_archived):
+                    yield serialization.dumps(row, newline=True)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+def _prompt_history(model_profile: dict, history: list, summary, user_tokens: int) -> list:
+    """
+    Final cut of the loaded history, shared by /messages, /stream, /jobs and
+    /batch. In token mode the system prompt, summary and new message have to
+    fit too; stored counts make this a cheap prefix cut.
+    """
+    if tokens.use_token_budget():
+        budget = (tokens.context_budget(model_profile["base_model"]) - user_tokens
+                  - tokens.count_prompt_tokens(model_profile["system_prompt"])
+                  - (tokens.count_prompt_tokens(summary) if summary else 0))
+        return tokens.trim_to_budget(history, budget)
+    return [{"role": m["role"], "content": m["content"]} for m in history]
+
+async def _prepare_provider_call(conn, chat_id: str, payload: MessageIn):
+    """
+    Steps 1-4 of the message flow: validate chat/profile, persist the user's
+    message and build the provider messages (system prompt + last N).
+    Two statements: load context (cache / crud hot path), insert user message.
+    Returns (model_profile, messages).
+    """
+    # turns of an open WebSocket session on this chat that are not written yet
+    await sessions.flush_chat(conn, chat_id)
+    # history excludes the new user message, which is appended below
+    user_tokens = tokens.count_tokens(payload.content)
+    if tokens.use_token_budget():
+        budget, budgets = tokens.history_budgets(user_tokens)
+        exists, model_profile, prior_messages, summary = await cache.load_message_context(
+            conn, chat_id, payload.model_profile_id, tokens.CONTEXT_MAX_MESSAGES - 1, budget, budgets
+        )
+    else:
+        N = int(os.getenv("CONTEXT_WINDOW", "20"))
+        exists, model_profile, prior_messages, summary = await cache.load_message_context(conn, chat_id, payload.model_profile_id, N - 1)
+    if not exists:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    if not model_profile:
+        if payload.model_profile_id:
+            raise HTTPException(status_code=404, detail="Model profile not found")
+        raise HTTPException(status_code=400, detail="No model_profile_id provided or linked to chat")
+
+    prior_messages = _prompt_history(model_profile, prior_messages, summary, user_tokens)
+
+    # persist user's message
+    await crud.append_message(conn, chat_id, "user", payload.content, user_tokens)
+    await sessions.record(conn, chat_id, "user", payload.content, user_tokens)
+    prior_messages.append({"role": "user", "content": payload.content})
+
+    # Build messages for provider (OpenAI expects list with system)
+    messages = utils.messages_for_openai(model_profile["system_prompt"], prior_messages, summary)
+
+    provider = model_profile["provider"]
+    model_name = model_profile["base_model"]
+
+    # Log which provider/model used
+    log.emit("chat_call", chat_id=chat_id, provider=provider, model=model_name)
+    return model_profile, messages
+
 
 @router.post("/{chat_id}/messages")
 async def post_message(chat_id: str, payload: MessageIn, request: Request):
@@ -98,56 +435,266 @@ async def post_message(chat_id: str, payload: MessageIn, request: Request):
     4) Prepend system prompt (server-side)
     5) Call provider REST API
     6) Persist assistant reply and return it
+
+    Steps 1-4 and 6 each run in their own short transaction; no pool
+    connection is held while waiting on the provider (step 5).
     """
     pool = get_db_pool(request.app)
     async with pool.acquire() as conn:
-        # ensure chat exists
-        chat = await crud.get_chat(conn, chat_id)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
+        async with conn.transaction():
+            model_profile, messages = await _prepare_provider_call(conn, chat_id, payload)
 
-        # choose profile id: payload override or chat's linked profile
-        profile_id = payload.model_profile_id or chat.get("model_profile_id")
-        if not profile_id:
-            raise HTTPException(status_code=400, detail="No model_profile_id provided or linked to chat")
+    # Call provider (may raise HTTPException if provider disabled or error), through the completion cache if enabled
+    assistant_text = await completion_cache.call_model(pool, model_profile, messages, routing.caller(model_profile))
 
-        model_profile = await crud.get_model_profile(conn, profile_id)
-        if not model_profile:
-            raise HTTPException(status_code=404, detail="Model profile not found")
+    # persist assistant message
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            assistant_msg = await crud.append_message(conn, chat_id, "assistant", assistant_text)
+            await sessions.record(conn, chat_id, "assistant", assistant_text)
+    summaries.schedule_refresh(pool, chat_id, model_profile)
 
-        # persist user's message
-        user_msg = await crud.append_message(conn, chat_id, "user", payload.content)
+    return {
+        "chat_id": chat_id,
+        "reply": assistant_text,
+        "assistant_message_id": assistant_msg["id"]
+    }
 
-        # load last N messages for context
-        N = int(os.getenv("CONTEXT_WINDOW", "20"))
-        prior_messages = await crud.get_last_n_messages(conn, chat_id, N)
-        # Build messages for provider (OpenAI expects list with system)
-        messages = utils.messages_for_openai(model_profile["system_prompt"], prior_messages)
 
-        # call provider
-        provider = model_profile["provider"]
-        model_name = model_profile["base_model"]
+@router.post("/{chat_id}/messages/jobs", status_code=202)
+async def post_message_job(chat_id: str, payload: MessageIn, request: Request):
+    """
+    Async variant of post_message: persists the user's message, queues the
+    completion and returns a job id at once. Poll GET /jobs/{job_id}
+    (?wait=N to long-poll); workers (python -m app.worker) run the call.
+    """
+    pool = get_db_pool(request.app)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            model_profile, messages = await _prepare_provider_call(conn, chat_id, payload)
+            job = await crud.create_job(conn, chat_id, model_profile, messages)
+    return {"job_id": job["id"], "chat_id": chat_id, "status": job["status"]}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _frame(event: str, data: dict) -> str:
+    return json.dumps({"type": event, **data}, default=str)
 
-        # Log which provider/model used
-        print(f"CHAT_CALL chat_id={chat_id} provider={provider} model={model_name}")
+def _ndjson(event: str, data: dict) -> str:
+    return _frame(event, data) + "\n"
 
-        # Call provider (may raise HTTPException if provider disabled or error)
-        assistant_text = await providers.call_model(provider, model_name, messages)
+async def _replay(text: str):
+    # cached completion: sent as a single token event
+    yield text
 
-        # persist assistant message
-        assistant_msg = await crud.append_message(conn, chat_id, "assistant", assistant_text)
+STREAM_FORMATS = {
+    "sse": (_sse, "text/event-stream"),
+    "ndjson": (_ndjson, "application/x-ndjson"),
+}
+
+async def _open_deltas(pool, model_profile: dict, messages: list, temperature: float = 0.7):
+    """
+    Reply deltas for a streamed turn: replayed from the completion cache when
+    the profile uses it and has the prompt, else streamed through routing.
+    The cache key and the stream use the same temperature.
+    Returns (deltas, store); await store(reply) once the stream completed.
+    """
+    provider = model_profile["provider"]
+    model_name = model_profile["base_model"]
+    cache_key = cached = None
+    if model_profile.get("response_cache"):
+        cache_key = completion_cache.completion_key(provider, model_name, temperature, messages)
+        cached = await completion_cache.lookup(pool, cache_key)
+    if cached is not None:
+        deltas = _replay(cached)
+    else:
+        deltas = await routing.stream_model(model_profile, messages, temperature)
+    started = time.monotonic()
+
+    async def store(reply: str):
+        if cache_key and cached is None:
+            await completion_cache.store(pool, cache_key, provider, model_name, reply, time.monotonic() - started)
+
+    return deltas, store
+
+@router.post("/{chat_id}/messages/stream")
+async def post_message_stream(chat_id: str, payload: MessageIn, request: Request, format: str = "sse"):
+    """
+    Same flow as post_message, but relays the reply token by token as
+    Server-Sent Events (default) or NDJSON (?format=ndjson).
+    Events: token {"token"}, done {"assistant_message_id", "reply"}, error {"detail"}.
+    The assembled reply is persisted when the stream ends; if the client
+    disconnects mid-stream, the partial reply is persisted instead.
+    """
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format '{format}'")
+    encode, media_type = STREAM_FORMATS[format]
 
-        return {
-            "chat_id": chat_id,
-            "reply": assistant_text,
-            "assistant_message_id": assistant_msg["id"]
-        }
+    pool = get_db_pool(request.app)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            model_profile, messages = await _prepare_provider_call(conn, chat_id, payload)
+    # raises before the response starts if no provider of the profile is usable or all are saturated (503)
+    deltas, store = await _open_deltas(pool, model_profile, messages)
+
+    async def persist(text: str):
+        async with pool.acquire() as conn:
+            msg = await crud.append_message(conn, chat_id, "assistant", text)
+            await sessions.record(conn, chat_id, "assistant", text)
+            return msg
+
+    async def event_stream():
+        parts = []
+        persisted = False
+        try:
+            async for token in deltas:
+                parts.append(token)
+                yield encode("token", {"token": token})
+            reply = "".join(parts)
+            # the reply first, shielded: a disconnect from here on must not lose it
+            with anyio.CancelScope(shield=True):
+                assistant_msg = await persist(reply)
+            persisted = True
+            await store(reply)
+            summaries.schedule_refresh(pool, chat_id, model_profile)
+            yield encode("done", {"chat_id": chat_id, "reply": reply, "assistant_message_id": assistant_msg["id"]})
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            yield encode("error", {"detail": detail})
+        finally:
+            if not persisted and parts:
+                # client went away (or provider failed) mid-stream: keep what we have.
+                # shielded so the disconnect cancellation does not abort the write.
+                with anyio.CancelScope(shield=True):
+                    await persist("".join(parts))
+
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/{chat_id}/ws")
+async def chat_session(websocket: WebSocket, chat_id: str):
+    """
+    Chat session over a WebSocket. The client sends MessageIn frames
+    ({"content", "model_profile_id"?}), one turn at a time; the server answers
+      session {"chat_id", "turns", "bytes", "max_bytes", ...}    on connect
+      token {"token"}                                           per reply delta
+      done {"reply", "user_message_id", "assistant_message_id", "session"}
+      error {"status", "detail"}                                the session stays open
+    Prompts come from the chat's in-memory buffer (app/sessions.py) instead
+    of a history query, and turns are written to Postgres write-behind.
+    """
+    pool = get_db_pool(websocket.app)
+    await websocket.accept()
+    try:
+        async with pool.acquire() as conn:
+            buffer, _, _ = await sessions.open_buffer(conn, chat_id)
+    except OverflowError as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+    if buffer is None:
+        await websocket.send_text(_frame("error", {"status": 404, "detail": "Chat not found"}))
+        await websocket.close(code=4404)
+        return
+    log.emit("chat_session_open", chat_id=chat_id, turns=len(buffer.turns))
+    try:
+        await websocket.send_text(_frame("session", {"chat_id": chat_id, **buffer.stats()}))
+        while True:
+            try:
+                payload = MessageIn(**await websocket.receive_json())
+            except (ValidationError, ValueError, TypeError) as e:
+                await websocket.send_text(_frame("error", {"status": 422, "detail": str(e)}))
+                continue
+            try:
+                await _session_turn(websocket, pool, buffer, payload)
+            except LookupError as e:
+                await websocket.send_text(_frame("error", {"status": 404, "detail": str(e)}))
+                await websocket.close(code=4404)
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sessions.close_buffer(buffer)
+        log.emit("chat_session_close", chat_id=chat_id, **buffer.stats())
+
+async def _session_turn(websocket: WebSocket, pool, buffer, payload: MessageIn):
+    """
+    One turn of a WebSocket session: same steps as post_message_stream, with
+    the history taken from the buffer and both messages queued write-behind.
+    """
+    chat_id = buffer.chat_id
+    model_profile, summary = await sessions.context(pool, buffer, payload.model_profile_id)
+    if not model_profile:
+        status, detail = (404, "Model profile not found") if payload.model_profile_id else \
+            (400, "No model_profile_id provided or linked to chat")
+        await websocket.send_text(_frame("error", {"status": status, "detail": detail}))
+        return
+
+    user_message_id = sessions.add_turn(pool, buffer, "user", payload.content)
+    messages = utils.messages_for_openai(
+        model_profile["system_prompt"], buffer.prompt_history(model_profile, summary), summary
+    )
+    log.emit("chat_call", chat_id=chat_id, provider=model_profile["provider"], model=model_profile["base_model"])
+    try:
+        deltas, store = await _open_deltas(pool, model_profile, messages)
+    except Exception as e:
+        await websocket.send_text(_frame("error", {"status": getattr(e, "status_code", 502),
+                                                   "detail": getattr(e, "detail", None) or str(e)}))
+        return
+
+    parts = []
+    reply = None
+    try:
+        async for token in deltas:
+            parts.append(token)
+            await websocket.send_text(_frame("token", {"token": token}))
+        reply = "".join(parts)
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        await websocket.send_text(_frame("error", {"status": getattr(e, "status_code", 502),
+                                                   "detail": getattr(e, "detail", None) or str(e)}))
+    finally:
+        if reply is None and parts:
+            # provider failed or the client went away mid-reply: keep what we have
+            sessions.add_turn(pool, buffer, "assistant", "".join(parts))
+    if reply is None:
+        return
+    assistant_message_id = sessions.add_turn(pool, buffer, "assistant", reply)
+    # the turns are still queued write-behind; the refresh starts once they are written
+    sessions.refresh_summary_after_write(pool, chat_id, model_profile)
+    await store(reply)
+    await websocket.send_text(_frame("done", {
+        "chat_id": chat_id, "reply": reply, "user_message_id": user_message_id,
+        "assistant_message_id": assistant_message_id, "session": buffer.stats(),
+    }))
 
 
 # Important behavior (matches spec)
 
 # System prompt is loaded server-side from model_profiles and prepended on each request (never trust client).
 
-# Context windowing: we fetch last N messages (default 20).
+# Context windowing: we fetch last N messages (default 20), or with CONTEXT_MODE=tokens the newest messages that fit the model's context limit (app/tokens.py).
+
+# Pool usage: the provider round trip happens with no DB connection checked out, so slow models cannot starve other endpoints.
+
+# Listings: GET / and GET /{chat_id}/messages use keyset cursors; /{chat_id}/messages/export streams NDJSON via a server-side cursor.
+
+# Jobs: POST /{chat_id}/messages/jobs queues the provider call for app/worker.py and returns 202 with a job id.
+
+# Batch: POST /batch loads contexts and writes messages with bulk statements, fans provider calls out under a concurrency limit, and streams NDJSON results.
+
+# Streaming: /{chat_id}/messages/stream relays provider tokens as SSE/NDJSON and persists the assembled (or partial) reply at the end.
+
+# Bulk: /import and /messages/import stream NDJSON/CSV into COPY (app/bulk.py); /{chat_id}/clone copies a chat server-side.
+
+# Sessions: /{chat_id}/ws keeps recent turns in memory (app/sessions.py); REST writes to the same chat update that buffer.
+
+#  When a model profile is edited: because we load model_profiles row at call time, subsequent messages after editing use updated provider/base model per spec.
+
+#  Long chats (SUMMARY_ENABLED=true): older turns are folded into a rolling summary in the background (app/summaries.py) and injected after the system prompt.
+
+#  Profiles with response_cache enabled go through app/completion_cache.py (identical prompts reuse the stored reply).
 
-#  When a model profile is edited: because we load model_profiles row at call time, subsequent messages after editing use updated provider/base model per spec.
\ No newline at end of file
+#  Profile and chat->profile lookups go through app/cache.py; update/delete of a profile and patch_chat invalidate it immediately.
\ No newline at end of file
@@ -0,0 +1,23 @@
+# app/routers/jobs.py
+from fastapi import APIRouter, Request, HTTPException, Query
+from ..db import get_db_pool
+from .. import jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, request: Request, wait: float = Query(0, ge=0, le=60)):
+    """
+    Job status/result. With ?wait=N (seconds) the request long-polls until
+    the job is done or failed, or N seconds pass.
+    """
+    pool = get_db_pool(request.app)
+    job = await jobs.wait_for_job(pool, job_id, wait)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# Notes
+
+# Jobs are created by POST /chats/{chat_id}/messages/jobs and executed by python -m app.worker.
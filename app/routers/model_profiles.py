@@ -1,8 +1,9 @@
 # app/routers/model_profiles.py
 from fastapi import APIRouter, Depends, Request, HTTPException
 from ..schemas import ModelProfileCreate, ModelProfileUpdate, ModelProfileOut
-from ..db import get_db_pool
-from .. import crud
+from ..db import get_db_pool, get_read_pool
+from .. import crud, serialization
+from ..serialization import FastJSONResponse
 from typing import List
 import asyncpg
 
@@ -12,19 +13,22 @@ router = APIRouter(prefix="/model-profiles", tags=["model-profiles"])
 async def create_profile(payload: ModelProfileCreate, request: Request):
     pool = get_db_pool(request.app)
     async with pool.acquire() as conn:
-        row = await crud.create_model_profile(conn, payload.name, payload.provider, payload.base_model, payload.system_prompt)
+        row = await crud.create_model_profile(conn, payload.name, payload.provider, payload.base_model, payload.system_prompt,
+                                               payload.response_cache, payload.fallbacks, payload.hedge)
         return row
 
 @router.get("/", response_model=List[ModelProfileOut])
 async def list_profiles(request: Request):
-    pool = get_db_pool(request.app)
+    pool = get_read_pool(request.app, "model_profiles")
     async with pool.acquire() as conn:
         rows = await crud.list_model_profiles(conn)
-        return rows
+    if serialization.TRUST_DB_ROWS:
+        return FastJSONResponse(serialization.trusted_rows(rows, ModelProfileOut))
+    return rows
 
 @router.get("/{profile_id}", response_model=ModelProfileOut)
 async def get_profile(profile_id: str, request: Request):
-    pool = get_db_pool(request.app)
+    pool = get_read_pool(request.app, "model_profiles", f"profile:{profile_id}")
     async with pool.acquire() as conn:
         r = await crud.get_model_profile(conn, profile_id)
         if not r:
@@ -35,7 +39,8 @@ async def get_profile(profile_id: str, request: Request):
 async def update_profile(profile_id: str, payload: ModelProfileUpdate, request: Request):
     pool = get_db_pool(request.app)
     async with pool.acquire() as conn:
-        r = await crud.update_model_profile(conn, profile_id, name=payload.name, provider=payload.provider, base_model=payload.base_model, system_prompt=payload.system_prompt)
+        r = await crud.update_model_profile(conn, profile_id, name=payload.name, provider=payload.provider, base_model=payload.base_model, system_prompt=payload.system_prompt, response_cache=payload.response_cache,
+                                             fallbacks=payload.fallbacks, hedge=payload.hedge)
         if not r:
             raise HTTPException(status_code=404, detail="Not found")
         return r
@@ -49,6 +54,6 @@ async def delete_profile(profile_id: str, request: Request):
 
 # Notes
 
-# Uses DB pool via get_db_pool.
+# Uses DB pool via get_db_pool; the two reads go through get_read_pool (replicas when configured).
 
-# Returns pydantic-validated models.
\ No newline at end of file
+# Returns pydantic-validated models (the list skips validation when TRUST_DB_ROWS=true).
\ No newline at end of file
@@ -10,6 +10,37 @@ MODEL_CATALOG = {
     "anthropic": ["claude-2", "claude-instant-1"]
 }
 
+# context window (tokens) per base model, used by CONTEXT_MODE=tokens
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385,
+    "claude-2": 100000,
+    "claude-instant-1": 100000,
+}
+DEFAULT_CONTEXT_LIMIT = 8192
+
+# upstream limits per provider (0 = unlimited); see app/limits.py
+PROVIDER_LIMITS = {
+    "openai": {
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+        "requests_per_min": int(os.getenv("OPENAI_RPM", "500")),
+        "tokens_per_min": int(os.getenv("OPENAI_TPM", "200000")),
+        "max_queue": int(os.getenv("OPENAI_MAX_QUEUE", "100")),
+    },
+    "anthropic": {
+        "max_concurrency": int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "16")),
+        "requests_per_min": int(os.getenv("ANTHROPIC_RPM", "50")),
+        "tokens_per_min": int(os.getenv("ANTHROPIC_TPM", "40000")),
+        "max_queue": int(os.getenv("ANTHROPIC_MAX_QUEUE", "50")),
+    },
+}
+
+# optional tighter concurrency for individual base models
+MODEL_CONCURRENCY = {
+    "gpt-4o": int(os.getenv("GPT_4O_MAX_CONCURRENCY", "16")),
+}
+
 @router.get("/")
 async def list_providers():
     """Return list of enabled providers based on env keys."""
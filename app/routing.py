@@ -0,0 +1,320 @@
+# app/routing.py
+import asyncio
+import collections
+import os
+import time
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import log, providers
+
+# consecutive failures that open a provider/model breaker, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN", "30"))
+# hedged requests: a second target starts once the first has run longer than
+# its recent p95 (HEDGE_DEFAULT_DELAY_MS until HEDGE_MIN_SAMPLES calls were seen)
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "2000")) / 1000.0
+HEDGE_MIN_DELAY_S = float(os.getenv("HEDGE_MIN_DELAY_MS", "50")) / 1000.0
+LATENCY_WINDOW = int(os.getenv("ROUTING_LATENCY_WINDOW", "200"))
+
+Target = Tuple[str, str]  # (provider, model)
+
+
+def parse_target(entry: str) -> Target:
+    """
+    "provider:model" -> (provider, model). The model part may itself contain ':'.
+    """
+    provider, _, model = entry.partition(":")
+    if not provider or not model:
+        raise ValueError(f"Invalid routing target '{entry}', expected 'provider:model'")
+    return provider, model
+
+def targets(model_profile: dict) -> List[Target]:
+    """
+    The profile's own provider/model first, then its fallbacks in order.
+    """
+    out = [(model_profile["provider"], model_profile["base_model"])]
+    for entry in model_profile.get("fallbacks") or ():
+        target = parse_target(entry)
+        if target not in out:
+            out.append(target)
+    return out
+
+
+class CircuitBreaker:
+    """
+    closed -> open after BREAKER_FAILURES consecutive failures; open ->
+    half_open after BREAKER_COOLDOWN_S, where a single probe call decides
+    whether it closes again or reopens.
+    """
+    __slots__ = ("target", "state", "failures", "opened_at", "probing")
+
+    def __init__(self, target: Target):
+        self.target = target
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_COOLDOWN_S:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, BREAKER_COOLDOWN_S - (time.monotonic() - self.opened_at))
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= BREAKER_FAILURES:
+            if self.state != "open":
+                log.emit("breaker_open", provider=self.target[0], model=self.target[1], failures=self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # call ended without a verdict (cancelled, or a client-side error)
+        self.probing = False
+
+
+class LatencyWindow:
+    """
+    Recent successful call durations for one target.
+    """
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_breakers: Dict[Target, CircuitBreaker] = {}
+_latency: Dict[Target, LatencyWindow] = {}
+_stats = {"calls": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "breaker_skips": 0}
+
+def _breaker(target: Target) -> CircuitBreaker:
+    b = _breakers.get(target)
+    if b is None:
+        b = _breakers[target] = CircuitBreaker(target)
+    return b
+
+def _window(target: Target) -> LatencyWindow:
+    w = _latency.get(target)
+    if w is None:
+        w = _latency[target] = LatencyWindow()
+    return w
+
+def hedge_delay(target: Target) -> float:
+    p = _window(target).quantile(HEDGE_QUANTILE)
+    return HEDGE_DEFAULT_DELAY_S if p is None else max(HEDGE_MIN_DELAY_S, p)
+
+def _is_upstream_failure(exc: BaseException) -> bool:
+    # a disabled/unknown provider (400) says nothing about upstream health
+    if isinstance(exc, HTTPException):
+        return exc.status_code >= 500 or exc.status_code == 429
+    return True
+
+def _all_open(candidates: List[Target]) -> HTTPException:
+    wait = min(_breaker(t).retry_after() for t in candidates)
+    return HTTPException(
+        status_code=503,
+        detail="All providers for this profile are failing, retry later",
+        headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+    )
+
+def _next_target(pending) -> Optional[Target]:
+    for target in pending:
+        if _breaker(target).allow():
+            return target
+        _stats["breaker_skips"] += 1
+    return None
+
+
+async def _attempt(target: Target, messages: List[Dict], temperature: float, call) -> str:
+    breaker = _breaker(target)
+    start = time.perf_counter()
+    try:
+        reply = await call(target[0], target[1], messages, temperature)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.failure() if _is_upstream_failure(e) else breaker.release()
+        raise
+    breaker.success()
+    _window(target).add(time.perf_counter() - start)
+    return reply
+
+async def call_model(model_profile: dict, messages: List[Dict], temperature: float = 0.7,
+                     call=providers.call_model) -> str:
+    """
+    Calls the profile's provider/model, failing over to its fallbacks in
+    order when a call fails or its breaker is open. With hedge enabled, a
+    call that outlives the target's recent p95 gets a second target started
+    next to it; the first reply wins and the other call is cancelled.
+    call(provider, model, messages, temperature) defaults to providers.call_model.
+    """
+    candidates = targets(model_profile)
+    hedge = bool(model_profile.get("hedge")) and len(candidates) > 1
+    pending = iter(candidates)
+    running: Dict[asyncio.Task, Target] = {}
+    last_error: Optional[BaseException] = None
+    _stats["calls"] += 1
+
+    def start_next() -> bool:
+        target = _next_target(pending)
+        if target is None:
+            return False
+        running[asyncio.ensure_future(_attempt(target, messages, temperature, call))] = target
+        return True
+
+    try:
+        if not start_next():
+            raise _all_open(candidates)
+        while running:
+            timeout = None
+            if hedge and len(running) == 1:
+                timeout = hedge_delay(next(iter(running.values())))
+            done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                slow = next(iter(running.values()))
+                if start_next():
+                    _stats["hedges"] += 1
+                    log.emit("provider_hedge", provider=slow[0], model=slow[1], after_ms=round(timeout * 1000, 2))
+                else:
+                    hedge = False  # nothing left to hedge with; just wait
+                continue
+            oldest = next(iter(running))
+            # prefer a success when several finished together
+            for task in sorted(done, key=lambda t: t.exception() is not None):
+                target = running.pop(task)
+                if task.exception() is None:
+                    if task is not oldest:
+                        _stats["hedge_wins"] += 1
+                    return task.result()
+                last_error = task.exception()
+                log.emit("provider_failover", provider=target[0], model=target[1],
+                         error=str(getattr(last_error, "detail", None) or last_error)[:400])
+            if not running:
+                if not start_next():
+                    break
+                _stats["failovers"] += 1
+        raise last_error
+    finally:
+        # the losing (or abandoned) calls are cancelled
+        for task in running:
+            if task.done():
+                task.exception()  # already failed; mark it retrieved
+            else:
+                task.cancel()
+
+def caller(model_profile: dict):
+    """
+    Adapter for completion_cache.call_model: a call(provider, model, messages,
+    temperature) that routes through the profile's policy (the cache key stays
+    on the profile's own provider/model).
+    """
+    async def call(provider: str, model: str, messages: List[Dict], temperature: float = 0.7) -> str:
+        return await call_model(model_profile, messages, temperature)
+    return call
+
+
+async def _open_stream(pending, messages: List[Dict], temperature: float, candidates: List[Target]):
+    last_error: Optional[BaseException] = None
+    while True:
+        target = _next_target(pending)
+        if target is None:
+            if last_error is not None:
+                raise last_error
+            raise _all_open(candidates)
+        try:
+            return target, await providers.stream_model(target[0], target[1], messages, temperature)
+        except Exception as e:
+            # providers.stream_model raises eagerly for disabled/unknown/saturated providers
+            _breaker(target).failure() if _is_upstream_failure(e) else _breaker(target).release()
+            last_error = e
+
+async def stream_model(model_profile: dict, messages: List[Dict], temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of call_model: fails over to the next target while
+    no delta has been relayed yet (no hedging). Like providers.stream_model,
+    errors that can be detected up front are raised before the response starts.
+    """
+    candidates = targets(model_profile)
+    pending = iter(candidates)
+    _stats["calls"] += 1
+    first = await _open_stream(pending, messages, temperature, candidates)
+    return _failover_stream(first, pending, messages, temperature, candidates)
+
+async def _failover_stream(opened, pending, messages, temperature, candidates) -> AsyncIterator[str]:
+    target, deltas = opened
+    while True:
+        breaker = _breaker(target)
+        relayed = False
+        settled = False
+        try:
+            async for delta in deltas:
+                relayed = True
+                yield delta
+            breaker.success()
+            settled = True
+            return
+        except Exception as e:
+            breaker.failure() if _is_upstream_failure(e) else breaker.release()
+            settled = True
+            if relayed:
+                raise
+            log.emit("provider_failover", provider=target[0], model=target[1],
+                     error=str(getattr(e, "detail", None) or e)[:400])
+            target, deltas = await _open_stream(pending, messages, temperature, candidates)
+            _stats["failovers"] += 1
+        finally:
+            if not settled:
+                breaker.release()  # client went away
+                await deltas.aclose()
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "targets": {
+            f"{p}:{m}": {
+                "breaker": _breaker((p, m)).state,
+                "consecutive_failures": _breaker((p, m)).failures,
+                "hedge_delay_ms": round(hedge_delay((p, m)) * 1000, 2),
+                "samples": len(_window((p, m)).samples),
+            }
+            for p, m in sorted(set(_breakers) | set(_latency))
+        },
+    }
+
+
+# Notes
+
+# Policies live on the model profile: fallbacks ("provider:model", tried in order) and hedge (migration 007).
+
+# Breakers and latency windows are per process and per (provider, model); /routing/stats shows them.
+
+# A hedge loser is cancelled through providers.call_model, which aborts the upstream request once no caller waits on it.
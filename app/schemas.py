@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
@@ -6,11 +6,27 @@ from uuid import UUID
 # Model profile schemas
 
 
+def _routing_targets(entries):
+    for entry in entries or ():
+        provider, _, model = entry.partition(":")
+        if not provider or not model:
+            raise ValueError(f"'{entry}' is not a 'provider:model' target")
+    return entries
+
+
 class ModelProfileCreate(BaseModel):
     name: str = Field(..., example="Helpful Assistant")
     provider: str = Field(..., example="openai")
     base_model: str = Field(..., example="gpt-4o-mini")
     system_prompt: str = Field(..., example="You are a helpful assistant...")
+    response_cache: bool = False  # cache completions for identical prompts
+    # routing policy (app/routing.py): ordered "provider:model" fallbacks, hedged requests
+    fallbacks: List[str] = Field(default_factory=list, example=["anthropic:claude-3-haiku-20240307"])
+    hedge: bool = False
+
+    @validator("fallbacks")
+    def check_fallbacks(cls, v):
+        return _routing_targets(v)
 
 
 class ModelProfileUpdate(BaseModel):
@@ -18,6 +34,13 @@ class ModelProfileUpdate(BaseModel):
     provider: Optional[str]
     base_model: Optional[str]
     system_prompt: Optional[str]
+    response_cache: Optional[bool]
+    fallbacks: Optional[List[str]]
+    hedge: Optional[bool]
+
+    @validator("fallbacks")
+    def check_fallbacks(cls, v):
+        return _routing_targets(v)
 
 
 class ModelProfileOut(BaseModel):
@@ -26,6 +49,9 @@ class ModelProfileOut(BaseModel):
     provider: str
     base_model: str
     system_prompt: str
+    response_cache: bool = False
+    fallbacks: List[str] = []
+    hedge: bool = False
     created_at: datetime
     updated_at: datetime
 
@@ -44,6 +70,11 @@ class ChatOut(BaseModel):
     id: UUID
     title: Optional[str]
     model_profile_id: Optional[UUID]
+    # maintained by append_message (migration 009)
+    message_count: int = 0
+    total_tokens: int = 0
+    last_role: Optional[str] = None
+    last_message_preview: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -51,11 +82,28 @@ class ChatOut(BaseModel):
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 
+class ChatCloneIn(BaseModel):
+    # both default to the source chat's
+    title: Optional[str] = None
+    model_profile_id: Optional[UUID] = None
+
+
 class MessageIn(BaseModel):
     content: str
     model_profile_id: Optional[UUID] = None  # optional override
 
 
+class BatchMessageItem(BaseModel):
+    chat_id: UUID
+    content: str
+    model_profile_id: Optional[UUID] = None  # optional override
+
+
+class BatchMessagesIn(BaseModel):
+    items: List[BatchMessageItem]
+    concurrency: Optional[int] = None  # provider calls in flight, capped server-side
+
+
 class MessageOut(BaseModel):
     id: UUID
     chat_id: UUID
@@ -0,0 +1,68 @@
+# app/serialization.py
+import os
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Any, Iterable, List, Type
+from uuid import UUID
+
+import asyncpg
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# List endpoints return DB rows without re-validating them against their
+# response_model (rows are projected onto the model's fields instead).
+TRUST_DB_ROWS = os.getenv("TRUST_DB_ROWS", "false").lower() == "true"
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    # datetime, date and dataclasses are handled natively by orjson. UUIDs only
+    # when exactly uuid.UUID; asyncpg returns its own subclass
+    if isinstance(obj, UUID):
+        return str(obj)
+    # asyncpg.Record is not a collections.abc.Mapping
+    if isinstance(obj, (asyncpg.Record, Mapping)):
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def dumps(obj: Any, newline: bool = False) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE if newline else _OPTIONS)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class: one orjson pass instead of json.dumps.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _field_names(model: Type[BaseModel]) -> List[str]:
+    fields = getattr(model, "model_fields", None) or model.__fields__
+    return list(fields)
+
+
+def trusted_rows(rows: Iterable[Mapping], model: Type[BaseModel]) -> List[dict]:
+    """
+    Cuts DB rows down to the model's fields without validating them, so a
+    route can hand them straight to FastJSONResponse and skip both the
+    response_model check and FastAPI's jsonable_encoder pass. The output
+    shape matches the validated path.
+    """
+    names = _field_names(model)
+    return [{k: r[k] for k in names if k in r} for r in rows]
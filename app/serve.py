@@ -0,0 +1,109 @@
+# app/serve.py
+"""
+Production entry point: several worker processes sharing one listening
+socket, on uvloop + httptools. Each worker runs the lifespan in app/main.py
+and only accepts connections once it is warm.
+
+    python -m app.serve --workers 4 --port 8000
+
+SIGTERM: /health/ready turns 503 at once, the listener closes DRAIN_DELAY_S
+later (time for the load balancer to stop routing here), open requests get
+up to SHUTDOWN_DRAIN_S to finish, then the lifespan shutdown drains provider
+calls and write-behind state. A second SIGTERM skips the delay.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+
+import uvicorn
+from dotenv import load_dotenv
+from uvicorn.supervisors import Multiprocess, multiprocess
+
+# before lifecycle reads SHUTDOWN_DRAIN_S
+load_dotenv()
+
+from . import lifecycle
+
+# seconds between SIGTERM and closing the listener (readiness already reports 503);
+# a few load balancer health-check intervals, so it stops routing here first
+DRAIN_DELAY_S = float(os.getenv("DRAIN_DELAY_S", "5"))
+
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        if DRAIN_DELAY_S and not lifecycle.draining:
+            lifecycle.begin_drain()
+            timer = threading.Timer(DRAIN_DELAY_S, self._exit, (sig, frame))
+            timer.daemon = True
+            timer.start()
+            return
+        lifecycle.begin_drain()
+        super().handle_exit(sig, frame)
+
+    def _exit(self, sig, frame):
+        # unless a second signal already started the shutdown
+        if not self.should_exit:
+            super().handle_exit(sig, frame)
+
+
+# uvicorn 0.30+ builds each worker's server itself. Spawned workers import this
+# module again, so this makes them DrainingServers too
+multiprocess.Server = DrainingServer
+
+
+def main(args):
+    metrics_dir = None
+    if args.workers > 1:
+        # caches are per process; other workers must hear about invalidations
+        os.environ.setdefault("CACHE_NOTIFY", "true")
+        # so are metrics: workers write them to files there and /metrics adds them up
+        if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            metrics_dir = tempfile.mkdtemp(prefix="model-studio-metrics-")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    config = uvicorn.Config(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=lifecycle.SHUTDOWN_DRAIN_S,
+        # requests are logged by app/logging_middleware.py
+        access_log=False,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
+    server = DrainingServer(config)
+    if args.workers > 1:
+        sock = config.bind_socket()
+        try:
+            supervisor = Multiprocess(config, target=server.run, sockets=[sock])
+        except TypeError:
+            # uvicorn 0.30+: no target, see multiprocess.Server above
+            supervisor = Multiprocess(config, sockets=[sock])
+        try:
+            supervisor.run()
+        finally:
+            if metrics_dir:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--loop", default="uvloop", choices=["uvloop", "asyncio", "auto"])
+    parser.add_argument("--http", default="httptools", choices=["httptools", "h11", "auto"])
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_S", "5")),
+                        help="seconds an idle keep-alive connection stays open (above the proxy's idle timeout)")
+    args = parser.parse_args()
+    main(args)
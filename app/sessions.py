@@ -0,0 +1,401 @@
+# app/sessions.py
+"""
+In-memory state for WebSocket chat sessions (/chats/{chat_id}/ws).
+
+Every chat with an open session in this process has one ChatBuffer: a ring
+buffer of its recent turns, shared by all sessions on that chat and bounded
+by SESSION_MAX_TURNS and SESSION_MAX_BYTES. Prompts are built from it, so a
+turn needs no history query. Session turns are written write-behind: they get
+their id and timestamp at once and are inserted in batches by a background
+flusher (every SESSION_FLUSH_INTERVAL_MS or SESSION_FLUSH_SIZE rows). The
+timestamp is this host's clock corrected to the database's (sync_clock),
+since REST writes to the same chat take the database's now().
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+import asyncpg
+
+from . import cache, crud, log, metrics, summaries, tokens
+
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", "20"))
+# turns kept per chat; defaults to what a prompt can use
+SESSION_MAX_TURNS = int(os.getenv(
+    "SESSION_MAX_TURNS", str(tokens.CONTEXT_MAX_MESSAGES if tokens.use_token_budget() else CONTEXT_WINDOW)
+))
+# approximate memory per chat buffer; the oldest turns are evicted first (the newest always stays)
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024)))
+# chats with an open session in this process; further connections are refused
+SESSION_MAX_CHATS = int(os.getenv("SESSION_MAX_CHATS", "2000"))
+SESSION_FLUSH_SIZE = int(os.getenv("SESSION_FLUSH_SIZE", "100"))
+SESSION_FLUSH_INTERVAL_S = int(os.getenv("SESSION_FLUSH_INTERVAL_MS", "200")) / 1000
+# seconds between measurements of the database clock against this host's
+SESSION_CLOCK_SYNC_S = float(os.getenv("SESSION_CLOCK_SYNC_S", "60"))
+
+# identifies this process in "messages:" notifications, so it ignores its own
+ORIGIN = uuid.uuid4().hex[:12]
+
+# per turn: dict + entries, on top of the content string itself
+_TURN_OVERHEAD = sys.getsizeof({"role": "", "content": "", "token_count": 0}) + 64
+
+
+def _turn_size(turn: dict) -> int:
+    return _TURN_OVERHEAD + sys.getsizeof(turn["content"])
+
+
+class ChatBuffer:
+    """
+    Recent turns of one chat, chronological: {"role", "content", "token_count"}.
+    """
+
+    def __init__(self, chat_id: str, max_turns: int = SESSION_MAX_TURNS, max_bytes: int = SESSION_MAX_BYTES):
+        self.chat_id = chat_id
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.turns: deque = deque()
+        self.bytes = 0
+        self.evicted = 0
+        self.sessions = 0
+        # set when another process wrote to the chat: reload before the next prompt
+        self.stale = False
+        # created_at of the last turn queued here; the next one is stamped later even if the clock offset moved
+        self.last_created_at: Optional[datetime] = None
+
+    def append(self, role: str, content: str, token_count: Optional[int] = None):
+        if token_count is None:
+            token_count = tokens.count_tokens(content) if tokens.use_token_budget() else 0
+        turn = {"role": role, "content": content, "token_count": token_count}
+        self.turns.append(turn)
+        self.bytes += _turn_size(turn)
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self.bytes > self.max_bytes):
+            self.bytes -= _turn_size(self.turns.popleft())
+            self.evicted += 1
+
+    def load(self, rows):
+        self.turns.clear()
+        self.bytes = 0
+        for r in rows:
+            self.append(r["role"], r["content"])
+        self.stale = False
+
+    def prompt_history(self, model_profile: dict, summary: Optional[str]) -> List[dict]:
+        """
+        The turns to send, same windowing as the REST path: the newest
+        CONTEXT_WINDOW turns, or in token mode the newest that fit the budget.
+        """
+        if tokens.use_token_budget():
+            budget = (tokens.context_budget(model_profile["base_model"])
+                      - tokens.count_prompt_tokens(model_profile["system_prompt"])
+                      - (tokens.count_prompt_tokens(summary) if summary else 0))
+            return tokens.trim_to_budget(list(self.turns), budget)
+        start = max(0, len(self.turns) - CONTEXT_WINDOW)
+        return [{"role": t["role"], "content": t["content"]} for t in list(self.turns)[start:]]
+
+    def stats(self) -> dict:
+        return {
+            "turns": len(self.turns),
+            "max_turns": self.max_turns,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "pending": len(_pending.get(self.chat_id, ())),
+        }
+
+
+# chat_id -> buffer, while at least one session on the chat is open
+_buffers: Dict[str, ChatBuffer] = {}
+# chat_id -> rows waiting for the flusher: (chat_id, role, content, id, created_at, token_count)
+_pending: Dict[str, List[tuple]] = {}
+_flushing: Set[str] = set()
+_flush_lock = asyncio.Lock()
+_wakeup = asyncio.Event()
+_flusher: Optional[asyncio.Task] = None
+# chat_id -> (pool, model_profile): summary refresh to start once the chat's queued rows are written
+_refresh_after_write: Dict[str, tuple] = {}
+# database clock minus this host's, and when it was last measured (time.monotonic)
+_clock_offset = timedelta(0)
+_clock_synced: Optional[float] = None
+_counters = {"flushed": 0, "flushes": 0, "flush_errors": 0, "dropped": 0, "refused": 0}
+
+
+def _report():
+    metrics.SESSION_BUFFER_BYTES.set(sum(b.bytes for b in _buffers.values()))
+
+
+# ---- Session lifecycle ----
+async def open_buffer(conn: asyncpg.Connection, chat_id: str, override_profile_id=None):
+    """
+    Registers a session on the chat and returns (buffer, model_profile,
+    summary), loading the recent turns on first open. The buffer is None when
+    the chat does not exist, the profile when the chat has none. Raises
+    OverflowError when the process already holds SESSION_MAX_CHATS buffers.
+    """
+    key = str(chat_id)
+    buffer = _buffers.get(key)
+    if buffer is None and len(_buffers) >= SESSION_MAX_CHATS:
+        _counters["refused"] += 1
+        raise OverflowError("Too many open chat sessions")
+    exists, profile, history, summary = await cache.load_message_context(
+        conn, key, override_profile_id, 0 if buffer else SESSION_MAX_TURNS
+    )
+    if not exists:
+        return None, None, None
+    if buffer is None:
+        buffer = _buffers.setdefault(key, ChatBuffer(key))
+        if not buffer.sessions:
+            buffer.load(history)
+    buffer.sessions += 1
+    metrics.SESSIONS_OPEN.inc()
+    _report()
+    return buffer, profile, summary
+
+def close_buffer(buffer: ChatBuffer):
+    buffer.sessions -= 1
+    metrics.SESSIONS_OPEN.dec()
+    if buffer.sessions <= 0 and _buffers.get(buffer.chat_id) is buffer:
+        # pending rows stay queued; the flusher writes them after the buffer is gone
+        del _buffers[buffer.chat_id]
+    _report()
+
+async def context(pool, buffer: ChatBuffer, override_profile_id=None):
+    """
+    Per turn: (model_profile, summary), from the cache without touching the
+    pool when possible, else one query. A stale buffer (written to by another
+    process) is reloaded first. Raises LookupError once the chat is gone.
+    """
+    if not buffer.stale:
+        cached = cache.cached_context(buffer.chat_id, override_profile_id)
+        if cached is not None:
+            return cached
+    async with pool.acquire() as conn:
+        if buffer.stale:
+            await flush_chat(conn, buffer.chat_id)
+            buffer.load(await crud.get_last_n_messages(conn, buffer.chat_id, buffer.max_turns))
+            _report()
+        exists, profile, _, summary = await cache.load_message_context(conn, buffer.chat_id, override_profile_id, 0)
+    if not exists:
+        raise LookupError("Chat not found")
+    return profile, summary
+
+
+# ---- Writes ----
+def add_turn(pool, buffer: ChatBuffer, role: str, content: str) -> uuid.UUID:
+    """
+    Appends a session turn to the buffer and queues it for the flusher.
+    Returns the message id it will be stored under.
+    """
+    token_count = tokens.count_tokens(content)
+    buffer.append(role, content, token_count)
+    message_id = uuid.uuid4()
+    created_at = datetime.now(timezone.utc) + _clock_offset
+    if buffer.last_created_at is not None and created_at <= buffer.last_created_at:
+        created_at = buffer.last_created_at + timedelta(microseconds=1)
+    buffer.last_created_at = created_at
+    row = (buffer.chat_id, role, content, message_id, created_at, token_count)
+    _pending.setdefault(buffer.chat_id, []).append(row)
+    _schedule_flush(pool)
+    _report()
+    return message_id
+
+def refresh_summary_after_write(pool, chat_id, model_profile: dict):
+    """
+    summaries.schedule_refresh once the chat's queued turns are written:
+    the refresh reads the turns from Postgres, so scheduling it while they
+    are still queued would miss them.
+    """
+    key = str(chat_id)
+    if key in _pending or key in _flushing:
+        _refresh_after_write[key] = (pool, model_profile)
+    else:
+        summaries.schedule_refresh(pool, key, model_profile)
+
+def _written(chat_ids, live=None):
+    # chats whose queued rows were just written; live: those not deleted meanwhile
+    for chat_id in chat_ids:
+        if chat_id in _pending:
+            # newer turns were queued during the write; wait for them
+            continue
+        waiting = _refresh_after_write.pop(chat_id, None)
+        if waiting is not None and (live is None or chat_id in live):
+            summaries.schedule_refresh(waiting[0], chat_id, waiting[1])
+
+async def sync_clock(pool):
+    """
+    Measures the database clock against this host's (midpoint of the round
+    trip). Session turns are stamped here but REST turns by the database, so
+    without this a host clock running behind would sort a session turn
+    before an earlier REST turn of the same chat.
+    """
+    global _clock_offset, _clock_synced
+    async with pool.acquire() as conn:
+        before = datetime.now(timezone.utc)
+        db_now = await conn.fetchval("SELECT clock_timestamp()")
+        after = datetime.now(timezone.utc)
+    _clock_offset = db_now - (before + (after - before) / 2)
+    _clock_synced = time.monotonic()
+    return _clock_offset.total_seconds()
+
+async def record(conn: asyncpg.Connection, chat_id, role: str, content: str, token_count: Optional[int] = None):
+    """
+    Called after the REST paths persist a message: updates this process's
+    buffer for the chat and, with CACHE_NOTIFY, tells other processes to
+    reload theirs.
+    """
+    key = str(chat_id)
+    buffer = _buffers.get(key)
+    if buffer is not None:
+        buffer.append(role, content, token_count)
+        _report()
+    await publish(conn, [key])
+
+async def publish(conn: asyncpg.Connection, chat_ids):
+    if cache.CACHE_NOTIFY and chat_ids:
+        await conn.execute(
+            "SELECT pg_notify($1, p) FROM unnest($2::text[]) p",
+            cache.NOTIFY_CHANNEL, [f"messages:{chat_id}:{ORIGIN}" for chat_id in chat_ids],
+        )
+
+async def invalidate(conn: asyncpg.Connection, chat_ids):
+    """
+    Bulk writes (imports) bypass record(): buffers of these chats, here and
+    in other processes, reload before their next prompt.
+    """
+    for chat_id in chat_ids:
+        buffer = _buffers.get(str(chat_id))
+        if buffer is not None:
+            buffer.stale = True
+    await publish(conn, [str(c) for c in chat_ids])
+
+def _on_messages(chat_id: str, origin: str):
+    buffer = _buffers.get(chat_id)
+    if buffer is not None and origin != ORIGIN:
+        buffer.stale = True
+
+cache.message_listeners.append(_on_messages)
+
+
+# ---- Write-behind flushing ----
+def _schedule_flush(pool):
+    global _flusher
+    if sum(len(rows) for rows in _pending.values()) >= SESSION_FLUSH_SIZE:
+        _wakeup.set()
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.ensure_future(_flush_loop(pool))
+
+async def _flush_loop(pool):
+    while _pending:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), SESSION_FLUSH_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush(pool)
+        if _clock_synced is None or time.monotonic() - _clock_synced > SESSION_CLOCK_SYNC_S:
+            try:
+                await sync_clock(pool)
+            except Exception as e:
+                log.emit("session_clock_sync_failed", error=str(e)[:400])
+
+async def _write(conn: asyncpg.Connection, rows: List[tuple]):
+    await crud.append_messages(
+        conn, [r[:3] for r in rows], ids=[r[3] for r in rows], created_at=[r[4] for r in rows],
+        counts=[r[5] for r in rows],
+    )
+    await publish(conn, list(dict.fromkeys(r[0] for r in rows)))
+
+async def flush(pool):
+    """
+    Writes every queued row in one statement. On failure the rows are queued
+    again (ahead of newer ones); rows of chats deleted meanwhile are dropped.
+    """
+    async with _flush_lock:
+        if not _pending:
+            return
+        batch = dict(_pending)
+        _pending.clear()
+        _flushing.update(batch)
+        rows = [r for chat_rows in batch.values() for r in chat_rows]
+        live = None
+        try:
+            async with pool.acquire() as conn:
+                try:
+                    async with conn.transaction():
+                        await _write(conn, rows)
+                except asyncpg.ForeignKeyViolationError:
+                    live = await crud.existing_chat_ids(conn, list(batch))
+                    rows = [r for r in rows if r[0] in live]
+                    _counters["dropped"] += sum(len(v) for k, v in batch.items() if k not in live)
+                    async with conn.transaction():
+                        await _write(conn, rows)
+            _counters["flushed"] += len(rows)
+            _counters["flushes"] += 1
+            _written(batch, live)
+        except Exception as e:
+            _counters["flush_errors"] += 1
+            log.emit("session_flush_failed", rows=len(rows), error=str(e)[:400])
+            for chat_id, chat_rows in batch.items():
+                _pending[chat_id] = chat_rows + _pending.get(chat_id, [])
+        finally:
+            _flushing.difference_update(batch)
+
+async def flush_chat(conn: asyncpg.Connection, chat_id):
+    """
+    Writes the chat's queued session turns on conn, so a REST request that
+    loads its history right after sees them. Cheap when nothing is queued.
+    """
+    key = str(chat_id)
+    if key in _flushing:
+        # being written by the flusher: wait for it to finish
+        async with _flush_lock:
+            pass
+    rows = _pending.pop(key, None)
+    if not rows:
+        return
+    try:
+        await _write(conn, rows)
+    except Exception:
+        _pending[key] = rows + _pending.get(key, [])
+        raise
+    _counters["flushed"] += len(rows)
+    _written([key])
+
+async def drain(pool, timeout: float = 10.0):
+    """
+    Shutdown: writes whatever is still queued, retrying until timeout.
+    """
+    if _flusher is not None and not _flusher.done():
+        _wakeup.set()
+        await asyncio.wait([_flusher], timeout=timeout)
+    if _pending:
+        log.emit("session_rows_lost", rows=sum(len(rows) for rows in _pending.values()))
+
+
+def stats() -> dict:
+    largest = sorted(_buffers.values(), key=lambda b: b.bytes, reverse=True)[:10]
+    return {
+        "sessions": sum(b.sessions for b in _buffers.values()),
+        "chats": len(_buffers),
+        "max_chats": SESSION_MAX_CHATS,
+        "bytes": sum(b.bytes for b in _buffers.values()),
+        "max_bytes_per_chat": SESSION_MAX_BYTES,
+        "max_turns_per_chat": SESSION_MAX_TURNS,
+        "pending": sum(len(rows) for rows in _pending.values()),
+        "clock_offset_ms": round(_clock_offset.total_seconds() * 1000, 1),
+        **_counters,
+        "largest": {b.chat_id: b.stats() for b in largest},
+    }
+
+
+# Notes
+
+# Session turns reach Postgres up to SESSION_FLUSH_INTERVAL_MS later; REST message posts to the same chat flush them first.
+
+# Summary refreshes after a session turn wait for the flusher (refresh_summary_after_write), since they read the turns from Postgres.
+
+# Memory bound per process: SESSION_MAX_CHATS x SESSION_MAX_BYTES (plus queued rows while the database is unreachable).
@@ -0,0 +1,111 @@
+# app/summaries.py
+import asyncio
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from . import cache, crud, log, providers, tokens
+
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+# refresh once this many messages have fallen out of the context window unsummarized
+SUMMARY_BATCH = int(os.getenv("SUMMARY_BATCH", "10"))
+# most turns folded in per refresh (the rest wait for the next one)
+SUMMARY_MAX_TURNS = int(os.getenv("SUMMARY_MAX_TURNS", "100"))
+# model used for summarizing; defaults to the chat's own profile
+SUMMARY_PROVIDER = os.getenv("SUMMARY_PROVIDER")
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL")
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "4000"))
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation. Update the existing summary with the new turns. "
+    "Keep facts, decisions, names, open questions and user preferences; drop pleasantries. "
+    f"Answer with the updated summary only, at most {SUMMARY_MAX_CHARS} characters."
+)
+
+# chats with a refresh in flight in this process
+_running: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+def build_summary_prompt(previous: str, turns) -> list:
+    lines = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": f"Existing summary:\n{previous or '(none)'}\n\nNew turns:\n{lines}"},
+    ]
+
+def prompt_window(model_profile: dict, summary: Optional[str]) -> Tuple[int, Optional[int]]:
+    """
+    (rows, token budget or None) of the history the chat's next prompt
+    carries, as routers/chats._prepare_provider_call loads it: the last
+    CONTEXT_WINDOW - 1 messages, or in token mode the newest that fit the
+    model's budget next to the system prompt and summary. The next user
+    message is not known yet and counts as 0 tokens, which only widens the
+    window: a message may be summarized late, never while a prompt still
+    carries it.
+    """
+    if tokens.use_token_budget():
+        budget = (tokens.context_budget(model_profile["base_model"])
+                  - tokens.count_prompt_tokens(model_profile.get("system_prompt") or "")
+                  - (tokens.count_prompt_tokens(summary) if summary else 0))
+        return tokens.CONTEXT_MAX_MESSAGES - 1, budget
+    return int(os.getenv("CONTEXT_WINDOW", "20")) - 1, None
+
+async def refresh_summary(pool, chat_id: str, model_profile: dict):
+    """
+    Folds turns that have left the context window (prompt_window) into the
+    chat's summary. Only the new turns are sent, together with the previous
+    summary. Other processes drop their cached copy via cache.invalidate_summary.
+    """
+    async with pool.acquire() as conn:
+        current = await crud.get_summary(conn, chat_id)
+        previous = current["summary"] if current else None
+        window, budget = prompt_window(model_profile, previous)
+        turns = await crud.get_unsummarized_turns(
+            conn, chat_id, current["covered_until"] if current else None,
+            current["covered_until_id"] if current else None, window, budget, SUMMARY_MAX_TURNS
+        )
+    if len(turns) < SUMMARY_BATCH:
+        return
+    provider = SUMMARY_PROVIDER or model_profile["provider"]
+    model = SUMMARY_MODEL or model_profile["base_model"]
+    summary = await providers.call_model(provider, model, build_summary_prompt(previous or "", turns), 0.0)
+    summary = summary.strip()[:SUMMARY_MAX_CHARS]
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await crud.upsert_summary(conn, chat_id, summary, turns[-1]["created_at"], turns[-1]["id"], len(turns))
+            await cache.invalidate_summary(conn, chat_id)
+    cache.summaries.set(str(chat_id), summary)
+    log.emit("chat_summary", chat_id=chat_id, turns=len(turns), chars=len(summary))
+
+def schedule_refresh(pool, chat_id: str, model_profile: dict):
+    """
+    Fire-and-forget refresh after a reply was persisted; never on the request path.
+    At most one refresh per chat runs at a time in this process.
+    """
+    key = str(chat_id)
+    if not SUMMARY_ENABLED or key in _running:
+        return
+    _running.add(key)
+
+    async def run():
+        try:
+            await refresh_summary(pool, chat_id, model_profile)
+        except Exception as e:
+            log.emit("chat_summary_failed", chat_id=chat_id, error=str(e)[:400])
+        finally:
+            _running.discard(key)
+
+    task = asyncio.ensure_future(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def drain(timeout: float = 10.0):
+    if _tasks:
+        await asyncio.wait(list(_tasks), timeout=timeout)
+
+
+# Notes
+
+# SUMMARY_ENABLED=true turns this on. The summary is injected right after the system prompt (utils.messages_for_openai).
+
+# Summaries are cached per chat (cache.summaries) and loaded with the context in the same statement on a cache miss.
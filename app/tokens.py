@@ -0,0 +1,95 @@
+# app/tokens.py
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from . import log
+from .routers.providers import MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a ~4 chars/token estimate
+    tiktoken = None
+
+# "messages": last CONTEXT_WINDOW messages; "tokens": newest messages that fit the model's context limit
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "messages")
+# tokens kept free for the reply
+CONTEXT_RESERVE_TOKENS = int(os.getenv("CONTEXT_RESERVE_TOKENS", "1024"))
+# upper bound on rows scanned per request in token mode
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "500"))
+# role/separator tokens each chat message costs on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(os.getenv("TOKENIZER_ENCODING", "cl100k_base"))
+    except Exception as e:
+        # the BPE file is downloaded on first use (kept in TIKTOKEN_CACHE_DIR);
+        # without it this process estimates instead of failing every write
+        log.emit("tokenizer_unavailable", error=str(e)[:400])
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of one message including per-message overhead.
+    This is what gets stored in messages.token_count at write time.
+    """
+    enc = _encoding()
+    if enc is None:
+        n = (len(text) + 3) // 4
+    else:
+        n = len(enc.encode(text, disallowed_special=()))
+    return n + MESSAGE_OVERHEAD_TOKENS
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """
+    count_tokens for many texts at once; tiktoken encodes them on its own
+    threads (bulk imports).
+    """
+    enc = _encoding()
+    if enc is None:
+        return [(len(t) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS for t in texts]
+    return [len(ids) + MESSAGE_OVERHEAD_TOKENS for ids in enc.encode_batch(texts, disallowed_special=())]
+
+# system prompts repeat on every request of a profile, so memoize them
+count_prompt_tokens = lru_cache(maxsize=256)(count_tokens)
+
+def use_token_budget() -> bool:
+    return CONTEXT_MODE == "tokens"
+
+def context_budget(model: str) -> int:
+    return MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT) - CONTEXT_RESERVE_TOKENS
+
+def history_budgets(used: int) -> Tuple[int, Dict[str, int]]:
+    """
+    History budget once `used` tokens are taken (the new user message):
+    (fallback budget, {base_model: budget}). Passed to SQL so the budget can
+    be applied before the profile is known.
+    """
+    per_model = {model: context_budget(model) - used for model in MODEL_CONTEXT_LIMITS}
+    return DEFAULT_CONTEXT_LIMIT - CONTEXT_RESERVE_TOKENS - used, per_model
+
+def trim_to_budget(history: List[Dict], budget: int) -> List[Dict]:
+    """
+    history is chronological with stored token_count per item; keep the
+    newest items whose cumulative count fits the budget. No re-tokenizing.
+    """
+    total = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        total += history[i]["token_count"] or 0
+        if total > budget:
+            break
+        start = i
+    return [{"role": m["role"], "content": m["content"]} for m in history[start:]]
+
+
+# Notes
+
+# tiktoken is in requirements.txt but optional: when it is not installed, or its encoding cannot be loaded, counts are estimated at ~4 characters per token.
+
+# Counts are computed once when a message is written (crud.append_message) and summed in SQL at read time.
@@ -1,11 +1,54 @@
 # app/utils.py
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+from uuid import UUID
+import base64
+from fastapi import HTTPException
 
-def messages_for_openai(system_prompt: str, prior_messages: List[Dict]) -> List[Dict]:
+def messages_for_openai(system_prompt: str, prior_messages: List[Dict], summary: Optional[str] = None) -> List[Dict]:
     """
-    Build messages array for OpenAI: prepend system prompt, then prior messages.
+    Build messages array for OpenAI: prepend system prompt, then the rolling
+    summary of older turns (if any), then prior messages.
     prior_messages is a list of {role, content}
     """
     msgs = [{"role": "system", "content": system_prompt}]
+    if summary:
+        msgs.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
     msgs.extend(prior_messages)
     return msgs
+
+
+def encode_cursor(ts: datetime, row_id: UUID) -> str:
+    """
+    Opaque keyset cursor for (timestamp, id) pagination.
+    """
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, UUID]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_rank_cursor(rank: float, row_id: UUID) -> str:
+    """
+    Opaque keyset cursor for ranked (rank, id) pagination (search results).
+    """
+    raw = f"{rank!r}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: Optional[str]) -> Optional[Tuple[float, UUID]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, row_id = raw.split("|", 1)
+        return float(rank), UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
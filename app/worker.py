@@ -0,0 +1,138 @@
+# app/worker.py
+"""
+Runs queued message jobs (table message_jobs). Start as many as needed,
+on any host that can reach the database:
+
+    python -m app.worker --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import signal
+
+import asyncpg
+
+from . import cache, completion_cache, crud, log, providers, routing, sessions, summaries
+from . import db
+from .db import create_db_pool
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# a running job locked longer than this is assumed orphaned and reclaimed (must exceed provider timeouts)
+JOB_LOCK_TIMEOUT_S = float(os.getenv("JOB_LOCK_TIMEOUT", "300"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# retry n waits JOB_RETRY_BACKOFF * 2**(n-1) seconds, at most JOB_RETRY_BACKOFF_MAX
+JOB_RETRY_BACKOFF_S = float(os.getenv("JOB_RETRY_BACKOFF", "2.0"))
+JOB_RETRY_BACKOFF_MAX_S = float(os.getenv("JOB_RETRY_BACKOFF_MAX", "60"))
+
+
+def backoff(attempts: int) -> float:
+    return min(JOB_RETRY_BACKOFF_MAX_S, JOB_RETRY_BACKOFF_S * 2 ** (attempts - 1))
+
+
+async def fail(pool, job: dict, detail: str, retry: bool):
+    """
+    Records a failed attempt: requeued after backoff, or failed for good.
+    If even that cannot be written, the job stays running and claim_job
+    reclaims it once its lock is older than JOB_LOCK_TIMEOUT.
+    """
+    try:
+        async with pool.acquire() as conn:
+            await crud.fail_job(conn, job, detail, retry, backoff(job["attempts"]) if retry else 0.0)
+    except Exception as e:
+        log.emit("job_fail_unrecorded", job_id=job["id"], error=str(e)[:400])
+    log.emit("job_failed", job_id=job["id"], attempts=job["attempts"], retry=retry, error=detail[:400])
+
+
+async def process(pool, job: dict):
+    token = log.request_id_var.set(f"job:{job['id']}")
+    try:
+        profile = {"provider": job["provider"], "base_model": job["model"], "response_cache": job["response_cache"],
+                   "fallbacks": job["fallbacks"], "hedge": job["hedge"],
+                   # the prompt starts with it (utils.messages_for_openai); sizes the summary window
+                   "system_prompt": job["messages"][0]["content"]}
+        try:
+            reply = await completion_cache.call_model(pool, profile, job["messages"], routing.caller(profile))
+        except Exception as e:
+            status = getattr(e, "status_code", 502)
+            # 4xx other than rate limiting will not get better by retrying
+            retry = job["attempts"] < JOB_MAX_ATTEMPTS and (status >= 500 or status == 429)
+            detail = getattr(e, "detail", None) or str(e)
+            await fail(pool, job, str(detail), retry)
+            return
+        try:
+            async with pool.acquire() as conn:
+                await crud.complete_job(conn, job, reply)
+        except Exception as e:
+            # rolled back (database error, chat deleted meanwhile): the job must not stay running
+            await fail(pool, job, f"Saving the reply failed: {e}", job["attempts"] < JOB_MAX_ATTEMPTS)
+            return
+        async with pool.acquire() as conn:
+            # API processes with a session on the chat reload its buffer
+            await sessions.publish(conn, [job["chat_id"]])
+        summaries.schedule_refresh(pool, job["chat_id"], profile)
+        log.emit("job_done", job_id=job["id"], chat_id=job["chat_id"], provider=job["provider"], model=job["model"])
+    finally:
+        log.request_id_var.reset(token)
+
+
+async def run_worker(concurrency: int):
+    # summary refreshes here must reach the API processes' caches, whatever their CACHE_NOTIFY
+    cache.CACHE_NOTIFY = True
+    pool = await create_db_pool()
+    # replies written here keep their chats on the primary in the API processes
+    db.start_write_broadcast(pool)
+    await providers.init_provider_clients()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    wake = asyncio.Event()
+    listener = await asyncpg.connect(dsn=os.getenv("DATABASE_URL"))
+    await listener.add_listener(crud.JOBS_CHANNEL, lambda *args: wake.set())
+
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    log.emit("worker_started", concurrency=concurrency)
+    try:
+        while not stop.is_set():
+            await slots.acquire()
+            if stop.is_set():
+                slots.release()
+                break
+            # clear before claiming so a notify that races with an empty claim is not lost
+            wake.clear()
+            async with pool.acquire() as conn:
+                job = await crud.claim_job(conn, JOB_LOCK_TIMEOUT_S, JOB_MAX_ATTEMPTS)
+            if job is None:
+                slots.release()
+                waiters = [asyncio.ensure_future(wake.wait()), asyncio.ensure_future(stop.wait())]
+                await asyncio.wait(waiters, timeout=JOB_POLL_INTERVAL_S, return_when=asyncio.FIRST_COMPLETED)
+                for w in waiters:
+                    w.cancel()
+                continue
+            task = asyncio.ensure_future(process(pool, job))
+            running.add(task)
+
+            def finished(t):
+                running.discard(t)
+                slots.release()
+            task.add_done_callback(finished)
+    finally:
+        # graceful: stop claiming, let in-flight jobs finish
+        log.emit("worker_draining", in_flight=len(running))
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        await summaries.drain()
+        await listener.close()
+        await providers.close_provider_clients()
+        await db.stop_write_broadcast()
+        await pool.close()
+        log.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "8")))
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.concurrency))
@@ -0,0 +1,99 @@
+# benchmarks/bench_context_window.py
+"""
+Token-budget context selection over chats with 10k messages:
+re-tokenizing history on every request vs the cumulative sum over stored
+messages.token_count (crud.get_messages_within_budget).
+
+Needs a local Postgres with migrations applied:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_context_window --messages 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import asyncpg
+
+from app import crud, tokens
+from .bench_provider_client import percentile
+
+WORDS = "the quick brown fox jumps over a lazy dog while tokens pile up in context".split()
+
+
+def random_text(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 400)))
+
+
+async def retokenize(conn, chat_id, budget, limit):
+    rows = await conn.fetch(
+        "SELECT role, content FROM messages WHERE chat_id = $1 ORDER BY created_at DESC LIMIT $2", chat_id, limit
+    )
+    total, picked = 0, []
+    for r in rows:
+        total += tokens.count_tokens(r["content"])
+        if total > budget:
+            break
+        picked.append(r)
+    return picked[::-1]
+
+
+async def timed(label, fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = await fn()
+        latencies.append(time.perf_counter() - start)
+    print(f"{label:<22} picked={len(result):<5} p50={percentile(latencies, 50) * 1000:.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.2f}ms")
+
+
+async def main(args):
+    rng = random.Random(0)
+    texts = [random_text(rng) for _ in range(args.messages)]
+
+    start = time.perf_counter()
+    counts = [tokens.count_tokens(t) for t in texts]
+    per_msg = (time.perf_counter() - start) / len(texts)
+    print(f"tokenizer: {'tiktoken' if tokens.tiktoken else 'estimate'} {per_msg * 1e6:.1f}us/message")
+
+    conn = await asyncpg.connect(dsn=os.environ["DATABASE_URL"])
+    try:
+        chat = await crud.create_chat(conn, "bench-context", None)
+        await conn.copy_records_to_table(
+            "messages",
+            records=[
+                (chat["id"], "user" if i % 2 == 0 else "assistant", t, c)
+                for i, (t, c) in enumerate(zip(texts, counts))
+            ],
+            columns=["chat_id", "role", "content", "token_count"],
+        )
+        # created_at defaults to now() for the whole COPY; spread it so ordering is meaningful
+        await conn.execute(
+            """
+            UPDATE messages m SET created_at = now() - make_interval(secs => s.rn)
+            FROM (SELECT id, row_number() OVER () AS rn FROM messages WHERE chat_id = $1) s
+            WHERE m.id = s.id
+            """,
+            chat["id"],
+        )
+        await conn.execute("ANALYZE messages")
+
+        for model in ("gpt-3.5-turbo", "gpt-4o"):
+            budget = tokens.context_budget(model)
+            limit = args.messages
+            print(f"model={model} budget={budget} tokens, chat={args.messages} messages")
+            await timed("  re-tokenize history", lambda: retokenize(conn, chat["id"], budget, limit), args.iterations)
+            await timed("  cumulative-sum query", lambda: crud.get_messages_within_budget(conn, chat["id"], budget, limit), args.iterations)
+
+        await conn.execute("DELETE FROM chats WHERE id = $1", chat["id"])
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args))
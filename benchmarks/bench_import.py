@@ -0,0 +1,123 @@
+# benchmarks/bench_import.py
+"""
+Bulk message import (app/bulk.py) end to end minus HTTP: an NDJSON or CSV
+body generated in memory, fed in request-sized chunks through bulk.parse and
+bulk.import_messages (COPY in one transaction, counter update, partition
+check). Target: 100k messages/s on a local Postgres. --baseline times the
+same rows through crud.append_message one by one for comparison, and
+--clone-size times crud.clone_chat on a chat of that many messages.
+Export -> import fidelity is covered by tests/test_import_round_trip.py.
+
+Chats are created through bulk.import_chats and titled "bench-import ...";
+they (and their messages) are deleted at the end unless --keep.
+
+Needs a local Postgres with migrations applied:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_import --messages 1000000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import time
+import uuid
+
+import asyncpg
+
+from app import bulk, crud, serialization
+
+TARGET_PER_S = 100000
+WORDS = "the deploy failed after the migration because the replica lagged behind the primary".split()
+
+
+def content(i: int) -> str:
+    n = 8 + i % 40
+    return " ".join(WORDS[(i + k) % len(WORDS)] for k in range(n))
+
+
+def body(chat_ids, messages: int, fmt: str, with_tokens: bool) -> bytes:
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(["chat_id", "role", "content", "token_count"])
+        for i in range(messages):
+            writer.writerow([chat_ids[i % len(chat_ids)], "user" if i % 2 == 0 else "assistant",
+                             content(i), 12 if with_tokens else ""])
+        return out.getvalue().encode()
+    return b"".join(
+        serialization.dumps({
+            "chat_id": str(chat_ids[i % len(chat_ids)]),
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": content(i),
+            **({"token_count": 12} if with_tokens else {}),
+        }, newline=True)
+        for i in range(messages)
+    )
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def create_chats(conn, n: int):
+    rows = "".join(
+        serialization.dumps({"id": str(uuid.uuid4()), "title": f"bench-import {i}"}, newline=True).decode()
+        for i in range(n)
+    ).encode()
+    await bulk.import_chats(conn, bulk.parse(chunked(rows, 65536), "ndjson"))
+    return [r["id"] for r in await conn.fetch("SELECT id FROM chats WHERE title LIKE 'bench-import %'")]
+
+
+async def main(args):
+    conn = await asyncpg.connect(dsn=os.environ["DATABASE_URL"])
+    try:
+        chat_ids = await create_chats(conn, args.chats)
+        data = body(chat_ids, args.messages, args.format, not args.count_tokens)
+        print(f"{args.messages} messages over {len(chat_ids)} chats, {args.format} body {len(data) / 2**20:.1f}MB")
+
+        start = time.perf_counter()
+        result = await bulk.import_messages(conn, bulk.parse(chunked(data, args.chunk), args.format))
+        elapsed = time.perf_counter() - start
+        rate = result["messages"] / elapsed
+        print(f"import       {result['messages']} rows in {elapsed:.2f}s = {rate:,.0f} msgs/s "
+              f"(partitions created: {result['partitions_created']}) "
+              f"{'PASS' if rate >= TARGET_PER_S else 'FAIL'} (target {TARGET_PER_S:,}/s)")
+
+        if args.baseline:
+            start = time.perf_counter()
+            for i in range(args.baseline):
+                await crud.append_message(conn, chat_ids[i % len(chat_ids)], "user", content(i), 12)
+            elapsed = time.perf_counter() - start
+            print(f"append loop  {args.baseline} rows in {elapsed:.2f}s = {args.baseline / elapsed:,.0f} msgs/s")
+
+        if args.clone_size:
+            source = chat_ids[0]
+            have = await conn.fetchval("SELECT message_count FROM chats WHERE id = $1", source)
+            if have < args.clone_size:
+                more = body([source], args.clone_size - have, "ndjson", True)
+                await bulk.import_messages(conn, bulk.parse(chunked(more, args.chunk), "ndjson"))
+            start = time.perf_counter()
+            clone = await crud.clone_chat(conn, source, "bench-import clone")
+            elapsed = time.perf_counter() - start
+            print(f"clone        {clone['message_count']} messages in {elapsed * 1000:.0f}ms "
+                  f"= {clone['message_count'] / elapsed:,.0f} msgs/s")
+
+        if not args.keep:
+            await conn.execute("DELETE FROM chats WHERE title LIKE 'bench-import %'")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--format", choices=bulk.FORMATS, default="ndjson")
+    parser.add_argument("--chunk", type=int, default=65536, help="bytes per body chunk, like request.stream()")
+    parser.add_argument("--count-tokens", action="store_true", help="omit token_count so the import counts tokens")
+    parser.add_argument("--baseline", type=int, default=0, help="rows to insert one by one with append_message")
+    parser.add_argument("--clone-size", type=int, default=100000, help="messages in the cloned chat (0 = skip)")
+    parser.add_argument("--keep", action="store_true", help="keep the imported chats")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,86 @@
+# benchmarks/bench_message_hot_path.py
+"""
+Statements / round trips / latency per chat message for the DB part of the
+message flow: the legacy seven-statement sequence vs the consolidated hot
+path in app/crud.py (cold cache, i.e. the worst case).
+
+Needs a local Postgres with migrations applied (asyncpg >= 0.29 for query logging):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_message_hot_path --iterations 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import asyncpg
+
+from app import crud
+from .bench_provider_client import percentile
+
+N = 20
+
+
+async def legacy_flow(conn, chat_id):
+    # what post_message ran before the hot path (without the provider call)
+    chat = await conn.fetchrow("SELECT * FROM chats WHERE id = $1", chat_id)
+    await conn.fetchrow("SELECT * FROM model_profiles WHERE id = $1", chat["model_profile_id"])
+    await conn.fetchrow("INSERT INTO messages (chat_id, role, content) VALUES ($1, $2, $3) RETURNING *", chat_id, "user", "hi")
+    await conn.execute("UPDATE chats SET updated_at = now() WHERE id = $1", chat_id)
+    await conn.fetch(
+        "SELECT role, content, created_at FROM messages WHERE chat_id = $1 ORDER BY created_at DESC LIMIT $2", chat_id, N
+    )
+    await conn.fetchrow("INSERT INTO messages (chat_id, role, content) VALUES ($1, $2, $3) RETURNING *", chat_id, "assistant", "ok")
+    await conn.execute("UPDATE chats SET updated_at = now() WHERE id = $1", chat_id)
+
+
+async def hot_path_flow(conn, chat_id):
+    async with conn.transaction():
+        await crud.load_message_context(conn, chat_id, None, N - 1)
+        await crud.append_message(conn, chat_id, "user", "hi")
+    async with conn.transaction():
+        await crud.append_message(conn, chat_id, "assistant", "ok")
+
+
+async def measure(label, flow, conn, chat_id, iterations):
+    statements = []
+    def logger(record):
+        statements.append(record.query)
+    conn.add_query_logger(logger)
+    await flow(conn, chat_id)  # warm the statement cache
+    statements.clear()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await flow(conn, chat_id)
+        latencies.append(time.perf_counter() - start)
+    per_request = len(statements) / iterations
+    print(f"{label:<10} statements/request={per_request:.1f} round_trips/request={per_request:.1f} "
+          f"p50={percentile(latencies, 50) * 1000:.2f}ms p99={percentile(latencies, 99) * 1000:.2f}ms")
+    conn.remove_query_logger(logger)
+
+
+async def main(args):
+    conn = await asyncpg.connect(dsn=os.environ["DATABASE_URL"])
+    try:
+        profile = await crud.create_model_profile(conn, "bench", "openai", "gpt-4o-mini", "Be brief.")
+        chat = await crud.create_chat(conn, "bench", profile["id"])
+        for i in range(args.history):
+            await crud.append_message(conn, chat["id"], "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+        await measure("legacy", legacy_flow, conn, chat["id"], args.iterations)
+        await measure("hot path", hot_path_flow, conn, chat["id"], args.iterations)
+        print("(hot path counts include BEGIN/COMMIT of the two explicit transactions)")
+
+        await conn.execute("DELETE FROM chats WHERE id = $1", chat["id"])
+        await conn.execute("DELETE FROM model_profiles WHERE id = $1", profile["id"])
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--history", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,77 @@
+# benchmarks/bench_metrics_overhead.py
+"""
+Cost of the Prometheus instrumentation: per-observation cost of the helpers
+in app/metrics.py, and end-to-end request overhead with metrics on vs off
+(in-process ASGI, no DB needed: hits /health and /providers/).
+
+    python -m benchmarks.bench_metrics_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app import metrics
+from .bench_provider_client import percentile
+
+
+def per_call(label, fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    ns = (time.perf_counter() - start) / n * 1e9
+    print(f"  {label:<34} {ns:8.0f} ns/op")
+
+
+async def timed_db_overhead(n):
+    async def raw():
+        return None
+    wrapped = metrics.timed_db(raw)
+    for label, fn in (("raw coroutine", raw), ("@timed_db coroutine", wrapped)):
+        start = time.perf_counter()
+        for _ in range(n):
+            await fn()
+        print(f"  {label:<34} {(time.perf_counter() - start) / n * 1e9:8.0f} ns/op")
+
+
+async def requests(app, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(200):  # warm up
+            await client.get("/health")
+        latencies = []
+        for i in range(n):
+            start = time.perf_counter()
+            await client.get("/health" if i % 2 else "/providers/")
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main(args):
+    print("per observation:")
+    per_call("observe_request", lambda: metrics.observe_request("GET", "/chats/{chat_id}/messages", 200, 0.01), args.calls)
+    per_call("observe_provider", lambda: metrics.observe_provider("openai", "gpt-4o-mini", 0.8), args.calls)
+    per_call("observe_pool_wait", lambda: metrics.observe_pool_wait(0.0001), args.calls)
+    await timed_db_overhead(args.calls)
+
+    from app.main import create_app
+    app = create_app()
+    print(f"end-to-end ({args.requests} requests, in-process):")
+    results = {}
+    for enabled in (False, True, False, True):  # interleave to reduce drift
+        metrics.METRICS_ENABLED = enabled
+        results.setdefault(enabled, []).extend(await requests(app, args.requests))
+    for enabled, samples in results.items():
+        print(f"  metrics={'on ' if enabled else 'off'} p50={percentile(samples, 50) * 1e6:.1f}us "
+              f"p99={percentile(samples, 99) * 1e6:.1f}us")
+    p50_off, p50_on = percentile(results[False], 50), percentile(results[True], 50)
+    print(f"  overhead at p50: {(p50_on - p50_off) * 1e6:+.1f}us ({(p50_on / p50_off - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,188 @@
+# benchmarks/bench_partitions.py
+"""
+Hot-path message queries on a seeded 50M-row history, before and after the
+migration 010 layout:
+
+  flat         one messages table with the (chat_id, created_at, id) index
+  partitioned  the same rows in monthly range partitions
+  archived     partitioned, with months past the retention age detached
+               (what python -m app.archive leaves live)
+
+Measures get_last_n_messages / list_messages / append_message shaped queries
+on random chats plus live index size. Tables live in the scratch schemas
+bench_flat and bench_part (dropped at the end unless --keep, reused when
+they already hold --rows rows), so the app's own tables are not touched.
+
+Needs a local Postgres:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_partitions --rows 50000000 --keep
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+import asyncpg
+
+from .bench_provider_client import percentile
+
+COLUMNS = """
+  id UUID NOT NULL DEFAULT gen_random_uuid(),
+  chat_id UUID NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  token_count INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+"""
+
+# rows spread evenly over the period, chats interleaved so every chat has history in every month
+SEED_SQL = """
+INSERT INTO bench_flat.messages (chat_id, role, content, token_count, created_at)
+SELECT ($1::uuid[])[1 + (g % array_length($1::uuid[], 1))::int],
+       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+       md5(g::text) || ' ' || md5((g + 1)::text),
+       20,
+       now() - make_interval(secs => ($4::bigint - g) * $5::float8)
+FROM generate_series($2::bigint, $3::bigint) g
+"""
+
+QUERIES = {
+    "last_n": "SELECT role, content, created_at FROM messages WHERE chat_id = $1 ORDER BY created_at DESC LIMIT 20",
+    "list_page": "SELECT id, chat_id, role, content, token_count, created_at FROM messages "
+                 "WHERE chat_id = $1 ORDER BY created_at ASC, id ASC LIMIT 100",
+    "append": "INSERT INTO messages (chat_id, role, content, token_count) VALUES ($1, 'user', 'hi', 4)",
+}
+
+
+async def seed(conn, args, chat_ids):
+    have = await conn.fetchval("SELECT to_regclass('bench_part.messages') IS NOT NULL")
+    if have and await conn.fetchval("SELECT count(*) FROM bench_flat.messages") >= args.rows:
+        print("reusing seeded bench_flat / bench_part")
+        return [r["id"] for r in await conn.fetch("SELECT id FROM bench_flat.chats")]
+    await conn.execute("DROP SCHEMA IF EXISTS bench_flat CASCADE; DROP SCHEMA IF EXISTS bench_part CASCADE")
+    await conn.execute("CREATE SCHEMA bench_flat; CREATE SCHEMA bench_part")
+    await conn.execute("CREATE TABLE bench_flat.chats (id UUID PRIMARY KEY)")
+    await conn.execute("INSERT INTO bench_flat.chats SELECT unnest($1::uuid[])", chat_ids)
+    await conn.execute(f"CREATE TABLE bench_flat.messages ({COLUMNS}, PRIMARY KEY (id))")
+    await conn.execute(f"CREATE TABLE bench_part.messages ({COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)")
+    await conn.execute("CREATE TABLE bench_part.messages_default PARTITION OF bench_part.messages DEFAULT")
+    for m in range(args.months + 2):
+        await conn.execute(
+            f"""
+            CREATE TABLE bench_part.messages_m{m} PARTITION OF bench_part.messages
+            FOR VALUES FROM (date_trunc('month', now()) - make_interval(months => {args.months - 1 - m}))
+                       TO (date_trunc('month', now()) - make_interval(months => {args.months - 2 - m}))
+            """
+        )
+
+    # stay inside the oldest partition's range so nothing lands in the default partition
+    seconds_per_row = (args.months - 1) * 30 * 86400 / args.rows
+    start = time.perf_counter()
+    for lo in range(1, args.rows + 1, args.batch):
+        hi = min(args.rows, lo + args.batch - 1)
+        await conn.execute(SEED_SQL, chat_ids, lo, hi, args.rows, seconds_per_row)
+        print(f"  seeded {hi}/{args.rows} ({hi / (time.perf_counter() - start):.0f} rows/s)", end="\r")
+    print()
+    # indexes after the bulk load (faster than maintaining them row by row)
+    await conn.execute("CREATE INDEX ON bench_flat.messages(chat_id, created_at, id)")
+    await conn.execute("INSERT INTO bench_part.messages SELECT * FROM bench_flat.messages")
+    await conn.execute("CREATE INDEX ON bench_part.messages(chat_id, created_at, id)")
+    await conn.execute("VACUUM ANALYZE bench_flat.messages")
+    await conn.execute("VACUUM ANALYZE bench_part.messages")
+    return chat_ids
+
+
+async def archive(conn, months, retention_months):
+    """
+    Detaches partitions older than the retention window (the archival job
+    folds them into message_archive; for the hot path only detaching matters).
+    """
+    rows = await conn.fetch(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bench_part.messages'::regclass AND c.relname ~ '^messages_m[0-9]+$'
+          AND substr(c.relname, 11)::int < $1
+        """,
+        months - retention_months,
+    )
+    for r in rows:
+        await conn.execute(f"ALTER TABLE bench_part.messages DETACH PARTITION bench_part.{r['relname']}")
+    return len(rows)
+
+
+async def index_size(conn, schema):
+    return await conn.fetchval(
+        """
+        SELECT COALESCE(sum(pg_relation_size(i.indexrelid)), 0)
+        FROM pg_index i JOIN pg_class t ON t.oid = i.indrelid JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = $1 AND t.relname LIKE 'messages%'
+          AND (t.relname = 'messages' OR t.oid IN (SELECT inhrelid FROM pg_inherits
+                                                   WHERE inhparent = ($1 || '.messages')::regclass))
+        """,
+        schema,
+    )
+
+
+async def measure(dsn, schema, chat_ids, iterations):
+    # own connection per layout: asyncpg caches prepared statements by SQL text
+    conn = await asyncpg.connect(dsn=dsn, server_settings={"search_path": f"{schema}, public"})
+    try:
+        results = {}
+        rng = random.Random(0)
+        for name, sql in QUERIES.items():
+            for _ in range(20):  # warm up
+                await conn.execute(sql, rng.choice(chat_ids)) if name == "append" else await conn.fetch(sql, rng.choice(chat_ids))
+            latencies = []
+            for _ in range(iterations):
+                chat_id = rng.choice(chat_ids)
+                start = time.perf_counter()
+                if name == "append":
+                    await conn.execute(sql, chat_id)
+                else:
+                    await conn.fetch(sql, chat_id)
+                latencies.append(time.perf_counter() - start)
+            results[name] = latencies
+        return results
+    finally:
+        await conn.close()
+
+
+def report(label, results, size):
+    parts = "  ".join(
+        f"{name} p50={percentile(lat, 50) * 1000:.2f}ms p99={percentile(lat, 99) * 1000:.2f}ms"
+        for name, lat in results.items()
+    )
+    print(f"{label:<12} index={size / 2**20:8.1f}MB  {parts}")
+
+
+async def main(args):
+    dsn = os.environ["DATABASE_URL"]
+    conn = await asyncpg.connect(dsn=dsn)
+    try:
+        chat_ids = await seed(conn, args, [uuid.uuid4() for _ in range(args.chats)])
+        print(f"{args.rows} rows, {len(chat_ids)} chats, {args.months} months")
+        report("flat", await measure(dsn, "bench_flat", chat_ids, args.iterations), await index_size(conn, "bench_flat"))
+        report("partitioned", await measure(dsn, "bench_part", chat_ids, args.iterations), await index_size(conn, "bench_part"))
+        detached = await archive(conn, args.months, args.retention_months)
+        print(f"detached {detached} partitions older than {args.retention_months} months")
+        report("archived", await measure(dsn, "bench_part", chat_ids, args.iterations), await index_size(conn, "bench_part"))
+        if not args.keep:
+            await conn.execute("DROP SCHEMA bench_flat CASCADE; DROP SCHEMA bench_part CASCADE")
+        elif detached:
+            print("note: --keep leaves bench_part with old partitions detached; drop the schemas to reseed")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000000)
+    parser.add_argument("--chats", type=int, default=100000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--retention-months", type=int, default=12)
+    parser.add_argument("--batch", type=int, default=1000000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded schemas for the next run")
+    args = parser.parse_args()
+    asyncio.run(main(args))
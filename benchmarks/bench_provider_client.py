@@ -0,0 +1,78 @@
+# benchmarks/bench_provider_client.py
+"""
+Compare a fresh httpx.AsyncClient per call (old behaviour) against the shared
+pooled client in app/providers.py, both hitting the local mock provider.
+
+    python -m benchmarks.bench_provider_client --calls 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from .mock_provider import MockProviderServer, create_mock_app
+
+MESSAGES = [{"role": "system", "content": "You are terse."}, {"role": "user", "content": "ping"}]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    k = max(0, min(len(samples) - 1, int(round(p / 100.0 * len(samples))) - 1))
+    return samples[k]
+
+
+async def per_call_client(url: str):
+    # what call_openai used to do on every message
+    async with httpx.AsyncClient() as client:
+        r = await client.post(url, json={"model": "gpt-4o-mini", "messages": MESSAGES}, timeout=30)
+    r.raise_for_status()
+
+
+async def run(label: str, fn, calls: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<16} calls={calls} p50={percentile(latencies, 50) * 1000:.2f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.2f}ms mean={statistics.mean(latencies) * 1000:.2f}ms "
+        f"throughput={calls / elapsed:.0f}/s"
+    )
+
+
+async def main(args):
+    from app import providers
+
+    url = providers.OPENAI_URL
+    await run("per-call client", lambda: per_call_client(url), args.calls, args.concurrency)
+    await providers.init_provider_clients()
+    try:
+        await run("shared client", lambda: providers.call_openai("gpt-4o-mini", MESSAGES), args.calls, args.concurrency)
+    finally:
+        await providers.close_provider_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with MockProviderServer(create_mock_app(args.latency_ms), port=args.port) as server:
+        # must be set before app.providers is imported (URLs are read at import time)
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+        asyncio.run(main(args))
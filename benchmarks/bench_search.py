@@ -0,0 +1,137 @@
+# benchmarks/bench_search.py
+"""
+Message search on a seeded multi-million-row messages table: query plans
+(EXPLAIN ANALYZE, checking the GIN indexes of migration 008 are used) and
+latency of crud.search_messages for full-text, fuzzy and per-chat queries,
+including later keyset pages. --baseline adds an unindexed on-the-fly
+to_tsvector scan for comparison.
+
+Seeding is done server-side (generate_series), in batches. Seeded chats are
+titled "bench-search ..." and are reused by later runs with --keep.
+
+Needs a local Postgres with migrations applied:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_search --messages 2000000 --keep
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import asyncpg
+
+from app import crud
+from .bench_provider_client import percentile
+
+VOCABULARY = (
+    "deploy database index query latency cache provider model prompt token stream replica "
+    "partition backup migration schema rollback timeout retry budget summary export import "
+    "search ranking vector embedding cluster worker queue billing invoice customer refund "
+    "password login session cookie browser mobile android iphone printer network firewall"
+).split()
+RARE_WORD = "kubernetes"  # in ~0.1% of messages
+
+SEED_SQL = """
+INSERT INTO messages (chat_id, role, content, token_count, created_at)
+SELECT c.id,
+       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+       (SELECT string_agg(($2::text[])[1 + floor(random() * array_length($2::text[], 1))::int], ' ')
+        FROM generate_series(1, 12 + g % 50))
+       || CASE WHEN random() < 0.001 THEN ' ' || $3 ELSE '' END,
+       0,
+       now() - make_interval(secs => g)
+FROM generate_series($4::bigint, $5::bigint) g
+JOIN LATERAL (SELECT ($1::uuid[])[1 + (g % array_length($1::uuid[], 1))::int] AS id) c ON true
+"""
+
+QUERIES = [
+    ("fts common word", "latency", None, False),
+    ("fts phrase", '"cache timeout"', None, False),
+    ("fts rare word", RARE_WORD, None, False),
+    ("fuzzy typo", "kubernets", None, True),
+    ("fts in one chat", "replica", "chat", False),
+]
+
+
+async def seed(conn, messages, chats, batch):
+    existing = await conn.fetchval("SELECT count(*) FROM messages m JOIN chats c ON c.id = m.chat_id "
+                                   "WHERE c.title LIKE 'bench-search %'")
+    if existing >= messages:
+        print(f"reusing {existing} seeded messages")
+        return await conn.fetchval("SELECT array_agg(id) FROM chats WHERE title LIKE 'bench-search %'")
+    chat_ids = [r["id"] for r in await conn.fetch(
+        "INSERT INTO chats (title) SELECT 'bench-search ' || g FROM generate_series(1, $1) g RETURNING id", chats
+    )]
+    start = time.perf_counter()
+    for lo in range(1, messages + 1, batch):
+        hi = min(messages, lo + batch - 1)
+        await conn.execute(SEED_SQL, chat_ids, VOCABULARY, RARE_WORD, lo, hi)
+        print(f"  seeded {hi}/{messages} ({hi / (time.perf_counter() - start):.0f} rows/s)", end="\r")
+    print()
+    await conn.execute("ANALYZE messages")
+    return chat_ids
+
+
+async def explain(conn, query, chat_id, fuzzy):
+    sql = crud.SEARCH_SQL[(fuzzy, chat_id is not None)]
+    args = (query, chat_id) if chat_id is not None else (query,)
+    rows = await conn.fetch("EXPLAIN (ANALYZE, BUFFERS) " + sql, *args, None, None, 20)
+    return "\n".join(r[0] for r in rows)
+
+
+async def timed(conn, query, chat_id, fuzzy, iterations, pages):
+    latencies, page_latencies = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rows = await crud.search_messages(conn, query, chat_id, 20, None, fuzzy)
+        latencies.append(time.perf_counter() - start)
+        for _ in range(pages):
+            if len(rows) < 20:
+                break
+            start = time.perf_counter()
+            rows = await crud.search_messages(conn, query, chat_id, 20, (rows[-1]["rank"], rows[-1]["id"]), fuzzy)
+            page_latencies.append(time.perf_counter() - start)
+    return latencies, page_latencies
+
+
+async def main(args):
+    conn = await asyncpg.connect(dsn=os.environ["DATABASE_URL"])
+    try:
+        chat_ids = await seed(conn, args.messages, args.chats, args.batch)
+        total = await conn.fetchval("SELECT count(*) FROM messages")
+        print(f"messages table: {total} rows")
+        for label, query, scope, fuzzy in QUERIES:
+            chat_id = chat_ids[0] if scope == "chat" else None
+            plan = await explain(conn, query, chat_id, fuzzy)
+            indexes = [name for name in ("idx_messages_search_tsv", "idx_messages_content_trgm",
+                                         "idx_messages_chat_created_at_id") if name in plan]
+            first, later = await timed(conn, query, chat_id, fuzzy, args.iterations, args.pages)
+            print(f"{label:<18} q={query!r:<18} indexes={','.join(indexes) or 'NONE (seq scan)'}")
+            print(f"  page 1 p50={percentile(first, 50) * 1000:.2f}ms p99={percentile(first, 99) * 1000:.2f}ms"
+                  + (f" | later pages p50={percentile(later, 50) * 1000:.2f}ms" if later else ""))
+            if args.plans:
+                print("  " + plan.replace("\n", "\n  "))
+        if args.baseline:
+            start = time.perf_counter()
+            await conn.fetchval(
+                "SELECT count(*) FROM messages WHERE to_tsvector('english', content) @@ websearch_to_tsquery('english', $1)",
+                RARE_WORD,
+            )
+            print(f"baseline unindexed to_tsvector scan: {(time.perf_counter() - start) * 1000:.0f}ms")
+        if not args.keep:
+            await conn.execute("DELETE FROM chats WHERE title LIKE 'bench-search %'")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--chats", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=200000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=3, help="keyset pages fetched after the first")
+    parser.add_argument("--plans", action="store_true", help="print the full EXPLAIN ANALYZE output")
+    parser.add_argument("--baseline", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows for the next run")
+    args = parser.parse_args()
+    asyncio.run(main(args))
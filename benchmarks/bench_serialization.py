@@ -0,0 +1,140 @@
+# benchmarks/bench_serialization.py
+"""
+Serialization cost of large listings (no DB needed: rows are synthesized
+with the same columns and value types asyncpg returns for chats and
+messages, including asyncpg's own UUID class).
+
+Compares, per 10k-row response:
+  - stock FastAPI: response_model validation + jsonable_encoder + json.dumps
+  - response_model validation + FastJSONResponse (orjson)
+  - TRUST_DB_ROWS: trusted_rows projection + FastJSONResponse
+and the provider payload encoding (serialize_messages + json vs orjson).
+
+    python -m benchmarks.bench_serialization --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+from uuid import uuid4
+
+import httpx
+from asyncpg.pgproto.pgproto import UUID as PgUUID
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app import providers, serialization
+from app.schemas import ChatOut, MessageOut
+from app.serialization import FastJSONResponse
+from .bench_provider_client import percentile
+
+
+def pg_uuid():
+    # what asyncpg decodes uuid columns to (a uuid.UUID subclass orjson does not take natively)
+    return PgUUID(uuid4().bytes)
+
+
+def make_chats(n):
+    now = datetime.now(timezone.utc)
+    return [
+        {"id": pg_uuid(), "title": f"chat {i}", "model_profile_id": pg_uuid(),
+         "created_at": now - timedelta(minutes=i), "updated_at": now - timedelta(seconds=i)}
+        for i in range(n)
+    ]
+
+
+def make_messages(n):
+    now = datetime.now(timezone.utc)
+    chat_id = pg_uuid()
+    return [
+        {"id": pg_uuid(), "chat_id": chat_id, "role": "user" if i % 2 else "assistant",
+         "content": "lorem ipsum dolor sit amet " * 8, "token_count": 48,
+         "created_at": now + timedelta(milliseconds=i)}
+        for i in range(n)
+    ]
+
+
+def build_app(chats, messages):
+    app = FastAPI()
+
+    @app.get("/stock/chats", response_model=List[ChatOut], response_class=JSONResponse)
+    async def stock_chats():
+        return chats
+
+    @app.get("/validated/chats", response_model=List[ChatOut], response_class=FastJSONResponse)
+    async def validated_chats():
+        return chats
+
+    @app.get("/trusted/chats")
+    async def trusted_chats():
+        return FastJSONResponse(serialization.trusted_rows(chats, ChatOut))
+
+    @app.get("/stock/messages", response_model=List[MessageOut], response_class=JSONResponse)
+    async def stock_messages():
+        return messages
+
+    @app.get("/trusted/messages")
+    async def trusted_messages():
+        return FastJSONResponse(serialization.trusted_rows(messages, MessageOut))
+
+    return app
+
+
+async def http_round(app, paths, repeat):
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        bodies = {}
+        for path in paths:
+            r = await client.get(path)  # warm up, and check the bodies agree
+            bodies[path] = r.json()
+        for _ in range(repeat):
+            for path in paths:  # interleave to reduce drift
+                start = time.perf_counter()
+                await client.get(path)
+                results.setdefault(path, []).append(time.perf_counter() - start)
+    return results, bodies
+
+
+def provider_payload(n, repeat):
+    msgs = [{"role": m["role"], "content": m["content"], "created_at": m["created_at"]} for m in make_messages(n)]
+    payload = lambda m: {"model": "gpt-4o-mini", "messages": m, "temperature": 0.7}
+    for label, fn in (
+        ("serialize_messages + json.dumps", lambda: json.dumps(payload(providers.serialize_messages(msgs))).encode()),
+        ("serialization.dumps (orjson)", lambda: serialization.dumps(payload(msgs))),
+    ):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        print(f"  {label:<34} p50={percentile(samples, 50) * 1e3:7.2f}ms")
+
+
+async def main(args):
+    chats, messages = make_chats(args.rows), make_messages(args.rows)
+    app = build_app(chats, messages)
+    paths = ["/stock/chats", "/validated/chats", "/trusted/chats", "/stock/messages", "/trusted/messages"]
+    results, bodies = await http_round(app, paths, args.repeat)
+    assert bodies["/stock/chats"] == bodies["/validated/chats"] == bodies["/trusted/chats"]
+    assert bodies["/stock/messages"] == bodies["/trusted/messages"]
+    print(f"{args.rows}-row listing, in-process ({args.repeat} requests each):")
+    for path in paths:
+        samples = results[path]
+        print(f"  {path:<34} p50={percentile(samples, 50) * 1e3:7.2f}ms p99={percentile(samples, 99) * 1e3:7.2f}ms")
+    for kind in ("chats", "messages"):
+        stock, trusted = percentile(results[f"/stock/{kind}"], 50), percentile(results[f"/trusted/{kind}"], 50)
+        print(f"  {kind}: trusted is {stock / trusted:.1f}x faster than stock at p50")
+    print(f"provider payload ({args.payload_messages} messages):")
+    provider_payload(args.payload_messages, args.repeat * 10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--payload-messages", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,146 @@
+# benchmarks/bench_startup.py
+"""
+Startup cost of the API:
+
+  import         time to `import app.main` in a fresh interpreter (median of
+                 --imports runs), plus the slowest modules from -X importtime
+  time-to-ready  spawn the server, poll until /health/live and /health/ready
+                 answer 200 (and, with several workers, until every worker
+                 pid has reported ready), then SIGTERM and time the exit
+                 (with DRAIN_DELAY_S=0 unless it is set in the environment)
+
+Servers compared: `serve` (python -m app.serve, uvloop + httptools, the
+given --workers) and `uvicorn` (plain `uvicorn app.main:app`, one worker,
+default settings).
+
+Needs a local Postgres with migrations applied (the lifespan connects):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_startup --workers 4 --runs 3
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def import_times(n):
+    return [float(subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], text=True).split()[-1])
+            for _ in range(n)]
+
+
+def slowest_imports(top):
+    """
+    (cumulative us, module) from python -X importtime, slowest first.
+    """
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def command(server, port, workers):
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    return [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+
+
+def poll(url, timeout):
+    """
+    New connection per attempt, so with several workers any of them may answer.
+    """
+    try:
+        return httpx.get(url, timeout=timeout)
+    except httpx.TransportError:
+        return None
+
+
+def time_to_ready(server, workers, deadline_s):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    # the drain delay is a fixed wait for the load balancer; SIGTERM->exit measures the rest unless it is set
+    env = {**os.environ, "DRAIN_DELAY_S": os.environ.get("DRAIN_DELAY_S", "0")}
+    proc = subprocess.Popen(command(server, port, workers), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env=env)
+    result = {"live": None, "ready": None, "all_ready": None, "stop": None}
+    pids = set()
+    try:
+        while time.perf_counter() - start < deadline_s and proc.poll() is None:
+            if result["live"] is None:
+                r = poll(f"{base}/health/live", 1.0)
+                if r is not None and r.status_code == 200:
+                    result["live"] = time.perf_counter() - start
+            r = poll(f"{base}/health/ready", 1.0)
+            if r is not None and r.status_code == 200:
+                result["ready"] = result["ready"] or time.perf_counter() - start
+                pids.add(r.json()["pid"])
+                if len(pids) >= workers:
+                    result["all_ready"] = time.perf_counter() - start
+                    break
+            time.sleep(0.01)
+    finally:
+        stop = time.perf_counter()
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=60)
+            result["stop"] = time.perf_counter() - stop
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return result
+
+
+def fmt(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "     n/a"
+    return f"{statistics.median(values) * 1000:7.0f}ms"
+
+
+def main(args):
+    if "DATABASE_URL" not in os.environ:
+        sys.exit("DATABASE_URL is required (the lifespan connects to Postgres)")
+    times = import_times(args.imports)
+    print(f"import app.main   median={statistics.median(times) * 1000:.0f}ms  min={min(times) * 1000:.0f}ms  "
+          f"({args.imports} fresh interpreters)")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    for server in args.servers:
+        workers = 1 if server == "uvicorn" else args.workers
+        runs = [time_to_ready(server, workers, args.timeout) for _ in range(args.runs)]
+        print(f"{server:<8} workers={workers:<3} live={fmt([r['live'] for r in runs])}  "
+              f"ready={fmt([r['ready'] for r in runs])}  all ready={fmt([r['all_ready'] for r in runs])}  "
+              f"SIGTERM->exit={fmt([r['stop'] for r in runs])}")
+        if any(r["all_ready"] is None for r in runs):
+            print(f"  {sum(r['all_ready'] is None for r in runs)}/{len(runs)} runs did not get every worker ready "
+                  f"within {args.timeout:.0f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--servers", nargs="+", choices=["serve", "uvicorn"], default=["serve", "uvicorn"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--imports", type=int, default=5, help="fresh interpreters for the import timing")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list from -X importtime")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness per run")
+    args = parser.parse_args()
+    main(args)
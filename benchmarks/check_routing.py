@@ -0,0 +1,114 @@
+# benchmarks/check_routing.py
+"""
+Exercises app/routing.py against two local mock providers: the profile's
+primary (OpenAI format) and its fallback (Anthropic format).
+
+  1) failover: the primary answers 500 -> calls are served by the fallback,
+     and once the breaker opens the primary is no longer called
+  2) hedging: the primary has a long-tailed latency -> p50/p99 with and
+     without hedge, and no upstream call is left running afterwards
+
+    python -m benchmarks.check_routing --calls 300 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from .bench_provider_client import percentile
+from .mock_provider import MockProviderServer, MockSettings, create_mock_app
+
+
+def prompt(text):
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": text}]
+
+
+async def timed_calls(routing, profile, n, concurrency, tag):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            start = time.perf_counter()
+            await routing.call_model(profile, prompt(f"{tag}-{i}"))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies
+
+
+def reset_limits():
+    """
+    Fresh limiters with no RPM/TPM budget, so a run neither waits on nor
+    sheds because of the tokens the previous run spent (hedging sends extra calls).
+    """
+    from app import limits
+    from app.routers.providers import PROVIDER_LIMITS
+
+    for provider_limits in PROVIDER_LIMITS.values():
+        provider_limits["requests_per_min"] = provider_limits["tokens_per_min"] = 0
+    limits._limiters.clear()
+
+
+async def main(args, primary, fallback):
+    from app import providers, routing
+
+    profile = {"provider": "openai", "base_model": "gpt-4o-mini",
+               "fallbacks": ["anthropic:claude-instant-1"], "hedge": False}
+    await providers.init_provider_clients()
+    try:
+        # 1) failover + breaker
+        reset_limits()
+        primary.state.settings = MockSettings(latency_ms=20, error_rate=1.0, seed=args.seed)
+        primary.state.hits = fallback.state.hits = 0
+        for i in range(routing.BREAKER_FAILURES + 10):
+            await routing.call_model(profile, prompt(f"failover-{i}"))
+        state = routing.stats()["targets"]["openai:gpt-4o-mini"]["breaker"]
+        assert primary.state.hits == routing.BREAKER_FAILURES and state == "open", (primary.state.hits, state)
+        print(f"failover: {routing.BREAKER_FAILURES + 10} calls served, primary hits={primary.state.hits} "
+              f"(breaker {state}), fallback hits={fallback.state.hits}")
+
+        # 2) hedging on a long-tailed primary
+        routing._breakers.clear()
+        routing._latency.clear()
+        primary.state.settings = MockSettings(latency_ms=args.latency_ms, latency_dist="lognormal", jitter=args.jitter, seed=args.seed)
+        fallback.state.settings = MockSettings(latency_ms=args.latency_ms, latency_dist="lognormal", jitter=args.jitter, seed=args.seed + 1)
+        results = {}
+        for hedge in (False, True):
+            profile["hedge"] = hedge
+            reset_limits()
+            before = dict(routing.stats())
+            results[hedge] = await timed_calls(routing, profile, args.calls, args.concurrency, f"hedge{hedge}")
+            after = routing.stats()
+            print(f"hedge={'on ' if hedge else 'off'} p50={percentile(results[hedge], 50) * 1000:7.1f}ms "
+                  f"p99={percentile(results[hedge], 99) * 1000:7.1f}ms "
+                  f"hedges={after['hedges'] - before['hedges']} hedge_wins={after['hedge_wins'] - before['hedge_wins']}")
+        await asyncio.sleep(0.05)
+        assert not providers._inflight, providers._inflight
+        print("losing calls cancelled: no upstream call left in flight")
+        p99_off, p99_on = percentile(results[False], 99), percentile(results[True], 99)
+        print(f"p99 {p99_off * 1000:.1f}ms -> {p99_on * 1000:.1f}ms ({(p99_on / p99_off - 1) * 100:+.1f}%)")
+    finally:
+        await providers.close_provider_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900, help="primary mock; the fallback uses port + 1")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median latency of both mocks")
+    parser.add_argument("--jitter", type=float, default=0.8, help="lognormal sigma (tail heaviness)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    primary_app, fallback_app = create_mock_app(), create_mock_app()
+    with MockProviderServer(primary_app, port=args.port) as primary, \
+            MockProviderServer(fallback_app, port=args.port + 1) as fallback:
+        os.environ["OPENAI_BASE_URL"] = primary.base_url
+        os.environ["ANTHROPIC_BASE_URL"] = fallback.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+        os.environ.setdefault("ANTHROPIC_API_KEY", "mock-key")
+        os.environ.setdefault("BREAKER_COOLDOWN", "600")
+        os.environ.setdefault("PROVIDER_MAX_RETRIES", "0")
+        asyncio.run(main(args, primary_app, fallback_app))
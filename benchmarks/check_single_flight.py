@@ -0,0 +1,65 @@
+# benchmarks/check_single_flight.py
+"""
+Counts upstream hits on the local mock provider for request coalescing in
+providers.call_model, over real HTTP. The behaviour itself (sharing, waiter
+cancellation, errors) is tested in tests/test_single_flight.py.
+
+    python -m benchmarks.check_single_flight
+"""
+import argparse
+import asyncio
+import os
+
+from .mock_provider import MockProviderServer, create_mock_app
+
+
+def prompt(text):
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": text}]
+
+
+async def main(mock):
+    from app import providers
+
+    await providers.init_provider_clients()
+    try:
+        # 1) identical concurrent calls -> one upstream request
+        mock.state.hits = 0
+        replies = await asyncio.gather(*(providers.call_model("openai", "gpt-4o-mini", prompt("same")) for _ in range(50)))
+        print(f"50 identical calls   -> upstream hits={mock.state.hits}, distinct replies={len(set(replies))}")
+
+        # 2) distinct prompts are not merged
+        mock.state.hits = 0
+        await asyncio.gather(*(providers.call_model("openai", "gpt-4o-mini", prompt(f"p{i}")) for i in range(10)))
+        print(f"10 distinct calls    -> upstream hits={mock.state.hits}")
+
+        # 3) one waiter disconnects; the others still get the reply
+        mock.state.hits = 0
+        waiters = [asyncio.create_task(providers.call_model("openai", "gpt-4o-mini", prompt("cancel-one"))) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        served = sum(isinstance(r, str) for r in results)
+        print(f"1 of 3 waiters gone  -> {served} served, upstream hits={mock.state.hits}")
+
+        # 4) every waiter gone -> upstream call is cancelled and the key is released
+        waiters = [asyncio.create_task(providers.call_model("openai", "gpt-4o-mini", prompt("cancel-all"))) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        print(f"all waiters gone     -> in-flight entries left={len(providers._inflight)}")
+    finally:
+        await providers.close_provider_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(args.latency_ms)
+    with MockProviderServer(mock_app, port=args.port) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+        asyncio.run(main(mock_app))
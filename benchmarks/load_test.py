@@ -0,0 +1,179 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test: drives create_app() in-process (httpx ASGI transport)
+through the full chat flow against the local mock provider and reports
+throughput, p50/p95/p99 latency per operation and DB pool acquire wait.
+Results are written as JSON so runs can be compared between commits.
+
+Needs a local Postgres with migrations applied:
+    DATABASE_URL=postgresql://... python -m benchmarks.load_test --users 50 --duration 30 \\
+        --latency-ms 800 --latency-dist lognormal --out bench_results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.load_test --compare bench_results/old.json bench_results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from .bench_provider_client import percentile
+from .mock_provider import MockProviderServer, add_mock_arguments, create_mock_app, settings_from_args
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def timed(self, op, coro):
+        start = time.perf_counter()
+        try:
+            r = await coro
+        except Exception:
+            self.errors[op] = self.errors.get(op, 0) + 1
+            return None
+        self.samples.setdefault(op, []).append(time.perf_counter() - start)
+        if r.status_code >= 400:
+            self.errors[op] = self.errors.get(op, 0) + 1
+        return r
+
+    def summary(self, elapsed):
+        out = {}
+        for op, samples in sorted(self.samples.items()):
+            out[op] = {
+                "count": len(samples),
+                "errors": self.errors.get(op, 0),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        return out
+
+
+async def user(client, rec, profile_id, deadline, stream_ratio, idx):
+    r = await rec.timed("create_chat", client.post("/chats/", json={"title": f"load {idx}", "model_profile_id": profile_id}))
+    if r is None or r.status_code != 200:
+        return
+    chat_id = r.json()["id"]
+    turn = 0
+    while time.perf_counter() < deadline:
+        turn += 1
+        if stream_ratio and (turn * stream_ratio) % 1 < stream_ratio:
+            await rec.timed("post_message_stream", client.post(f"/chats/{chat_id}/messages/stream", json={"content": f"turn {turn}"}))
+        else:
+            await rec.timed("post_message", client.post(f"/chats/{chat_id}/messages", json={"content": f"turn {turn}"}))
+        await rec.timed("list_messages", client.get(f"/chats/{chat_id}/messages", params={"limit": 50}))
+        if turn % 5 == 0:
+            await rec.timed("list_chats", client.get("/chats/", params={"limit": 20}))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def run(args, mock_app):
+    from app.main import create_app
+    from app.db import init_db_pool, close_db_pool
+    from app.providers import init_provider_clients, close_provider_clients
+
+    app = create_app()
+    await init_db_pool(app)
+    await init_provider_clients()
+    rec = Recorder()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            profile = (await client.post("/model-profiles/", json={
+                "name": "load-test", "provider": args.provider, "base_model": args.model, "system_prompt": "Be brief.",
+            })).json()
+            deadline = time.perf_counter() + args.duration
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                user(client, rec, profile["id"], deadline, args.stream_ratio, i) for i in range(args.users)
+            ))
+            elapsed = time.perf_counter() - started
+            await client.delete(f"/model-profiles/{profile['id']}")
+        pool_stats = app.state.db_pool.stats()
+        read_pool_stats = {p.name: p.stats() for p in getattr(app.state, "db_read_pools", ())}
+    finally:
+        await close_provider_clients()
+        await close_db_pool(app)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "elapsed_s": round(elapsed, 3),
+        "operations": rec.summary(elapsed),
+        "db_pool": pool_stats,
+        "db_read_pools": read_pool_stats,
+        "mock_provider": {"hits": mock_app.state.hits, "status_counts": mock_app.state.status_counts},
+    }
+
+
+def print_results(results):
+    print(f"commit={results['commit']} elapsed={results['elapsed_s']}s users={results['config']['users']}")
+    for op, s in results["operations"].items():
+        print(f"  {op:<20} n={s['count']:<6} err={s['errors']:<4} {s['throughput_rps']:>8.1f}/s "
+              f"p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms")
+    pool = results["db_pool"]
+    print(f"  db pool: acquires={pool['acquires']} wait mean={pool['acquire_wait_mean_s'] * 1000:.2f}ms "
+          f"max={pool['acquire_wait_max_s'] * 1000:.2f}ms")
+    for name, pool in results.get("db_read_pools", {}).items():
+        print(f"  {name}: acquires={pool['acquires']} wait mean={pool['acquire_wait_mean_s'] * 1000:.2f}ms "
+              f"max={pool['acquire_wait_max_s'] * 1000:.2f}ms saturated={pool['saturated_acquires']}")
+
+
+def compare(old_path, new_path):
+    old, new = (json.load(open(p)) for p in (old_path, new_path))
+    print(f"{old['commit']} -> {new['commit']}")
+    for op in sorted(set(old["operations"]) | set(new["operations"])):
+        a, b = old["operations"].get(op), new["operations"].get(op)
+        if not a or not b:
+            continue
+        deltas = " ".join(
+            f"{k}={a[k]}->{b[k]} ({(b[k] - a[k]) / a[k] * 100 if a[k] else 0:+.1f}%)"
+            for k in ("throughput_rps", "p50_ms", "p99_ms")
+        )
+        print(f"  {op:<20} {deltas}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--stream-ratio", type=float, default=0.0, help="fraction of messages sent via /stream")
+    parser.add_argument("--provider", default="openai", choices=["openai", "anthropic"])
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        mock_app = create_mock_app(settings=settings_from_args(args))
+        with MockProviderServer(mock_app, port=args.mock_port) as server:
+            # provider URLs/keys are read when app.providers is imported
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+            os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+            os.environ.setdefault("ANTHROPIC_API_KEY", "mock-key")
+            results = asyncio.run(run(args, mock_app))
+        print_results(results)
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"wrote {args.out}")
@@ -0,0 +1,78 @@
+# benchmarks/load_test_pool.py
+"""
+Shows that CRUD endpoints keep serving while many slow provider calls are in
+flight. Fires more concurrent chat messages than the DB pool has connections
+(against a mock provider with high latency) and measures GET latencies meanwhile.
+
+Needs a local Postgres with migrations applied:
+    DATABASE_URL=postgresql://... python -m benchmarks.load_test_pool --slow-calls 30 --latency-ms 3000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from .bench_provider_client import percentile
+from .mock_provider import MockProviderServer, create_mock_app
+
+
+async def main(args):
+    from app.main import app
+    from app.db import init_db_pool, close_db_pool
+    from app.providers import init_provider_clients, close_provider_clients
+
+    await init_db_pool(app)
+    await init_provider_clients()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            profile = (await client.post("/model-profiles/", json={
+                "name": "load-test", "provider": "openai", "base_model": "gpt-4o-mini", "system_prompt": "Be brief.",
+            })).json()
+            chat = (await client.post("/chats/", json={"title": "load-test", "model_profile_id": profile["id"]})).json()
+
+            slow = [
+                asyncio.create_task(client.post(f"/chats/{chat['id']}/messages", json={"content": f"hello {i}"}))
+                for i in range(args.slow_calls)
+            ]
+            await asyncio.sleep(0.2)  # let the slow calls reach the provider
+
+            latencies = {"/health": [], "/chats/": [], "/model-profiles/": []}
+            errors = 0
+            deadline = time.perf_counter() + args.latency_ms / 1000.0 * 0.8
+            while time.perf_counter() < deadline:
+                for path, samples in latencies.items():
+                    start = time.perf_counter()
+                    r = await client.get(path)
+                    samples.append(time.perf_counter() - start)
+                    errors += r.status_code != 200
+
+            results = await asyncio.gather(*slow)
+            slow_ok = sum(r.status_code == 200 for r in results)
+
+            print(f"slow provider calls: {args.slow_calls} (ok={slow_ok}), provider latency {args.latency_ms:.0f}ms, "
+                  f"DB_POOL_MAX={os.getenv('DB_POOL_MAX', '10')}")
+            for path, samples in latencies.items():
+                print(f"  GET {path:<18} n={len(samples):<5} p50={percentile(samples, 50) * 1000:.2f}ms "
+                      f"p99={percentile(samples, 99) * 1000:.2f}ms")
+            print(f"  CRUD errors: {errors}")
+
+            await client.delete(f"/model-profiles/{profile['id']}")
+    finally:
+        await close_provider_clients()
+        await close_db_pool(app)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slow-calls", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=3000.0)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    with MockProviderServer(create_mock_app(args.latency_ms), port=args.port) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+        asyncio.run(main(args))
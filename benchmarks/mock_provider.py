@@ -0,0 +1,195 @@
+# benchmarks/mock_provider.py
+"""
+Local stand-in for the OpenAI / Anthropic REST endpoints used by app/providers.py.
+Point the app at it with OPENAI_BASE_URL / ANTHROPIC_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Speaks both wire formats (incl. streaming SSE when the request has "stream": true) and can
+simulate realistic latency distributions, error rates, 429s and rate-limit headers.
+
+Run standalone:
+    python -m benchmarks.mock_provider --mock-port 8900 --latency-ms 800 --latency-dist lognormal --rate-429 0.02
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+REPLY = "This is a mock reply from the local provider stand-in used for benchmarks."
+
+
+class MockSettings:
+    def __init__(self, latency_ms: float = 0.0, latency_dist: str = "fixed", jitter: float = 0.5,
+                 token_delay_ms: float = 0.0, error_rate: float = 0.0, rate_429: float = 0.0,
+                 retry_after_s: float = 1.0, seed=None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.jitter = jitter  # spread: +-fraction for uniform, sigma for lognormal
+        self.token_delay_ms = token_delay_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after_s = retry_after_s
+        self.rng = random.Random(seed)
+
+    def latency_s(self) -> float:
+        mean = self.latency_ms / 1000.0
+        if mean <= 0:
+            return 0.0
+        if self.latency_dist == "uniform":
+            return self.rng.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter))
+        if self.latency_dist == "exponential":
+            return self.rng.expovariate(1.0 / mean)
+        if self.latency_dist == "lognormal":
+            # latency_ms is the median; long right tail like real providers
+            return self.rng.lognormvariate(math.log(mean), self.jitter)
+        return mean
+
+
+def create_mock_app(latency_ms: float = 0.0, settings: MockSettings = None) -> FastAPI:
+    app = FastAPI(title="mock-provider")
+    app.state.settings = settings or MockSettings(latency_ms=latency_ms)
+    app.state.hits = 0
+    app.state.status_counts = {}
+
+    def count(status: int):
+        app.state.status_counts[status] = app.state.status_counts.get(status, 0) + 1
+
+    def ratelimit_headers() -> dict:
+        return {
+            "x-ratelimit-remaining-requests": "1000",
+            "x-ratelimit-remaining-tokens": "1000000",
+            "x-ratelimit-reset-requests": "1s",
+            "x-ratelimit-reset-tokens": "1s",
+        }
+
+    async def failure():
+        """Simulated 429 / 500, or None to answer normally."""
+        s = app.state.settings
+        roll = s.rng.random()
+        if roll < s.rate_429:
+            count(429)
+            return JSONResponse(
+                {"error": {"type": "rate_limit_error", "message": "mock rate limit"}},
+                status_code=429,
+                headers={"retry-after": str(s.retry_after_s), **ratelimit_headers(), "x-ratelimit-remaining-requests": "0"},
+            )
+        if roll < s.rate_429 + s.error_rate:
+            await asyncio.sleep(s.latency_s())
+            count(500)
+            return JSONResponse({"error": {"type": "server_error", "message": "mock failure"}}, status_code=500)
+        return None
+
+    async def tokens():
+        s = app.state.settings
+        for i, word in enumerate(REPLY.split(" ")):
+            if s.token_delay_ms:
+                await asyncio.sleep(s.token_delay_ms / 1000.0)
+            yield word if i == 0 else " " + word
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.hits += 1
+        failed = await failure()
+        if failed is not None:
+            return failed
+        await asyncio.sleep(app.state.settings.latency_s())
+        count(200)
+        model = body.get("model")
+        if body.get("stream"):
+            async def sse():
+                async for token in tokens():
+                    chunk = {"object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(sse(), media_type="text/event-stream", headers=ratelimit_headers())
+        return JSONResponse({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": sum(len(m["content"]) for m in body.get("messages", [])) // 4,
+                      "completion_tokens": len(REPLY) // 4, "total_tokens": 0},
+        }, headers=ratelimit_headers())
+
+    @app.post("/v1/complete")
+    async def complete(request: Request):
+        body = await request.json()
+        app.state.hits += 1
+        failed = await failure()
+        if failed is not None:
+            return failed
+        await asyncio.sleep(app.state.settings.latency_s())
+        count(200)
+        model = body.get("model")
+        if body.get("stream"):
+            async def sse():
+                async for token in tokens():
+                    yield f"event: completion\ndata: {json.dumps({'type': 'completion', 'completion': token, 'model': model})}\n\n"
+                yield f"event: completion\ndata: {json.dumps({'type': 'completion', 'completion': '', 'stop_reason': 'stop_sequence'})}\n\n"
+            return StreamingResponse(sse(), media_type="text/event-stream")
+        return {"completion": " " + REPLY, "stop_reason": "stop_sequence", "model": model}
+
+    return app
+
+
+class MockProviderServer:
+    """Runs the mock app with uvicorn on a background thread (for benchmarks)."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 8900):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--mock-port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean (median for lognormal) provider latency")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, jitter=args.jitter,
+        token_delay_ms=args.token_delay_ms, error_rate=args.error_rate, rate_429=args.rate_429,
+        retry_after_s=args.retry_after, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_mock_app(settings=settings_from_args(args)), host=args.host, port=args.mock_port, log_level="warning")
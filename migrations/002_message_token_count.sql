@@ -0,0 +1,12 @@
+-- migrations/002_message_token_count.sql
+-- Per-message token counts for CONTEXT_MODE=tokens (app/tokens.py).
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS token_count INTEGER;
+
+-- backfill existing rows with the same ~4 chars/token estimate the app falls back to (+4 per-message overhead)
+UPDATE messages SET token_count = (length(content) + 3) / 4 + 4 WHERE token_count IS NULL;
+
+ALTER TABLE messages ALTER COLUMN token_count SET DEFAULT 0;
+ALTER TABLE messages ALTER COLUMN token_count SET NOT NULL;
+
+
+-- New rows get token_count from the app at insert time, so context selection is a cumulative sum over stored counts instead of re-tokenizing history.
@@ -0,0 +1,8 @@
+-- migrations/003_pagination_indexes.sql
+-- Keyset pagination indexes: GET /chats/ on (updated_at, id), GET /chats/{id}/messages on (chat_id, created_at, id).
+CREATE INDEX IF NOT EXISTS idx_chats_updated_at_id ON chats(updated_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created_at_id ON messages(chat_id, created_at, id);
+
+-- the new messages index covers (chat_id, created_at) scans in both directions, so the old one is redundant write cost
+DROP INDEX IF EXISTS idx_messages_chat_created_at;
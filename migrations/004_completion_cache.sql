@@ -0,0 +1,16 @@
+-- migrations/004_completion_cache.sql
+-- Opt-in completion cache (app/completion_cache.py).
+ALTER TABLE model_profiles ADD COLUMN IF NOT EXISTS response_cache BOOLEAN NOT NULL DEFAULT false;
+
+-- optional Postgres tier (COMPLETION_CACHE_DB=true); key = sha256 of provider, model, temperature and messages
+CREATE TABLE IF NOT EXISTS completion_cache (
+  key TEXT PRIMARY KEY,
+  provider TEXT NOT NULL,
+  model TEXT NOT NULL,
+  response TEXT NOT NULL,
+  latency_ms INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_completion_cache_expires_at ON completion_cache(expires_at);
@@ -0,0 +1,23 @@
+-- migrations/005_message_jobs.sql
+-- Async message jobs: POST /chats/{chat_id}/messages/jobs queues a completion, workers (python -m app.worker) run it.
+CREATE TABLE IF NOT EXISTS message_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  chat_id UUID REFERENCES chats(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'queued', -- 'queued' | 'running' | 'done' | 'failed'
+  provider TEXT NOT NULL,
+  model TEXT NOT NULL,
+  response_cache BOOLEAN NOT NULL DEFAULT false,
+  messages JSONB NOT NULL, -- provider messages (system prompt + context) built at submit time
+  attempts INTEGER NOT NULL DEFAULT 0,
+  result TEXT,
+  error TEXT,
+  assistant_message_id UUID,
+  locked_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- workers claim the oldest queued job with FOR UPDATE SKIP LOCKED; keep that scan tiny
+CREATE INDEX IF NOT EXISTS idx_message_jobs_queued ON message_jobs(created_at) WHERE status = 'queued';
+-- reclaiming jobs whose worker died
+CREATE INDEX IF NOT EXISTS idx_message_jobs_running ON message_jobs(locked_at) WHERE status = 'running';
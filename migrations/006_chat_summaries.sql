@@ -0,0 +1,12 @@
+-- migrations/006_chat_summaries.sql
+-- Rolling per-chat summary of turns that have fallen out of the context window (app/summaries.py).
+CREATE TABLE IF NOT EXISTS chat_summaries (
+  chat_id UUID PRIMARY KEY REFERENCES chats(id) ON DELETE CASCADE,
+  summary TEXT NOT NULL,
+  covered_until TIMESTAMPTZ NOT NULL, -- created_at of the newest message folded into the summary
+  covered_messages INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+
+-- The summary is only ever extended with turns newer than covered_until, never recomputed from scratch.
@@ -0,0 +1,10 @@
+-- migrations/007_profile_routing.sql
+-- Routing policies per model profile (app/routing.py).
+-- fallbacks: ordered "provider:model" targets tried when the profile's own provider fails or its breaker is open
+-- hedge: start the next target once a call outlives the current target's recent p95, keep the first reply
+ALTER TABLE model_profiles ADD COLUMN IF NOT EXISTS fallbacks TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE model_profiles ADD COLUMN IF NOT EXISTS hedge BOOLEAN NOT NULL DEFAULT false;
+
+-- queued jobs carry the policy of the profile they were submitted with
+ALTER TABLE message_jobs ADD COLUMN IF NOT EXISTS fallbacks TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE message_jobs ADD COLUMN IF NOT EXISTS hedge BOOLEAN NOT NULL DEFAULT false;
@@ -0,0 +1,14 @@
+-- migrations/008_message_search.sql
+-- Message search (GET /chats/search, GET /chats/{chat_id}/messages/search). Needs Postgres 12+ for generated columns.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- full text: kept in sync by Postgres itself; adding it rewrites the table once
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_messages_search_tsv ON messages USING GIN (search_tsv);
+
+-- fuzzy matching (word_similarity, <%) on the raw text
+CREATE INDEX IF NOT EXISTS idx_messages_content_trgm ON messages USING GIN (content gin_trgm_ops);
+
+-- on a large live table, build the indexes with CREATE INDEX CONCURRENTLY outside a transaction instead
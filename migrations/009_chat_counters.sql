@@ -0,0 +1,23 @@
+-- migrations/009_chat_counters.sql
+-- Denormalized per-chat summary columns so GET /chats/ can show counts and previews without joining messages.
+-- Maintained by crud.append_message / append_messages in the same statement that bumps chats.updated_at.
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS total_tokens BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS last_role TEXT;
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS last_message_preview TEXT; -- first 200 chars (crud.LAST_MESSAGE_PREVIEW_CHARS)
+
+-- backfill existing chats (the last message uses the same (created_at, id) order as the pagination index)
+UPDATE chats c
+SET message_count = s.n,
+    total_tokens = s.tokens,
+    last_role = l.role,
+    last_message_preview = left(l.content, 200)
+FROM (
+    SELECT chat_id, count(*) AS n, COALESCE(sum(token_count), 0) AS tokens
+    FROM messages GROUP BY chat_id
+) s
+CROSS JOIN LATERAL (
+    SELECT role, content FROM messages
+    WHERE chat_id = s.chat_id ORDER BY created_at DESC, id DESC LIMIT 1
+) l
+WHERE c.id = s.chat_id;
@@ -0,0 +1,99 @@
+-- migrations/010_partition_messages.sql
+-- Converts messages into monthly range partitions on created_at (UTC months, named messages_pYYYYMM).
+-- New partitions are created ahead of time by ensure_message_partitions() (app startup and python -m app.archive);
+-- rows outside every partition land in messages_default and are moved out when their month's partition is created.
+-- Partitions older than the retention age are folded into message_archive by python -m app.archive.
+-- Needs Postgres 12+. The copy below rewrites the whole table: on a large database run it in a maintenance window.
+BEGIN;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+ALTER INDEX IF EXISTS idx_messages_chat_created_at_id RENAME TO idx_messages_unpartitioned_chat_created_at_id;
+ALTER INDEX IF EXISTS idx_messages_search_tsv RENAME TO idx_messages_unpartitioned_search_tsv;
+ALTER INDEX IF EXISTS idx_messages_content_trgm RENAME TO idx_messages_unpartitioned_content_trgm;
+
+-- the partition key must be part of the primary key; nothing references messages(id) with a foreign key
+CREATE TABLE messages (
+  id UUID NOT NULL DEFAULT gen_random_uuid(),
+  chat_id UUID REFERENCES chats(id) ON DELETE CASCADE,
+  role TEXT NOT NULL, -- 'user' | 'assistant' | 'system'
+  content TEXT NOT NULL,
+  token_count INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  search_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED,
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+
+-- partitioned indexes: every partition gets its own (small) copy
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created_at_id ON messages(chat_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_messages_search_tsv ON messages USING GIN (search_tsv);
+CREATE INDEX IF NOT EXISTS idx_messages_content_trgm ON messages USING GIN (content gin_trgm_ops);
+
+-- Creates the monthly partitions covering [from_ts, to_ts]. Returns how many were created.
+CREATE OR REPLACE FUNCTION ensure_message_partitions(from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  m_start DATE := date_trunc('month', from_ts AT TIME ZONE 'UTC')::date;
+  lo TIMESTAMPTZ;
+  hi TIMESTAMPTZ;
+  part TEXT;
+  created INTEGER := 0;
+BEGIN
+  WHILE m_start <= (to_ts AT TIME ZONE 'UTC')::date LOOP
+    part := 'messages_p' || to_char(m_start, 'YYYYMM');
+    lo := m_start::timestamp AT TIME ZONE 'UTC';
+    hi := (m_start + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+    IF to_regclass(part) IS NULL THEN
+      IF EXISTS (SELECT 1 FROM messages_default WHERE created_at >= lo AND created_at < hi) THEN
+        -- rows already sitting in the default partition must move before the range can be attached
+        EXECUTE format('CREATE TABLE %I (LIKE messages INCLUDING DEFAULTS INCLUDING GENERATED)', part);
+        EXECUTE format('INSERT INTO %I (id, chat_id, role, content, token_count, created_at) '
+                       'SELECT id, chat_id, role, content, token_count, created_at FROM messages_default '
+                       'WHERE created_at >= $1 AND created_at < $2', part) USING lo, hi;
+        DELETE FROM messages_default WHERE created_at >= lo AND created_at < hi;
+        EXECUTE format('ALTER TABLE messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+      ELSE
+        EXECUTE format('CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+      END IF;
+      created := created + 1;
+    END IF;
+    m_start := (m_start + interval '1 month')::date;
+  END LOOP;
+  RETURN created;
+END $$;
+
+SELECT ensure_message_partitions(
+  COALESCE((SELECT min(created_at) FROM messages_unpartitioned), now()), now() + interval '2 months'
+);
+
+INSERT INTO messages (id, chat_id, role, content, token_count, created_at)
+SELECT id, chat_id, role, content, token_count, COALESCE(created_at, now()) FROM messages_unpartitioned;
+
+DROP TABLE messages_unpartitioned;
+
+-- Cold history: one row per chat and archived month, the month's messages as a JSONB array.
+-- Large values are TOAST-compressed (lz4 where the server supports it); move the table to a cheaper
+-- tablespace with ALTER TABLE message_archive SET TABLESPACE ... if needed.
+CREATE TABLE IF NOT EXISTS message_archive (
+  chat_id UUID NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+  period DATE NOT NULL, -- first day of the archived month (UTC)
+  message_count INTEGER NOT NULL,
+  first_created_at TIMESTAMPTZ NOT NULL,
+  last_created_at TIMESTAMPTZ NOT NULL,
+  messages JSONB NOT NULL, -- [{id, role, content, token_count, created_at}] in (created_at, id) order
+  archived_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (chat_id, period)
+);
+
+COMMIT;
+
+DO $$
+BEGIN
+  ALTER TABLE message_archive ALTER COLUMN messages SET COMPRESSION lz4;
+EXCEPTION WHEN OTHERS THEN
+  RAISE NOTICE 'lz4 not available (%), message_archive keeps the default pglz compression', SQLERRM;
+END $$;
+
+ANALYZE messages;
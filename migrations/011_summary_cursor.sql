@@ -0,0 +1,6 @@
+-- migrations/011_summary_cursor.sql
+-- Summary cursor on (created_at, id): messages written in one statement share created_at (app/summaries.py).
+ALTER TABLE chat_summaries ADD COLUMN IF NOT EXISTS covered_until_id UUID; -- id of the newest message folded in
+
+
+-- NULL (rows from before this migration, clones) keeps the old strict created_at > covered_until behaviour.
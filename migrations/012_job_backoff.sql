@@ -0,0 +1,6 @@
+-- migrations/012_job_backoff.sql
+-- Retry backoff for message jobs (app/worker.py): a failed attempt requeues the job with run_after in the future.
+ALTER TABLE message_jobs ADD COLUMN IF NOT EXISTS run_after TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+
+-- claim_job only takes queued jobs whose run_after has passed; idle workers pick them up on their next poll.
@@ -0,0 +1,49 @@
+# tests/conftest.py
+"""
+Database tests run against TEST_DATABASE_URL, a scratch database with
+migrations/ applied, and are skipped without it:
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest -q
+
+Async tests are plain functions that drive their coroutine with asyncio.run.
+"""
+import contextlib
+import os
+
+import httpx
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    # read by app.db when the pools are created
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+# provider calls answer with the mock reply, never a real API
+os.environ["ALLOW_MOCK"] = "true"
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.pop("ANTHROPIC_API_KEY", None)
+
+
+@contextlib.asynccontextmanager
+async def _app_client():
+    """
+    (client, app): httpx client on create_app() in process, with the DB pools
+    up (the lifespan itself is not run).
+    """
+    from app.db import close_db_pool, init_db_pool
+    from app.main import create_app
+
+    app = create_app()
+    await init_db_pool(app)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            yield client, app
+    finally:
+        await close_db_pool(app)
+
+
+@pytest.fixture
+def app_client():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    return _app_client
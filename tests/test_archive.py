@@ -0,0 +1,42 @@
+# tests/test_archive.py
+"""
+Archiving a monthly partition never drops messages it could not archive.
+"""
+import asyncio
+from datetime import date
+
+import pytest
+
+from app import crud
+
+PERIOD = date(2001, 1, 1)
+PARTITION = "messages_p200101"
+
+
+def test_partition_with_orphans_is_kept(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            r = await client.post("/chats/", json={"title": "test-archive", "model_profile_id": None})
+            r.raise_for_status()
+            chat_id = r.json()["id"]
+            async with app.state.db_pool.acquire() as conn:
+                try:
+                    await conn.fetchval("SELECT ensure_message_partitions($1, $1)", PERIOD)
+                    await conn.execute(
+                        "INSERT INTO messages (chat_id, role, content, token_count, created_at) VALUES "
+                        "($1, 'user', 'kept', 5, '2001-01-15'), (NULL, 'user', 'orphan', 5, '2001-01-16')", chat_id)
+
+                    with pytest.raises(crud.PartitionNotArchivable):
+                        await crud.archive_message_partition(conn, PARTITION, PERIOD)
+                    assert await conn.fetchval(f"SELECT count(*) FROM {PARTITION}") == 2
+                    assert not await conn.fetchval("SELECT count(*) FROM message_archive WHERE chat_id = $1", chat_id)
+
+                    await conn.execute(f"DELETE FROM {PARTITION} WHERE chat_id IS NULL")
+                    assert await crud.archive_message_partition(conn, PARTITION, PERIOD) == 1
+                    assert not await conn.fetchval("SELECT to_regclass($1)", PARTITION)
+                    assert await conn.fetchval(
+                        "SELECT message_count FROM message_archive WHERE chat_id = $1 AND period = $2", chat_id, PERIOD) == 1
+                finally:
+                    await conn.execute(f"DROP TABLE IF EXISTS {PARTITION}")
+                    await conn.execute("DELETE FROM chats WHERE id = $1", chat_id)
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+# tests/test_batch.py
+"""
+POST /chats/batch: items for one chat keep their order, and a
+failed write of assistant replies turns into per-item error lines.
+"""
+import asyncio
+
+from app import crud, serialization
+
+from tests.test_stream import MOCK_REPLY, _chat_with_profile, _cleanup
+
+
+async def _batch(client, chat_id, n):
+    r = await client.post("/chats/batch", json={
+        "items": [{"chat_id": chat_id, "content": f"item {k}"} for k in range(n)]})
+    assert r.status_code == 200, r.text
+    return sorted((serialization.loads(line) for line in r.content.splitlines()), key=lambda row: row["index"])
+
+
+def test_batch_keeps_item_order(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            chat_id, profile_id = await _chat_with_profile(client, response_cache=False)
+            try:
+                lines = await _batch(client, chat_id, 5)
+                assert [row["ok"] for row in lines] == [True] * 5
+                r = await client.get(f"/chats/{chat_id}/messages/export")
+                users = [m["content"] for m in map(serialization.loads, r.content.splitlines()) if m["role"] == "user"]
+                assert users == [f"item {k}" for k in range(5)]
+            finally:
+                await _cleanup(app, chat_id, profile_id)
+    asyncio.run(main())
+
+
+def test_batch_flush_failure_reports_items(app_client, monkeypatch):
+    append_messages = crud.append_messages
+
+    async def failing(conn, messages, **kwargs):
+        if messages and messages[0][1] == "assistant":
+            raise RuntimeError("disk full")
+        return await append_messages(conn, messages, **kwargs)
+
+    monkeypatch.setattr(crud, "append_messages", failing)
+
+    async def main():
+        async with app_client() as (client, app):
+            chat_id, profile_id = await _chat_with_profile(client, response_cache=False)
+            try:
+                lines = await _batch(client, chat_id, 3)
+                assert [row["index"] for row in lines] == [0, 1, 2]
+                assert all(not row["ok"] and row["status"] == 500 for row in lines)
+                async with app.state.db_pool.acquire() as conn:
+                    assert not await conn.fetchval(
+                        "SELECT count(*) FROM messages WHERE chat_id = $1 AND content = $2", chat_id, MOCK_REPLY)
+            finally:
+                await _cleanup(app, chat_id, profile_id)
+    asyncio.run(main())
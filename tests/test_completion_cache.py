@@ -0,0 +1,46 @@
+# tests/test_completion_cache.py
+"""
+Completion cache lookups and evictions are counted in /metrics.
+"""
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app import completion_cache
+from app.cache import TTLCache
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_lookups_and_evictions_are_counted(monkeypatch):
+    monkeypatch.setattr(completion_cache, "COMPLETION_CACHE_DB", False)
+    monkeypatch.setattr(completion_cache, "memory", TTLCache(1, 60))
+    profile = {"provider": "openai", "base_model": "gpt-4o-mini", "response_cache": True}
+    calls = []
+
+    async def call(provider, model, messages, temperature):
+        calls.append(messages[-1]["content"])
+        return f"reply to {messages[-1]['content']}"
+
+    def prompt(text):
+        return [{"role": "user", "content": text}]
+
+    hits = _sample("completion_cache_lookups_total", tier="memory", result="hit")
+    misses = _sample("completion_cache_lookups_total", tier="memory", result="miss")
+    evictions = _sample("completion_cache_evictions_total")
+
+    async def main():
+        assert await completion_cache.call_model(None, profile, prompt("a"), call) == "reply to a"
+        assert await completion_cache.call_model(None, profile, prompt("a"), call) == "reply to a"
+        # room for one entry: "b" evicts "a"
+        await completion_cache.call_model(None, profile, prompt("b"), call)
+        await completion_cache.call_model(None, profile, prompt("a"), call)
+    asyncio.run(main())
+
+    assert calls == ["a", "b", "a"]
+    assert _sample("completion_cache_lookups_total", tier="memory", result="hit") - hits == 1
+    assert _sample("completion_cache_lookups_total", tier="memory", result="miss") - misses == 3
+    assert _sample("completion_cache_evictions_total") - evictions == 2
+    assert completion_cache.memory.stats()["evictions"] == 2
@@ -0,0 +1,53 @@
+# tests/test_export.py
+"""
+GET /chats/export and /chats/{chat_id}/messages/export on real rows.
+"""
+import asyncio
+
+from app import crud, serialization
+
+
+async def _make_chat(client, app, title: str, n: int):
+    r = await client.post("/chats/", json={"title": title, "model_profile_id": None})
+    r.raise_for_status()
+    chat_id = r.json()["id"]
+    async with app.state.db_pool.acquire() as conn:
+        for i in range(n):
+            await crud.append_message(conn, chat_id, "user" if i % 2 == 0 else "assistant", f"turn {i} <&>", 7)
+    return chat_id
+
+async def _delete(app, chat_ids):
+    async with app.state.db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM chats WHERE id = ANY($1::uuid[])", chat_ids)
+
+
+def test_export_chats(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            chat_ids = [await _make_chat(client, app, f"test-export {i}", 0) for i in range(3)]
+            try:
+                r = await client.get("/chats/export")
+                assert r.status_code == 200
+                rows = [serialization.loads(line) for line in r.content.splitlines()]
+                exported = {row["id"]: row for row in rows}
+                for i, chat_id in enumerate(chat_ids):
+                    assert exported[chat_id]["title"] == f"test-export {i}"
+                    assert exported[chat_id]["message_count"] == 0
+            finally:
+                await _delete(app, chat_ids)
+    asyncio.run(main())
+
+def test_export_messages(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            chat_id = await _make_chat(client, app, "test-export messages", 5)
+            try:
+                r = await client.get(f"/chats/{chat_id}/messages/export")
+                assert r.status_code == 200
+                rows = [serialization.loads(line) for line in r.content.splitlines()]
+                assert [row["content"] for row in rows] == [f"turn {i} <&>" for i in range(5)]
+                assert [row["role"] for row in rows] == ["user", "assistant", "user", "assistant", "user"]
+                assert all(row["chat_id"] == chat_id and row["id"] and row["created_at"] for row in rows)
+            finally:
+                await _delete(app, [chat_id])
+    asyncio.run(main())
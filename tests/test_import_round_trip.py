@@ -0,0 +1,64 @@
+# tests/test_import_round_trip.py
+"""
+Export -> delete -> import gives back the same chats and messages:
+/chats/export + /chats/{chat_id}/messages/export lines fed to
+/chats/import + /chats/messages/import unchanged.
+"""
+import asyncio
+
+from app import crud, serialization
+
+
+async def _export(client, chat_ids):
+    r = await client.get("/chats/export")
+    assert r.status_code == 200
+    wanted = set(chat_ids)
+    chats = {}
+    for line in r.content.splitlines():
+        row = serialization.loads(line)
+        if row["id"] in wanted:
+            chats[row["id"]] = row
+    messages = {}
+    for chat_id in chat_ids:
+        r = await client.get(f"/chats/{chat_id}/messages/export")
+        assert r.status_code == 200
+        messages[chat_id] = [serialization.loads(line) for line in r.content.splitlines()]
+    return chats, messages
+
+
+def test_export_import_round_trip(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            chat_ids = []
+            for i in range(3):
+                r = await client.post("/chats/", json={"title": f"test-round-trip {i}", "model_profile_id": None})
+                r.raise_for_status()
+                chat_ids.append(r.json()["id"])
+            async with app.state.db_pool.acquire() as conn:
+                for i, chat_id in enumerate(chat_ids):
+                    for k in range(4 + i):
+                        await crud.append_message(conn, chat_id, "user" if k % 2 == 0 else "assistant",
+                                                  f"chat {i} turn {k}: \"quoted\", comma\nnewline é", 9)
+                # several rows for one chat from a single statement (as /chats/batch writes them)
+                await crud.append_messages(conn, [(chat_ids[0], "user", f"bulk {k}") for k in range(5)])
+            try:
+                chats, messages = await _export(client, chat_ids)
+                assert len(chats) == 3 and all(messages.values())
+
+                async with app.state.db_pool.acquire() as conn:
+                    await conn.execute("DELETE FROM chats WHERE id = ANY($1::uuid[])", chat_ids)
+                r = await client.post("/chats/import", content=b"".join(
+                    serialization.dumps(c, newline=True) for c in chats.values()))
+                assert r.status_code == 200, r.text
+                r = await client.post("/chats/messages/import", content=b"".join(
+                    serialization.dumps(m, newline=True) for rows in messages.values() for m in rows),
+                    headers={"Content-Type": "application/x-ndjson"})
+                assert r.status_code == 200, r.text
+
+                chats_after, messages_after = await _export(client, chat_ids)
+                assert chats_after == chats
+                assert messages_after == messages
+            finally:
+                async with app.state.db_pool.acquire() as conn:
+                    await conn.execute("DELETE FROM chats WHERE id = ANY($1::uuid[])", chat_ids)
+    asyncio.run(main())
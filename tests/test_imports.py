@@ -0,0 +1,29 @@
+# tests/test_imports.py
+"""
+Every module of the app and the benchmarks imports. Module-level setup
+(metric registration, settings parsing) runs at import, so a mistake there
+takes down the API, the worker and the scripts at once.
+"""
+import importlib
+import pkgutil
+
+import pytest
+
+import app
+import benchmarks
+
+MODULES = sorted(
+    m.name for pkg in (app, benchmarks) for m in pkgutil.walk_packages(pkg.__path__, pkg.__name__ + ".")
+)
+
+
+@pytest.mark.parametrize("name", MODULES)
+def test_imports(name):
+    importlib.import_module(name)
+
+def test_app_builds():
+    from app.main import create_app
+
+    paths = create_app().openapi()["paths"]
+    assert "/health/ready" in paths
+    assert "/chats/{chat_id}/messages" in paths
@@ -0,0 +1,62 @@
+# tests/test_limits.py
+"""
+ProviderLimiter slots: given back however an acquire ends.
+"""
+import asyncio
+
+from fastapi import HTTPException
+
+from app import limits
+
+
+def _limiter(provider_slots: int, model_slots: int, **kw) -> limits.ProviderLimiter:
+    limiter = limits.ProviderLimiter("test", provider_slots, kw.get("rpm", 0), kw.get("tpm", 0), kw.get("queue", 0))
+    limiter.model_semaphores = {"m": asyncio.Semaphore(model_slots)}
+    return limiter
+
+
+def test_cancelled_acquire_releases_provider_slot():
+    async def main():
+        limiter = _limiter(2, 1)
+        held = await limiter.acquire("m", 10)
+        # takes the provider slot, then queues on the model slot
+        waiter = asyncio.ensure_future(limiter.acquire("m", 10))
+        await asyncio.sleep(0.01)
+        assert limiter.semaphore._value == 0
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.semaphore._value == 1
+        assert limiter.waiting == 0 and limiter.shed == 0
+        limiter.release(held)
+        assert limiter.semaphore._value == 2 and limiter.active == 0
+    asyncio.run(main())
+
+def test_cancelled_on_rate_budget_releases_slots():
+    async def main():
+        limiter = _limiter(2, 2, rpm=60)
+        limiter.requests.tokens = 0
+        waiter = asyncio.ensure_future(limiter.acquire("m", 10))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.semaphore._value == 2
+        assert limiter.model_semaphores["m"]._value == 2
+        assert limiter.shed == 0
+    asyncio.run(main())
+
+def test_timeout_sheds_and_releases(monkeypatch):
+    monkeypatch.setattr(limits, "QUEUE_TIMEOUT_S", 0.05)
+
+    async def main():
+        limiter = _limiter(2, 1)
+        held = await limiter.acquire("m", 10)
+        try:
+            await limiter.acquire("m", 10)
+        except HTTPException as e:
+            assert e.status_code == 503 and "Retry-After" in e.headers
+        else:
+            raise AssertionError("expected 503")
+        assert limiter.shed == 1
+        assert limiter.semaphore._value == 1
+        limiter.release(held)
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+# tests/test_metrics.py
+"""
+With PROMETHEUS_MULTIPROC_DIR set (app/serve.py with several workers),
+/metrics adds up every worker's samples.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+OBSERVE = "from app import metrics; metrics.observe_request('GET', '/chats/', 200, 0.01)"
+SCRAPE = "import asyncio; from app import metrics; print(asyncio.run(metrics.metrics_endpoint()).body.decode())"
+
+
+def _run(code, env):
+    return subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+
+
+def test_metrics_add_up_across_workers(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), METRICS_ENABLED="true")
+    for _ in range(3):
+        _run(OBSERVE, env)
+    body = _run(SCRAPE, env)
+    assert 'http_request_duration_seconds_count{method="GET",route="/chats/",status="200"} 3.0' in body
+
+
+def test_read_pool_is_primary_without_replicas(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            assert app.state.db_read_pools == [app.state.db_pool]
+            r = await client.get("/chats/")
+            assert r.status_code == 200
+    asyncio.run(main())
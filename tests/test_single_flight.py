@@ -0,0 +1,110 @@
+# tests/test_single_flight.py
+"""
+providers.call_model coalesces identical concurrent calls into one upstream
+request (single-flight), against a fake _dispatch that counts calls.
+"""
+import asyncio
+
+import pytest
+
+from app import providers
+
+
+def prompt(text):
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": text}]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Replaces the provider call: each call is counted, then waits for `release`
+    and returns (or raises `error`).
+    """
+    class Upstream:
+        calls = 0
+        cancelled = 0
+        error = None
+        release: asyncio.Event
+
+    async def dispatch(provider, model, messages, temperature):
+        Upstream.calls += 1
+        try:
+            await Upstream.release.wait()
+        except asyncio.CancelledError:
+            Upstream.cancelled += 1
+            raise
+        if Upstream.error:
+            raise Upstream.error
+        return f"reply to {messages[-1]['content']}"
+
+    monkeypatch.setattr(providers, "SINGLE_FLIGHT", True)
+    monkeypatch.setattr(providers, "_dispatch", dispatch)
+    return Upstream
+
+
+def _start(n, text):
+    return [asyncio.ensure_future(providers.call_model("openai", "gpt-4o-mini", prompt(text))) for _ in range(n)]
+
+
+async def _until_called(upstream, calls):
+    while upstream.calls < calls:
+        await asyncio.sleep(0)
+
+
+def test_identical_calls_share_one_request(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        waiters = _start(20, "same") + _start(1, "other")
+        await _until_called(upstream, 2)
+        await asyncio.sleep(0)
+        upstream.release.set()
+        replies = await asyncio.gather(*waiters)
+        assert replies == ["reply to same"] * 20 + ["reply to other"]
+        assert upstream.calls == 2
+        assert not providers._inflight
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_cancel_the_others(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        waiters = _start(3, "cancel-one")
+        await _until_called(upstream, 1)
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1:] == ["reply to cancel-one"] * 2
+        assert upstream.calls == 1 and upstream.cancelled == 0
+
+        # once every waiter is gone, the upstream call is cancelled too
+        upstream.release = asyncio.Event()
+        waiters = _start(2, "cancel-all")
+        await _until_called(upstream, 2)
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1
+        assert not providers._inflight
+    asyncio.run(main())
+
+
+def test_error_reaches_every_waiter(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        upstream.error = RuntimeError("upstream 500")
+        waiters = _start(5, "fails")
+        await _until_called(upstream, 1)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(r is upstream.error for r in results)
+        assert upstream.calls == 1
+        assert not providers._inflight
+
+        # the failure is not cached: the next call goes upstream again
+        upstream.error = None
+        assert await providers.call_model("openai", "gpt-4o-mini", prompt("fails")) == "reply to fails"
+        assert upstream.calls == 2
+    asyncio.run(main())
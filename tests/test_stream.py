@@ -0,0 +1,79 @@
+# tests/test_stream.py
+"""
+POST /chats/{chat_id}/messages/stream keeps the assistant reply when the
+client goes away.
+"""
+import asyncio
+
+import anyio
+from starlette.requests import Request
+
+from app import completion_cache
+from app.routers import chats
+from app.schemas import MessageIn
+
+MOCK_REPLY = "[MOCK OPENAI reply] This is a mock reply because OPENAI_API_KEY is not set."
+
+
+async def _chat_with_profile(client, response_cache: bool):
+    r = await client.post("/model-profiles/", json={
+        "name": "test-stream", "provider": "openai", "base_model": "gpt-4o-mini",
+        "system_prompt": "You are a test.", "response_cache": response_cache,
+    })
+    r.raise_for_status()
+    profile_id = r.json()["id"]
+    r = await client.post("/chats/", json={"title": "test-stream", "model_profile_id": profile_id})
+    r.raise_for_status()
+    return r.json()["id"], profile_id
+
+async def _cleanup(app, chat_id, profile_id):
+    async with app.state.db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM chats WHERE id = $1", chat_id)
+        await conn.execute("DELETE FROM model_profiles WHERE id = $1", profile_id)
+
+async def _assistant_messages(app, chat_id):
+    async with app.state.db_pool.acquire() as conn:
+        return [r["content"] for r in await conn.fetch(
+            "SELECT content FROM messages WHERE chat_id = $1 AND role = 'assistant'", chat_id)]
+
+
+def test_disconnect_during_cache_store_keeps_reply(app_client, monkeypatch):
+    async def main():
+        async with app_client() as (client, app):
+            chat_id, profile_id = await _chat_with_profile(client, response_cache=True)
+            storing = asyncio.Event()
+
+            async def slow_store(*args, **kwargs):
+                storing.set()
+                await asyncio.sleep(30)
+            monkeypatch.setattr(completion_cache, "store", slow_store)
+            try:
+                request = Request({"type": "http", "app": app, "headers": []})
+                response = await chats.post_message_stream(chat_id, MessageIn(content="hi"), request)
+
+                async with anyio.create_task_group() as tg:
+                    async def consume():
+                        async for _ in response.body_iterator:
+                            pass
+                    tg.start_soon(consume)
+                    await storing.wait()
+                    # the client disconnects while the reply is being cached
+                    tg.cancel_scope.cancel()
+
+                assert await _assistant_messages(app, chat_id) == [MOCK_REPLY]
+            finally:
+                await _cleanup(app, chat_id, profile_id)
+    asyncio.run(main())
+
+def test_stream_persists_reply_once(app_client):
+    async def main():
+        async with app_client() as (client, app):
+            chat_id, profile_id = await _chat_with_profile(client, response_cache=False)
+            try:
+                r = await client.post(f"/chats/{chat_id}/messages/stream?format=ndjson", json={"content": "hi"})
+                assert r.status_code == 200
+                assert b'"done"' in r.content
+                assert await _assistant_messages(app, chat_id) == [MOCK_REPLY]
+            finally:
+                await _cleanup(app, chat_id, profile_id)
+    asyncio.run(main())
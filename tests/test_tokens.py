@@ -0,0 +1,26 @@
+# tests/test_tokens.py
+"""
+Token counts fall back to the ~4 chars/token estimate when tiktoken's
+encoding cannot be loaded (e.g. no network for the first download).
+"""
+import types
+
+from app import tokens
+
+
+def test_count_tokens_falls_back_when_encoding_fails(monkeypatch):
+    loads = []
+
+    def get_encoding(name):
+        loads.append(name)
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tokens, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    tokens._encoding.cache_clear()
+    try:
+        assert tokens.count_tokens("x" * 40) == 10 + tokens.MESSAGE_OVERHEAD_TOKENS
+        assert tokens.count_tokens_batch(["abcd", ""]) == [1 + tokens.MESSAGE_OVERHEAD_TOKENS, tokens.MESSAGE_OVERHEAD_TOKENS]
+        # one attempt per process, not one per call
+        assert loads == ["cl100k_base"]
+    finally:
+        tokens._encoding.cache_clear()
@@ -0,0 +1,64 @@
+# tests/test_worker.py
+"""
+app/worker.py: a job whose reply cannot be saved is requeued (or failed
+once out of attempts) instead of staying running.
+"""
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app import crud, worker
+
+from tests.test_stream import MOCK_REPLY, _chat_with_profile, _cleanup
+
+
+async def _claim(conn, job_id):
+    job = await crud.claim_job(conn, worker.JOB_LOCK_TIMEOUT_S, worker.JOB_MAX_ATTEMPTS)
+    assert job and str(job["id"]) == job_id
+    return job
+
+async def _job_row(conn, job_id):
+    return await conn.fetchrow("SELECT status, attempts, error, locked_at FROM message_jobs WHERE id = $1", job_id)
+
+
+def test_failed_save_requeues_then_fails(app_client, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(worker, "JOB_RETRY_BACKOFF_S", 0.0)
+    complete_job = crud.complete_job
+
+    async def broken(conn, job, reply):
+        raise RuntimeError("connection lost")
+
+    async def main():
+        async with app_client() as (client, app):
+            chat_id, profile_id = await _chat_with_profile(client, response_cache=False)
+            pool = app.state.db_pool
+            try:
+                r = await client.post(f"/chats/{chat_id}/messages/jobs", json={"content": "hi"})
+                assert r.status_code == 202, r.text
+                job_id = r.json()["job_id"]
+
+                monkeypatch.setattr(crud, "complete_job", broken)
+                async with pool.acquire() as conn:
+                    await worker.process(pool, await _claim(conn, job_id))
+                    row = await _job_row(conn, job_id)
+                    assert (row["status"], row["attempts"], row["locked_at"]) == ("queued", 1, None)
+                    assert "connection lost" in row["error"]
+
+                    await worker.process(pool, await _claim(conn, job_id))
+                    row = await _job_row(conn, job_id)
+                    assert (row["status"], row["attempts"]) == ("failed", 2)
+
+                    # a saved reply is timed once, as complete_job
+                    monkeypatch.setattr(crud, "complete_job", complete_job)
+                    await conn.execute("UPDATE message_jobs SET status = 'queued', attempts = 0 WHERE id = $1", job_id)
+                    before = REGISTRY.get_sample_value("db_query_duration_seconds_count", {"function": "append_message"})
+                    await worker.process(pool, await _claim(conn, job_id))
+                    assert (await _job_row(conn, job_id))["status"] == "done"
+                    assert REGISTRY.get_sample_value(
+                        "db_query_duration_seconds_count", {"function": "append_message"}) == before
+                    assert await conn.fetchval(
+                        "SELECT count(*) FROM messages WHERE chat_id = $1 AND content = $2", chat_id, MOCK_REPLY) == 1
+            finally:
+                await _cleanup(app, chat_id, profile_id)
+    asyncio.run(main())